@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import daily_stats
 from .models import (
     UserProfile, Bin, DetectedIssues, WasteRecord,
     RewardItem, RewardRedemption, IssueReport, Notification, Rewards, RedemptionRequest
@@ -98,6 +99,13 @@ class WasteRecordAdmin(admin.ModelAdmin):
     readonly_fields = ['disposed_at']
     date_hierarchy = 'disposed_at'
 
+    def delete_model(self, request, obj):
+        daily_stats.delete_records(WasteRecord.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        # One bulk DELETE and a rollup rebuild per user instead of per-row updates
+        daily_stats.delete_records(queryset)
+
 
 # ========================================
 # Reward Item Admin
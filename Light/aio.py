@@ -0,0 +1,174 @@
+"""
+asyncio helpers for the ASGI deployment (SERVER_MODE=asgi, uvicorn workers)
+
+Under ASGI, Django serves a sync iterator in a StreamingHttpResponse by
+reading it to the end first, so endless bodies (MJPEG, SSE) need an async
+iterator there, while WSGI needs a sync one. Views pick with is_asgi().
+
+Capture threads and publishers wake coroutines through Waiters, so a
+waiting stream costs no thread. Clients that keep a connection pool (bin
+commands outside a request, Groq) live on one background event loop per
+process: submit() runs a coroutine there from any thread, and
+iterate_on_loop() / aiterate_on_loop() stream an async generator from it.
+"""
+
+import asyncio
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+
+def is_asgi(request):
+    """True when the request is being served by Django's ASGI handler"""
+    return isinstance(request, ASGIRequest)
+
+
+# ==================== THREAD -> COROUTINE WAKEUPS ====================
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Waiters:
+    """Coroutines waiting for a condition that plain threads change (notify_all may be called from any thread)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def notify_all(self):
+        with self._lock:
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # that loop has been closed
+
+    async def wait_for(self, predicate, timeout=None):
+        """Wait until predicate() is true or `timeout` seconds pass; returns predicate()"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not predicate():
+            future = loop.create_future()
+            waiter = (loop, future)
+            with self._lock:
+                self._waiters.add(waiter)
+            try:
+                # Re-check after registering so a notify in between is not lost
+                if predicate():
+                    break
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(future, remaining)
+                except asyncio.TimeoutError:
+                    break
+            finally:
+                with self._lock:
+                    self._waiters.discard(waiter)
+        return predicate()
+
+
+# ==================== SYNC ITERATORS UNDER ASGI ====================
+
+async def aiterate(iterable, chunk=64):
+    """
+    Async iterator over a sync (e.g. DB cursor) iterable without reading it
+    all first: items are pulled `chunk` at a time on the request's
+    thread-sensitive thread, so DB connections stay on one thread.
+    """
+    iterator = iter(iterable)
+
+    def take():
+        items = []
+        for item in iterator:
+            items.append(item)
+            if len(items) >= chunk:
+                break
+        return items
+
+    pull = sync_to_async(take, thread_sensitive=True)
+    try:
+        while True:
+            items = await pull()
+            for item in items:
+                yield item
+            if len(items) < chunk:
+                return
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+# ==================== BACKGROUND EVENT LOOP ====================
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """This process's background event loop (started on first use, runs in a daemon thread)"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='aio-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def submit(coro):
+    """Run a coroutine on the background loop from any thread; returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+_END = object()
+
+
+async def _next(agen):
+    try:
+        return await agen.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+def iterate_on_loop(agen):
+    """Sync iterator over an async generator that runs on the background loop (WSGI streaming bodies)"""
+    try:
+        while True:
+            item = submit(_next(agen)).result()
+            if item is _END:
+                return
+            yield item
+    finally:
+        submit(agen.aclose())
+
+
+async def aiterate_on_loop(agen):
+    """The same from another event loop (ASGI streaming bodies)"""
+    try:
+        while True:
+            item = await asyncio.wrap_future(submit(_next(agen)))
+            if item is _END:
+                return
+            yield item
+    finally:
+        submit(agen.aclose())
+
+
+def _after_fork_in_child():
+    # The loop's thread does not survive fork(); the worker starts its own
+    global _loop, _loop_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,333 @@
+"""
+ESP32 bin control client
+Pooled keep-alive HTTP sessions per bin, per-command timeouts, retries with
+backoff and a circuit breaker that marks unreachable bins offline
+
+AsyncBinClient sends the same commands from coroutines (httpx), sharing the
+host's circuit breaker with the sync client.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+# (connect, read) timeouts in seconds. Lid/compartment commands return once
+# the servo has moved, so they get a longer read timeout than status calls.
+COMMAND_TIMEOUTS = {
+    'openlid': (1.0, 4.0),
+    'closelid': (1.0, 4.0),
+    'plastic': (1.0, 4.0),
+    'paper': (1.0, 4.0),
+    'metal': (1.0, 4.0),
+    'glass': (1.0, 4.0),
+}
+DEFAULT_TIMEOUT = (1.0, 2.0)
+
+
+class BinError(Exception):
+    """A bin command failed after all retries"""
+
+
+class BinUnavailable(BinError):
+    """The bin's circuit breaker is open; the command was not sent"""
+
+
+# ==================== CIRCUIT BREAKER ====================
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold consecutive failures) -> open
+    open -> (reset_timeout elapsed) -> half_open: one trial request
+    half_open -> closed on success, open again on failure
+
+    allow() is for callers about to send a request (it may hand out the
+    trial); status checks use would_allow(), which changes nothing.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False  # half_open: the one trial request is in flight
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._trial = False
+            if self.state == 'half_open':
+                if self._trial:
+                    return False
+                self._trial = True
+                return True
+            return self.state == 'closed'
+
+    def would_allow(self):
+        """Whether allow() would let a request through, without taking the trial"""
+        with self._lock:
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at >= self.reset_timeout
+            return not (self.state == 'half_open' and self._trial)
+
+    def record_success(self):
+        """Returns True when this success closed a previously open circuit"""
+        with self._lock:
+            recovered = self.state != 'closed'
+            self.state = 'closed'
+            self.failures = 0
+            self._trial = False
+            return recovered
+
+    def record_failure(self):
+        """Returns True when this failure opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+# ==================== CLIENT ====================
+
+class BinClient:
+    """
+    Control client for one ESP32 bin (http://<host>/<command>).
+
+    Commands reuse a keep-alive connection from the session's pool instead of
+    opening a new TCP connection each time. Connection errors, timeouts and
+    5xx responses are retried with exponential backoff.
+    """
+
+    def __init__(self, host, retries=2, backoff=0.2, failure_threshold=3, reset_timeout=30.0,
+                 timeouts=None, on_offline=None, on_online=None):
+        self.host = host
+        self.base_url = host if '://' in host else f"http://{host}"
+        self.retries = retries
+        self.backoff = backoff
+        self.timeouts = timeouts or COMMAND_TIMEOUTS
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.on_offline = on_offline
+        self.on_online = on_online
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def available(self):
+        return self.breaker.would_allow()
+
+    def command(self, name, timeout=None):
+        """Send a command and return the response; raises BinUnavailable / BinError"""
+        if not self.breaker.allow():
+            metrics.counter('bin.rejected').inc()
+            raise BinUnavailable(f"Bin {self.host} is offline (circuit open)")
+
+        timeout = timeout or self.timeouts.get(name, DEFAULT_TIMEOUT)
+        url = f"{self.base_url}/{name}"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                metrics.counter('bin.retries').inc()
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            started = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=timeout)
+                if response.status_code >= 500:
+                    raise BinError(f"{url} returned {response.status_code}")
+            except (requests.RequestException, BinError) as e:
+                last_error = e
+                metrics.counter(f'bin.errors.{name}').inc()
+                continue
+            finally:
+                metrics.histogram(f'bin.command_ms.{name}').observe((time.perf_counter() - started) * 1000)
+
+            if self.breaker.record_success() and self.on_online:
+                self.on_online(self)
+            return response
+
+        if self.breaker.record_failure():
+            print(f"🔌 Bin {self.host} marked offline after {self.breaker.failures} failed commands")
+            metrics.counter('bin.circuit_opened').inc()
+            if self.on_offline:
+                self.on_offline(self)
+        raise BinError(f"Bin command {name} failed: {last_error}")
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncBinClient:
+    """
+    BinClient for coroutines: an httpx.AsyncClient keep-alive pool and the
+    same timeouts, retries and backoff. While a command is in flight only the
+    coroutine waits, so one event loop can drive many bins at once.
+    """
+
+    def __init__(self, host, retries=2, backoff=0.2, breaker=None, timeouts=None,
+                 on_offline=None, on_online=None):
+        self.host = host
+        self.base_url = host if '://' in host else f"http://{host}"
+        self.retries = retries
+        self.backoff = backoff
+        self.timeouts = timeouts or COMMAND_TIMEOUTS
+        self.breaker = breaker or CircuitBreaker()
+        self.on_offline = on_offline
+        self.on_online = on_online
+        self.session = httpx.AsyncClient(limits=httpx.Limits(max_connections=4, max_keepalive_connections=4))
+
+    @property
+    def available(self):
+        return self.breaker.would_allow()
+
+    async def command(self, name, timeout=None):
+        """Send a command and return the response; raises BinUnavailable / BinError"""
+        if not self.breaker.allow():
+            metrics.counter('bin.rejected').inc()
+            raise BinUnavailable(f"Bin {self.host} is offline (circuit open)")
+
+        connect, read = timeout or self.timeouts.get(name, DEFAULT_TIMEOUT)
+        url = f"{self.base_url}/{name}"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                metrics.counter('bin.retries').inc()
+                await asyncio.sleep(self.backoff * (2 ** (attempt - 1)))
+            started = time.perf_counter()
+            try:
+                response = await self.session.get(url, timeout=httpx.Timeout(read, connect=connect))
+                if response.status_code >= 500:
+                    raise BinError(f"{url} returned {response.status_code}")
+            except (httpx.HTTPError, BinError) as e:
+                last_error = e
+                metrics.counter(f'bin.errors.{name}').inc()
+                continue
+            finally:
+                metrics.histogram(f'bin.command_ms.{name}').observe((time.perf_counter() - started) * 1000)
+
+            if self.breaker.record_success() and self.on_online:
+                await asyncio.to_thread(_run_hook, self.on_online, self)
+            return response
+
+        if self.breaker.record_failure():
+            print(f"🔌 Bin {self.host} marked offline after {self.breaker.failures} failed commands")
+            metrics.counter('bin.circuit_opened').inc()
+            if self.on_offline:
+                await asyncio.to_thread(_run_hook, self.on_offline, self)
+        raise BinError(f"Bin command {name} failed: {last_error}")
+
+    async def close(self):
+        await self.session.aclose()
+
+
+# ==================== BIN STATUS HOOKS ====================
+
+def _release_connection():
+    # Hooks also run on DisposalRunner pool threads, which never see request_finished.
+    # Inside a transaction the connection belongs to the caller, so leave it be.
+    if not connection.in_atomic_block:
+        close_old_connections()
+
+
+def mark_offline(client):
+    from .models import Bin
+    try:
+        Bin.objects.filter(ip_address=client.host).update(status='offline')
+    finally:
+        _release_connection()
+
+
+def mark_online(client):
+    from .models import Bin
+    try:
+        Bin.objects.filter(ip_address=client.host, status='offline').update(status='active', last_online=timezone.now())
+    finally:
+        _release_connection()
+
+
+def _run_hook(hook, client):
+    # Runs on an executor thread that never sees request_finished
+    try:
+        hook(client)
+    finally:
+        connection.close()
+
+
+# ==================== PROCESS-WIDE CLIENTS ====================
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host=None):
+    """Shared client for a bin host (defaults to settings.ESP32_WROOM_IP)"""
+    host = host or settings.ESP32_WROOM_IP
+    client = _clients.get(host)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(host)
+            if client is None:
+                client = BinClient(
+                    host,
+                    retries=settings.BIN_COMMAND_RETRIES,
+                    backoff=settings.BIN_COMMAND_BACKOFF,
+                    failure_threshold=settings.BIN_FAILURE_THRESHOLD,
+                    reset_timeout=settings.BIN_OFFLINE_RETRY_SECONDS,
+                    on_offline=mark_offline,
+                    on_online=mark_online,
+                )
+                _clients[host] = client
+    return client
+
+
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {host: AsyncBinClient}
+
+
+def get_async_client(host=None):
+    """Shared async client for a bin host on the running event loop (httpx pools are per loop)"""
+    sync_client = get_client(host)
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+    client = clients.get(sync_client.host)
+    if client is None:
+        # Only this loop's thread touches `clients`
+        client = clients[sync_client.host] = AsyncBinClient(
+            sync_client.host,
+            retries=sync_client.retries,
+            backoff=sync_client.backoff,
+            breaker=sync_client.breaker,  # one offline state per bin, whichever client sends
+            on_offline=mark_offline,
+            on_online=mark_online,
+        )
+    return client
+
+
+def bin_host(bin=None):
+    """Control host for a Bin row, falling back to the configured ESP32"""
+    if bin is not None and bin.ip_address:
+        return bin.ip_address
+    return settings.ESP32_WROOM_IP
+
+
+def client_stats():
+    return {
+        host: {'circuit': c.breaker.state, 'consecutive_failures': c.breaker.failures}
+        for host, c in list(_clients.items())
+    }
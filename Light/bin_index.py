@@ -0,0 +1,177 @@
+"""
+Nearest-bin search
+BinGridIndex buckets bin positions into fixed lat/lng grid cells and walks
+outward ring by ring from the query cell, yielding bins in true haversine
+distance order. Only the cells around the user are looked at, however many
+bins the city has.
+
+The process-wide index holds positions only (pk, lat, lng). Status and
+compartment fullness change constantly, so nearest_bins() checks them against
+the database for each batch of candidates. The index is rebuilt lazily when
+a Bin is saved or deleted in this process (signals) and at least every
+BIN_INDEX_TTL seconds, to pick up bins added by other workers.
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import metrics
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEG = 0.01  # ~1.1 km north-south
+COMPARTMENTS = ('plastic', 'paper', 'metal', 'glass')
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class BinGridIndex:
+    """Grid of (pk, lat, lng) points; no wrap-around at the antimeridian"""
+
+    def __init__(self, points, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        self.cells = defaultdict(list)
+        self.size = 0
+        for pk, lat, lng in points:
+            self.cells[self._cell(lat, lng)].append((pk, float(lat), float(lng)))
+            self.size += 1
+        rows = [r for r, _ in self.cells] or [0]
+        cols = [c for _, c in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def _cell(self, lat, lng):
+        return int(math.floor(float(lat) / self.cell_deg)), int(math.floor(float(lng) / self.cell_deg))
+
+    def _ring(self, row, col, r):
+        if r == 0:
+            yield row, col
+            return
+        for c in range(col - r, col + r + 1):
+            yield row - r, c
+            yield row + r, c
+        for rr in range(row - r + 1, row + r):
+            yield rr, col - r
+            yield rr, col + r
+
+    def _unvisited_bound_km(self, lat, lng, row, col, r):
+        """Lower bound on the distance to any point outside rings 0..r"""
+        lat_lo, lat_hi = (row - r) * self.cell_deg, (row + r + 1) * self.cell_deg
+        lng_lo, lng_hi = (col - r) * self.cell_deg, (col + r + 1) * self.cell_deg
+        dlat = min(lat - lat_lo, lat_hi - lat)
+        dlng = min(lng - lng_lo, lng_hi - lng)
+        # Parallels are shortest at the highest latitude in the box
+        cos_max = math.cos(math.radians(min(90.0, max(abs(lat_lo), abs(lat_hi)))))
+        north_south = EARTH_RADIUS_KM * math.radians(dlat)
+        east_west = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_max * math.sin(math.radians(dlng) / 2)))
+        return 0.999 * min(north_south, east_west)
+
+    def nearest(self, lat, lng, radius_km=None):
+        """
+        Yield (distance_km, pk) in increasing distance, up to radius_km. Once
+        the rings walked hold more cells than the index, the remaining bins are
+        scanned directly, so a query far from every bin costs O(bins).
+        """
+        lat, lng = float(lat), float(lng)
+        row, col = self._cell(lat, lng)
+        rmin, rmax, cmin, cmax = self.bounds
+        max_ring = max(abs(row - rmin), abs(row - rmax), abs(col - cmin), abs(col - cmax))
+        heap, visited = [], 0
+        r = 0
+        while True:
+            if (2 * r + 1) ** 2 > 4 * len(self.cells):
+                # Far from the bins, rings are mostly empty cells: scanning the rest is cheaper
+                for (crow, ccol), points in self.cells.items():
+                    if max(abs(crow - row), abs(ccol - col)) < r:
+                        continue
+                    for pk, plat, plng in points:
+                        d = haversine_km(lat, lng, plat, plng)
+                        if radius_km is None or d <= radius_km:
+                            heapq.heappush(heap, (d, pk))
+                while heap:
+                    yield heapq.heappop(heap)
+                return
+            for cell in self._ring(row, col, r):
+                for pk, plat, plng in self.cells.get(cell, ()):
+                    d = haversine_km(lat, lng, plat, plng)
+                    if radius_km is None or d <= radius_km:
+                        heapq.heappush(heap, (d, pk))
+                    visited += 1
+            done = visited >= self.size or r >= max_ring
+            bound = math.inf if done else self._unvisited_bound_km(lat, lng, row, col, r)
+            while heap and heap[0][0] <= bound:
+                yield heapq.heappop(heap)
+            if done or (radius_km is not None and bound > radius_km):
+                return
+            r += 1
+
+
+# ==================== PROCESS-WIDE INDEX ====================
+
+_index = None
+_built_at = 0.0
+_dirty = False
+_index_lock = threading.Lock()
+
+
+def invalidate():
+    """A bin moved, appeared or was removed: rebuild on the next search"""
+    global _dirty
+    _dirty = True
+
+
+def get_index():
+    global _index, _built_at, _dirty
+    if _index is None or _dirty or time.monotonic() - _built_at > settings.BIN_INDEX_TTL:
+        with _index_lock:
+            if _index is None or _dirty or time.monotonic() - _built_at > settings.BIN_INDEX_TTL:
+                from .models import Bin
+                started = time.perf_counter()
+                _dirty = False
+                _index = BinGridIndex(Bin.objects.values_list('pk', 'latitude', 'longitude').iterator())
+                _built_at = time.monotonic()
+                metrics.histogram('bins.index_build_ms').observe((time.perf_counter() - started) * 1000)
+    return _index
+
+
+def nearest_bins(lat, lng, k=10, radius_km=None, status='active', compartment=None, batch=None):
+    """
+    The k nearest bins as [(distance_km, Bin)], filtered on status (None for any)
+    and on `compartment` ('plastic', ...) not being full.
+    """
+    from .models import Bin
+
+    queryset = Bin.objects.all()
+    if status:
+        queryset = queryset.filter(status=status)
+    if compartment:
+        queryset = queryset.filter(**{f'{compartment}_full': False})
+
+    started = time.perf_counter()
+    batch = batch or max(2 * k, 32)
+    found, candidates = [], []
+    stream = get_index().nearest(lat, lng, radius_km)
+    exhausted = False
+    while len(found) < k and not exhausted:
+        candidates.clear()
+        for item in stream:
+            candidates.append(item)
+            if len(candidates) >= batch:
+                break
+        else:
+            exhausted = True
+        if not candidates:
+            break
+        bins = queryset.in_bulk([pk for _, pk in candidates])
+        found += [(round(d, 3), bins[pk]) for d, pk in candidates if pk in bins]
+    metrics.histogram('bins.nearest_ms').observe((time.perf_counter() - started) * 1000)
+    return found[:k]
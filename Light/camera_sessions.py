@@ -0,0 +1,381 @@
+"""
+Camera session manager
+Per bin / operator capture state (live feed, captured frame, QR results)
+instead of process-wide globals
+"""
+
+import functools
+import hmac
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from . import events, metrics
+from .qr_pipeline import QRScanner
+
+
+class SessionLimitReached(Exception):
+    def __init__(self, max_sessions):
+        super().__init__(f"All {max_sessions} camera sessions are streaming; try again later")
+
+
+# ==================== SESSION ====================
+
+class CameraSession:
+    """Everything one operator / bin needs for the live-feed, capture and QR flows"""
+
+    def __init__(self, key):
+        self.key = key
+        self.camera = None          # VideoCamera handle for the live feed
+        self.qr_camera = None       # VideoCamera handle for the QR scanner stream
+        self.captured_frame = None  # BGR frame frozen by "capture"
+        self.captured_at = None
+        self.qr_detected_codes = []
+        self.qr_last_results = []
+        self.qr_scanner = QRScanner()  # ROI / duplicate-frame state for this camera
+        self.last_used = time.monotonic()
+        self.lock = threading.RLock()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    @property
+    def is_active(self):
+        """A session with a running stream is never considered idle"""
+        return any(cam is not None and not cam.stopped for cam in (self.camera, self.qr_camera))
+
+    def set_camera(self, camera):
+        with self.lock:
+            self.stop_camera()
+            self.camera = camera
+
+    def stop_camera(self):
+        with self.lock:
+            if self.camera is not None:
+                self.camera.stop()
+            self.camera = None
+
+    def set_qr_camera(self, camera):
+        with self.lock:
+            self.stop_qr_camera()
+            self.qr_camera = camera
+
+    def stop_qr_camera(self):
+        with self.lock:
+            if self.qr_camera is not None:
+                self.qr_camera.stop()
+            self.qr_camera = None
+
+    def add_qr_codes(self, qr_codes, dedupe=True):
+        """Record detected codes; returns the ones not seen before in this session"""
+        with self.lock:
+            if dedupe:
+                seen = {qr['data'] for qr in self.qr_last_results}
+                qr_codes = [qr for qr in qr_codes if qr['data'] not in seen]
+                self.qr_last_results.extend(qr_codes)
+            self.qr_detected_codes.extend(qr_codes)
+        if qr_codes:
+            events.publish(events.camera_channel(self.key), 'qr', {'qr_codes': qr_codes})
+        return qr_codes
+
+    def clear_qr(self):
+        with self.lock:
+            self.qr_detected_codes = []
+            self.qr_last_results = []
+            self.qr_scanner.reset()
+        events.publish(events.camera_channel(self.key), 'qr_cleared', {})
+
+    def close(self):
+        self.stop_camera()
+        self.stop_qr_camera()
+        with self.lock:
+            self.captured_frame = None
+            self.clear_qr()
+
+
+# ==================== CAPTURE STORES ====================
+
+class LocalCaptureStore:
+    """Captured-frame metadata visible to this process only"""
+
+    def __init__(self):
+        self._data = {}
+
+    def set(self, key, meta):
+        self._data[key] = meta
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+
+class CacheCaptureStore:
+    """
+    Captured-frame metadata (and the JPEG itself) in a Django cache, so a
+    frame captured by one gunicorn worker can be classified by another.
+    Point CACHES[alias] at Redis/Memcached for multi-worker deployments.
+    """
+
+    def __init__(self, alias='default', timeout=600, prefix='camsession:'):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.prefix = prefix
+
+    def set(self, key, meta):
+        self.cache.set(self.prefix + key, meta, self.timeout)
+
+    def get(self, key):
+        return self.cache.get(self.prefix + key)
+
+    def delete(self, key):
+        self.cache.delete(self.prefix + key)
+
+
+# ==================== MANAGER ====================
+
+class CameraSessionManager:
+    """
+    Thread-safe, bounded registry of CameraSessions.
+
+    Sessions idle for longer than `idle_timeout` seconds are closed, and
+    once `max_sessions` is reached the least recently used one without a
+    running stream is evicted; if every session is streaming, new ones are
+    refused with SessionLimitReached, so memory stays bounded.
+    """
+
+    def __init__(self, max_sessions=32, idle_timeout=600, store=None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.store = store or LocalCaptureStore()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the session for `key`, creating it (and evicting others) if needed;
+        raises SessionLimitReached when every slot holds a running stream
+        """
+        evicted = []
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                evicted = self._evict_locked()
+                if len(self._sessions) < self.max_sessions:
+                    session = self._sessions[key] = CameraSession(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                session.touch()
+            metrics.gauge('camera_sessions.active').set(len(self._sessions))
+        for old in evicted:
+            self._close(old)
+        if session is None:
+            metrics.counter('camera_sessions.refused').inc()
+            raise SessionLimitReached(self.max_sessions)
+        return session
+
+    def peek(self, key):
+        return self._sessions.get(key)
+
+    def close(self, key):
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            metrics.gauge('camera_sessions.active').set(len(self._sessions))
+        if session is not None:
+            self._close(session)
+
+    def evict_idle(self):
+        with self._lock:
+            evicted = self._pop_idle_locked()
+        for session in evicted:
+            self._close(session)
+        return len(evicted)
+
+    def _pop_idle_locked(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [k for k, s in self._sessions.items() if s.last_used < cutoff and not s.is_active]
+        return [self._sessions.pop(k) for k in idle]
+
+    def _evict_locked(self):
+        evicted = self._pop_idle_locked()
+        while len(self._sessions) >= self.max_sessions:
+            # Least recently used without a running stream; never someone's live feed
+            key = next((k for k, s in self._sessions.items() if not s.is_active), None)
+            if key is None:
+                break
+            evicted.append(self._sessions.pop(key))
+        if evicted:
+            metrics.counter('camera_sessions.evicted').inc(len(evicted))
+        return evicted
+
+    def _close(self, session):
+        print(f"🧹 Closing camera session {session.key}")
+        session.close()
+        self.store.delete(session.key)
+
+    # ---------- captured frames ----------
+
+    def save_capture(self, session, frame):
+        with session.lock:
+            session.captured_frame = frame
+            session.captured_at = time.time()
+        ok, jpeg = cv2.imencode('.jpg', frame)
+        self.store.set(session.key, {
+            'captured_at': session.captured_at,
+            'width': int(frame.shape[1]),
+            'height': int(frame.shape[0]),
+            'jpeg': jpeg.tobytes() if ok else None,
+        })
+        events.publish(events.camera_channel(session.key), 'capture', {'captured_at': session.captured_at})
+
+    def capture_meta(self, session):
+        meta = self.store.get(session.key)
+        if meta is None and session.captured_frame is not None:
+            meta = {'captured_at': session.captured_at}
+        return meta
+
+    def peek_capture(self, key):
+        """capture_meta() by key, without creating a session (another worker may hold it)"""
+        session = self.peek(key)
+        return self.capture_meta(session) if session is not None else self.store.get(key)
+
+    def load_capture(self, session):
+        """Captured frame for this session, from this worker or (via the store) another one"""
+        if session.captured_frame is not None:
+            return session.captured_frame
+        meta = self.store.get(session.key)
+        if meta and meta.get('jpeg'):
+            frame = cv2.imdecode(np.frombuffer(meta['jpeg'], np.uint8), cv2.IMREAD_COLOR)
+            with session.lock:
+                session.captured_frame = frame
+                session.captured_at = meta.get('captured_at')
+            return frame
+        return None
+
+    def clear_capture(self, session):
+        with session.lock:
+            session.captured_frame = None
+            session.captured_at = None
+        self.store.delete(session.key)
+        events.publish(events.camera_channel(session.key), 'capture_cleared', {})
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+        now = time.monotonic()
+        return {
+            'max_sessions': self.max_sessions,
+            'idle_timeout': self.idle_timeout,
+            'sessions': [
+                {
+                    'key': s.key,
+                    'streaming': s.camera is not None and not s.camera.stopped,
+                    'qr_streaming': s.qr_camera is not None and not s.qr_camera.stopped,
+                    'has_capture': s.captured_frame is not None,
+                    'qr_codes': len(s.qr_detected_codes),
+                    'idle_s': round(now - s.last_used, 1),
+                }
+                for s in sessions
+            ],
+        }
+
+
+# ==================== PROCESS-WIDE MANAGER ====================
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                if settings.CAMERA_SESSION_STORE == 'cache':
+                    store = CacheCaptureStore(
+                        alias=settings.CAMERA_SESSION_CACHE, timeout=settings.CAMERA_SESSION_IDLE_TIMEOUT
+                    )
+                else:
+                    store = LocalCaptureStore()
+                _manager = CameraSessionManager(
+                    max_sessions=settings.CAMERA_SESSION_MAX,
+                    idle_timeout=settings.CAMERA_SESSION_IDLE_TIMEOUT,
+                    store=store,
+                )
+    return _manager
+
+
+def may_name_session(request):
+    """Staff, or a device sending CAMERA_SESSION_TOKEN in X-Camera-Token, may pick a named session"""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = request.headers.get('X-Camera-Token', '')
+    return bool(settings.CAMERA_SESSION_TOKEN) and hmac.compare_digest(token, settings.CAMERA_SESSION_TOKEN)
+
+
+def session_key(request, create=True):
+    """
+    Which camera session a request belongs to: an explicit ?session= (bin id
+    or operator label) from staff or token-holding devices, otherwise the
+    logged-in user, otherwise the browser's Django session. Anyone else's
+    ?session= is ignored: the session's QR results (CNIC / PASS codes) and
+    its camera:<session> event channel are not theirs to read. With
+    create=False an anonymous caller without one gets None rather than a
+    new Django session.
+    """
+    key = request.GET.get('session') or request.POST.get('session')
+    if key and may_name_session(request):
+        return f'session:{key}'
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    if not create:
+        browser = request.session.get('camera_session')
+        return f'browser:{browser}' if browser else None
+    return 'browser:' + request.session.setdefault('camera_session', uuid.uuid4().hex)
+
+
+def get_session(request):
+    """The caller's camera session, created if needed; raises SessionLimitReached"""
+    return get_manager().get(session_key(request))
+
+
+def peek_session(request):
+    """
+    The caller's camera session if this worker has one, else None. Creates no
+    Django session and no camera session: for endpoints that only read or stop.
+    """
+    key = session_key(request, create=False)
+    return get_manager().peek(key) if key else None
+
+
+def qr_scanner(request):
+    """
+    The QR scanner of the caller's session. Cookie-less callers (scripts, the
+    kiosk scan API) and callers refused a session get a one-off scanner.
+    """
+    key = session_key(request, create=False)
+    if key is not None:
+        try:
+            return get_manager().get(key).qr_scanner
+        except SessionLimitReached:
+            pass
+    return QRScanner()
+
+
+def refuse_when_full(view):
+    """Answer 503 instead of evicting someone's live feed when no camera session is free"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except SessionLimitReached as e:
+            return JsonResponse({'error': str(e)}, status=503)
+    return wrapper
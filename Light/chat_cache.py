@@ -0,0 +1,159 @@
+"""
+Chatbot answer reuse without calling the LLM
+Questions are reduced to a bag of content words (lower-cased, stop words
+dropped, plurals and common synonyms folded) and compared by Jaccard
+similarity, so "Where are the nearest bins?" and "where is a nearby bin"
+count as the same question.
+
+  FAQMatcher     fixed answers for the intents the widget's quick actions ask
+  ResponseCache  bounded LRU with a TTL of earlier LLM answers; exact lookups
+                 by normalized text, fuzzy ones through a word -> keys index
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+STOP_WORDS = frozenset('''
+    a an the i me my we our you your it its is are was be am do does did can could would should will
+    shall may might to of in on at for from with by about into how what where when which who why
+    this that these those there here please tell show explain any some and or so just hi hello hey
+    thanks thank get know want need use using away
+'''.split())
+
+# Words that ask the same thing, folded onto one token
+SYNONYMS = {
+    'nearest': 'nearby', 'near': 'nearby', 'closest': 'nearby', 'close': 'nearby',
+    'dustbin': 'bin', 'trashcan': 'bin',
+    'throw': 'dispose', 'discard': 'dispose', 'disposal': 'dispose', 'drop': 'dispose', 'recycle': 'dispose',
+    'trash': 'waste', 'garbage': 'waste', 'rubbish': 'waste',
+    'point': 'points', 'reward': 'points', 'rewards': 'points', 'earn': 'points',
+    'redeem': 'redemption', 'redeeming': 'redemption', 'cash': 'redemption',
+    'report': 'issue', 'problem': 'issue', 'complaint': 'issue',
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text):
+    """Content words of a question as a frozenset"""
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue  # also drops the "s" / "t" of where's, don't
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        words.append(SYNONYMS.get(word, word))
+    return frozenset(words)
+
+
+def normalize(text):
+    """Cache key: the sorted content words"""
+    return ' '.join(sorted(tokens(text)))
+
+
+def similarity(a, b):
+    """Jaccard similarity of two token sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ==================== FAQ ====================
+
+class FAQMatcher:
+    """[(example questions, answer)] -> answer for the closest intent above `threshold`"""
+
+    def __init__(self, intents, threshold=0.6):
+        self.threshold = threshold
+        self.intents = [([tokens(q) for q in examples], answer) for examples, answer in intents]
+
+    def match(self, question):
+        asked = tokens(question)
+        best, best_score = None, 0.0
+        for examples, answer in self.intents:
+            score = max(similarity(asked, example) for example in examples)
+            if score > best_score:
+                best, best_score = answer, score
+        return best if best_score >= self.threshold else None
+
+
+# ==================== RESPONSE CACHE ====================
+
+class ResponseCache:
+    """
+    LLM answers keyed by normalized question, at most `max_entries`, each
+    kept `ttl` seconds. get() tries the exact key, then the most similar
+    cached question sharing a word with it (>= `threshold`).
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, threshold=0.8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()   # key -> (expires_at, tokens, answer)
+        self._index = {}                # word -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, question):
+        """Returns (answer, 'exact' | 'fuzzy') or (None, None)"""
+        asked = tokens(question)
+        key = ' '.join(sorted(asked))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                metrics.counter('chatbot.cache_hits.exact').inc()
+                return entry[2], 'exact'
+
+            candidates = set()
+            for word in asked:
+                candidates |= self._index.get(word, set())
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                expires_at, cached, _ = self._entries[candidate]
+                score = similarity(asked, cached)
+                if expires_at > now and score > best_score:
+                    best, best_score = candidate, score
+            if best is not None and best_score >= self.threshold:
+                self._entries.move_to_end(best)
+                metrics.counter('chatbot.cache_hits.fuzzy').inc()
+                return self._entries[best][2], 'fuzzy'
+        metrics.counter('chatbot.cache_misses').inc()
+        return None, None
+
+    def set(self, question, answer):
+        asked = tokens(question)
+        if not asked:
+            return
+        key = ' '.join(sorted(asked))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, asked, answer)
+            for word in asked:
+                self._index.setdefault(word, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for word in entry[1]:
+            keys = self._index.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._index[word]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,20 +1,54 @@
 """
 Chatbot functionality for Smart Waste Management System
 Using Groq API for fast LLM inference
+
+Answers are tried cheapest first: the FAQ (known intents, no network call),
+then earlier LLM answers to the same or a near-identical question, then
+Groq. One AsyncGroq client per process runs on the background event loop
+(Light/aio.py), so every request reuses its keep-alive connection pool
+whether the view is served by WSGI or ASGI.
+
+/api/chatbot/stream/ relays the reply as server-sent events while Groq
+generates it. It keeps the conversation in the session and sends Groq at
+most MAX_HISTORY turns within CHATBOT_TOKEN_BUDGET prompt tokens.
 """
 
+import asyncio
+import json
 import os
-from groq import Groq
+import threading
+import time
+
+from groq import AsyncGroq
 from decouple import config
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-import json
 
-# Initialize Groq client
+from . import aio, metrics
+from .chat_cache import FAQMatcher, ResponseCache
+from .points import LEVEL_THRESHOLDS
+from .views import WASTE_POINTS_MAP
+
+# Groq client settings
 GROQ_API_KEY = config('GROQ_API_KEY', default='')
 GROQ_MODEL = config('GROQ_MODEL', default='llama-3.3-70b-versatile')
+GROQ_BASE_URL = config('GROQ_BASE_URL', default=None)  # None: the public Groq API
+GROQ_TIMEOUT = config('GROQ_TIMEOUT', default=20, cast=float)
 MAX_HISTORY = config('CHATBOT_MAX_HISTORY', default=10, cast=int)
+MAX_TOKENS = 300  # reply length
+
+# Prompt size sent to Groq: system prompt + the newest history turns that fit the budget +
+# the question. Messages longer than CHATBOT_MAX_MESSAGE_CHARS are cut.
+CHATBOT_TOKEN_BUDGET = config('CHATBOT_TOKEN_BUDGET', default=2000, cast=int)
+CHATBOT_MAX_MESSAGE_CHARS = config('CHATBOT_MAX_MESSAGE_CHARS', default=1000, cast=int)
+HISTORY_SESSION_KEY = 'chatbot_history'
+
+# Answer cache: standalone questions are answered from memory for CHATBOT_CACHE_TTL seconds;
+# a question matches a cached one when their content words overlap >= CHATBOT_FUZZY_THRESHOLD
+CHATBOT_CACHE_SIZE = config('CHATBOT_CACHE_SIZE', default=512, cast=int)
+CHATBOT_CACHE_TTL = config('CHATBOT_CACHE_TTL', default=3600, cast=int)
+CHATBOT_FUZZY_THRESHOLD = config('CHATBOT_FUZZY_THRESHOLD', default=0.8, cast=float)
 
 # System prompt to restrict chatbot to project-specific topics
 SYSTEM_PROMPT = """You are an AI assistant for the TRASH2CASH Smart Waste Management System. Your role is to help users understand and navigate the dashboard features.
@@ -50,17 +84,172 @@ Assistant: "I'm here to assist with the TRASH2CASH waste management system. I ca
 Keep responses under 150 words. Be helpful and direct."""
 
 
-def get_groq_client():
-    """Initialize and return Groq client"""
+# ==================== FAQ ====================
+
+DISPOSE_ANSWER = (
+    "To dispose waste: 1) Go to the Dashboard and click 'Scan QR Code', 2) Scan the QR code on any smart bin, "
+    "3) The AI will classify your waste type, 4) Receive points based on the waste category. "
+    "You can track your disposal history in the Waste History section."
+)
+
+NEARBY_BINS_ANSWER = (
+    "To find nearby smart bins: Go to 'Find Nearby Bins' in the menu. The interactive map shows all available "
+    "smart bins with their locations, capacity status, and distance from your current location. "
+    "Green markers indicate bins with good capacity."
+)
+
+
+def points_answer():
+    rates = ', '.join(f"{waste.capitalize()} {points}"
+                      for waste, points in sorted(WASTE_POINTS_MAP.items(), key=lambda item: -item[1]))
+    levels = ', '.join(f"level {level} at {minimum}" for minimum, level in reversed(LEVEL_THRESHOLDS))
+    return (
+        f"Each disposal earns points by waste type: {rates}. Your total and level are shown on the Dashboard; "
+        f"levels rise with total points ({levels} points). Spend points in the Rewards Store or under "
+        "'Redeem Points'."
+    )
+
+
+REDEEM_ANSWER = (
+    "To redeem points: Go to 'Redeem Points' in the menu, choose a category (bill payment, voucher or charity) "
+    "and enter the points to use. The minimum is 70 points and 2 points are worth 1 PKR. "
+    "Requests stay pending until processed; follow them in 'Redemption History'."
+)
+
+# (example questions, answer) for the questions the widget's quick actions and users ask most
+FAQ_INTENTS = [
+    (["How do I dispose waste?", "How to dispose waste", "How can I throw my trash",
+      "Waste disposal process", "How does disposal work"], DISPOSE_ANSWER),
+    (["Where are nearby bins?", "Find nearby bins", "Where is the nearest bin", "Nearby smart bins map"],
+     NEARBY_BINS_ANSWER),
+    (["How does the points system work?", "How do I earn points", "Points system",
+      "How many points per waste type"], points_answer()),
+    (["How do I redeem points?", "Redeem points", "How to redeem my points for cash", "Redemption process"],
+     REDEEM_ANSWER),
+]
+
+faq = FAQMatcher(FAQ_INTENTS, threshold=0.7)
+response_cache = ResponseCache(CHATBOT_CACHE_SIZE, CHATBOT_CACHE_TTL, CHATBOT_FUZZY_THRESHOLD)
+
+
+# ==================== GROQ CLIENT ====================
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_async_groq_client():
+    """Process-wide Groq client; only used on the background loop, where its connection pool lives"""
+    global _client
     if not GROQ_API_KEY:
         return None
-    return Groq(api_key=GROQ_API_KEY)
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, timeout=GROQ_TIMEOUT)
+    return _client
+
+
+async def _create(client, messages, stream=False):
+    return await client.chat.completions.create(
+        messages=messages,
+        model=GROQ_MODEL,
+        temperature=0.7,
+        max_tokens=MAX_TOKENS,
+        top_p=0.9,
+        stream=stream,
+    )
+
+
+async def complete(client, messages):
+    """Run the completion on the background loop and await it from the caller's loop"""
+    return await asyncio.wrap_future(aio.submit(_create(client, messages)))
+
+
+def reset_client():
+    """Close the shared client (settings changed, or tests)"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        aio.submit(client.close()).result(timeout=5)
+
+
+def _after_fork_in_child():
+    # The pool's connections and the background loop belong to the parent process
+    global _client, _client_lock
+    _client = None
+    _client_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# ==================== PROMPT ====================
+
+def estimate_tokens(text):
+    """Rough prompt cost of one message: ~4 characters per token plus per-message overhead"""
+    return len(text) // 4 + 4
+
+
+def build_messages(history, user_message):
+    """
+    System prompt + the newest history turns that fit MAX_HISTORY and
+    CHATBOT_TOKEN_BUDGET + the user's message. Only user / assistant turns
+    with text content are kept, so history cannot carry extra system prompts.
+    """
+    user_message = user_message[:CHATBOT_MAX_MESSAGE_CHARS]
+    budget = CHATBOT_TOKEN_BUDGET - estimate_tokens(SYSTEM_PROMPT) - estimate_tokens(user_message)
+    turns = []
+    for turn in reversed(history[-MAX_HISTORY:] if isinstance(history, list) else []):
+        if not isinstance(turn, dict) or turn.get('role') not in ('user', 'assistant'):
+            continue
+        content = turn.get('content')
+        if not isinstance(content, str) or not content:
+            continue
+        content = content[:CHATBOT_MAX_MESSAGE_CHARS]
+        budget -= estimate_tokens(content)
+        if budget < 0:
+            break
+        turns.append({"role": turn['role'], "content": content})
+    turns.reverse()
+    metrics.histogram('chatbot.prompt_tokens').observe(CHATBOT_TOKEN_BUDGET - max(budget, 0))
+    return [{"role": "system", "content": SYSTEM_PROMPT}] + turns + [{"role": "user", "content": user_message}]
+
+
+def local_answer(user_message, history):
+    """(answer, 'faq' | 'cache') when no Groq call is needed, else (None, None)"""
+    # Known intents are answered locally
+    answer = faq.match(user_message)
+    if answer is not None:
+        return answer, 'faq'
+    # Earlier answers only stand in for standalone questions: history can change the answer
+    if not history:
+        answer, _ = response_cache.get(user_message)
+        if answer is not None:
+            return answer, 'cache'
+    return None, None
+
+
+# ==================== VIEWS ====================
+
+def _reply(answer, source, started, message_id=None):
+    metrics.counter(f'chatbot.answers.{source}').inc()
+    metrics.histogram(f'chatbot.latency_ms.{source}').observe((time.perf_counter() - started) * 1000)
+    return JsonResponse({
+        'success': True,
+        'response': answer,
+        'message_id': message_id,
+        'source': source,
+    })
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def chatbot_message(request):
+async def chatbot_message(request):
     """Handle chatbot message requests"""
+    started = time.perf_counter()
     try:
         data = json.loads(request.body)
         user_message = data.get('message', '').strip()
@@ -70,45 +259,36 @@ def chatbot_message(request):
             return JsonResponse({
                 'error': 'Message is required'
             }, status=400)
-        
-        # Initialize Groq client
-        client = get_groq_client()
+        metrics.counter('chatbot.requests').inc()
+
+        answer, source = local_answer(user_message, conversation_history)
+        if answer is not None:
+            return _reply(answer, source, started)
+
+        client = get_async_groq_client()
         if not client:
             return JsonResponse({
                 'error': 'Chatbot is currently unavailable'
             }, status=503)
         
-        # Prepare messages for API
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT}
-        ]
-        
-        # Add conversation history (limited to MAX_HISTORY)
-        if conversation_history:
-            messages.extend(conversation_history[-MAX_HISTORY:])
-        
-        # Add current user message
-        messages.append({
-            "role": "user",
-            "content": user_message
-        })
+        # System prompt + client-sent history (checked and trimmed) + current user message
+        messages = build_messages(conversation_history, user_message)
         
         # Get response from Groq
-        chat_completion = client.chat.completions.create(
-            messages=messages,
-            model=GROQ_MODEL,
-            temperature=0.7,
-            max_tokens=300,
-            top_p=0.9,
-        )
+        llm_started = time.perf_counter()
+        try:
+            chat_completion = await complete(client, messages)
+        except Exception:
+            metrics.counter('chatbot.llm_errors').inc()
+            raise
+        finally:
+            metrics.histogram('chatbot.llm_ms').observe((time.perf_counter() - llm_started) * 1000)
         
         assistant_message = chat_completion.choices[0].message.content
+        if assistant_message and not conversation_history:
+            response_cache.set(user_message, assistant_message)
         
-        return JsonResponse({
-            'success': True,
-            'response': assistant_message,
-            'message_id': chat_completion.id
-        })
+        return _reply(assistant_message, 'llm', started, message_id=chat_completion.id)
         
     except json.JSONDecodeError:
         return JsonResponse({
@@ -120,13 +300,149 @@ def chatbot_message(request):
         }, status=500)
 
 
+# ==================== STREAMING ====================
+
+def _sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+class Turn:
+    """One question and the answer as it streams in"""
+
+    def __init__(self, question, history):
+        self.question = question
+        self.history = history
+        self.parts = []
+        self.complete = False
+
+    def updated_history(self):
+        turns = [{"role": "user", "content": self.question[:CHATBOT_MAX_MESSAGE_CHARS]},
+                 {"role": "assistant", "content": ''.join(self.parts)}]
+        return (self.history + turns)[-MAX_HISTORY:]
+
+
+async def answer_events(turn, started, client=None, messages=None, answer=None, source='llm'):
+    """
+    SSE body for one turn, run on the background loop: a `token` event per
+    chunk of text, then `done` (source, message_id, ttft_ms) or `error`.
+    A local `answer` is sent as a single token.
+    """
+    ttft_ms = None
+    message_id = None
+    if answer is not None:
+        turn.parts.append(answer)
+        ttft_ms = (time.perf_counter() - started) * 1000
+        yield _sse('token', {'text': answer})
+    else:
+        llm_started = time.perf_counter()
+        stream = None
+        try:
+            stream = await _create(client, messages, stream=True)
+            async for chunk in stream:
+                message_id = chunk.id
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                    metrics.histogram('chatbot.ttft_ms').observe(ttft_ms)
+                turn.parts.append(text)
+                yield _sse('token', {'text': text})
+        except Exception as e:
+            metrics.counter('chatbot.llm_errors').inc()
+            yield _sse('error', {'error': f'An error occurred: {str(e)}'})
+            return
+        finally:
+            if stream is not None:
+                await stream.close()
+            metrics.histogram('chatbot.llm_ms').observe((time.perf_counter() - llm_started) * 1000)
+        if turn.parts and not turn.history:
+            response_cache.set(turn.question, ''.join(turn.parts))
+
+    turn.complete = True
+    metrics.counter(f'chatbot.answers.{source}').inc()
+    metrics.histogram(f'chatbot.latency_ms.{source}').observe((time.perf_counter() - started) * 1000)
+    yield _sse('done', {'source': source, 'message_id': message_id,
+                        'ttft_ms': round(ttft_ms, 1) if ttft_ms is not None else None})
+
+
+def stream_turn(request, turn, events):
+    """WSGI body: relay the events, then store the turn in the session"""
+    yield from aio.iterate_on_loop(events)
+    if turn.complete:
+        request.session[HISTORY_SESSION_KEY] = turn.updated_history()
+        request.session.save()
+
+
+async def astream_turn(request, turn, events):
+    """ASGI body: the same without holding a thread between chunks"""
+    async for part in aio.aiterate_on_loop(events):
+        yield part
+    if turn.complete:
+        await request.session.aset(HISTORY_SESSION_KEY, turn.updated_history())
+        await request.session.asave()
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def chatbot_stream(request):
+    """
+    POST /api/chatbot/stream/  {"message": "...", "new_conversation": false}
+
+    Streams the reply as text/event-stream while it is generated:
+      event: token  data: {"text": "..."}
+      event: done   data: {"source": "llm", "message_id": "...", "ttft_ms": 412.0}
+      event: error  data: {"error": "..."}
+    The conversation is kept in the session; a client-sent history is ignored.
+    """
+    started = time.perf_counter()
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON data'}, status=400)
+    user_message = (data.get('message') or '').strip()
+    if not user_message:
+        return JsonResponse({'error': 'Message is required'}, status=400)
+    metrics.counter('chatbot.requests').inc()
+
+    history = [] if data.get('new_conversation') else await request.session.aget(HISTORY_SESSION_KEY, [])
+    turn = Turn(user_message, history)
+    answer, source = local_answer(user_message, history)
+    if answer is not None:
+        events = answer_events(turn, started, answer=answer, source=source)
+    else:
+        client = get_async_groq_client()
+        if not client:
+            return JsonResponse({'error': 'Chatbot is currently unavailable'}, status=503)
+        events = answer_events(turn, started, client=client, messages=build_messages(history, user_message))
+
+    # Written now so the session middleware saves it (and sets the cookie of a new session)
+    await request.session.aset(HISTORY_SESSION_KEY, history)
+    body = astream_turn if aio.is_asgi(request) else stream_turn
+    response = StreamingHttpResponse(body(request, turn, events), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
+
+
+def cache_stats():
+    requests = metrics.counter('chatbot.requests').value
+    local = metrics.counter('chatbot.answers.faq').value + metrics.counter('chatbot.answers.cache').value
+    return {
+        'entries': len(response_cache),
+        'requests': requests,
+        'answered_locally': local,
+        'hit_rate': round(local / requests, 3) if requests else None,
+    }
+
+
 @require_http_methods(["GET"])
 def chatbot_health(request):
     """Check if chatbot is available"""
-    client = get_groq_client()
-    is_available = client is not None and GROQ_API_KEY != ''
+    is_available = GROQ_API_KEY != ''
     
     return JsonResponse({
         'available': is_available,
-        'model': GROQ_MODEL if is_available else None
+        'model': GROQ_MODEL if is_available else None,
+        'cache': cache_stats(),
     })
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def live_events(request):
+    """live_events: whether pages should open /api/events/ (settings.EVENTS_SSE)"""
+    return {'live_events': settings.EVENTS_SSE}
@@ -0,0 +1,147 @@
+"""
+Per-user daily rollup (UserDailyStats)
+The dashboard, profile and history pages read disposal counts and points
+from one row per user per day instead of aggregating every WasteRecord.
+
+points.record_disposal()/record_disposals() keep the rollup current in the
+same transaction as the WasteRecord insert. Deletes go through
+delete_records() (the admin does), which rebuilds the affected users' rollup
+after one bulk DELETE; deleting a User needs nothing, the cascade drops their
+rollup too. Migration 0017 backfills the rollup for records written before it
+existed. Anything else that writes or deletes WasteRecord rows (imports, edits
+in place, shell) should be followed by `python manage.py rebuild_daily_stats`.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import UserDailyStats, WasteRecord
+
+# Waste type -> rollup counter (exact match, like the history page filters)
+TYPE_FIELDS = {
+    'plastic': 'plastic_count',
+    'paper': 'paper_count',
+    'metal': 'metal_count',
+    'glass': 'glass_count',
+}
+
+STAT_FIELDS = ['items', 'points', 'weight_kg'] + list(TYPE_FIELDS.values())
+
+
+def local_date(dt):
+    return timezone.localdate(dt) if timezone.is_aware(dt) else dt.date()
+
+
+def add(deltas, record):
+    """Accumulate one WasteRecord into {(user_id, date): {field: delta}}"""
+    delta = deltas.setdefault((record.user_id, local_date(record.disposed_at)), dict.fromkeys(STAT_FIELDS, 0))
+    delta['items'] += 1
+    delta['points'] += record.points_earned or 0
+    delta['weight_kg'] += record.weight_kg or 0.0
+    field = TYPE_FIELDS.get((record.waste_type or '').lower())
+    if field:
+        delta[field] += 1
+    return deltas
+
+
+def apply(deltas, create=True):
+    """Add the deltas to the rollup; one UPDATE (or INSERT) per user-day. Call inside a transaction."""
+    for (user_id, date), delta in deltas.items():
+        changes = {field: F(field) + Value(value) for field, value in delta.items() if value}
+        rows = UserDailyStats.objects.filter(user_id=user_id, date=date)
+        if rows.update(**changes) or not create:
+            continue
+        try:
+            with transaction.atomic():
+                UserDailyStats.objects.create(user_id=user_id, date=date, **delta)
+        except IntegrityError:
+            # Another disposal created the row first
+            rows.update(**changes)
+
+
+def record(records):
+    """Roll WasteRecords into the daily stats"""
+    deltas = {}
+    for r in records:
+        add(deltas, r)
+    apply(deltas)
+
+
+def rebuild(user_ids=None, batch_size=1000, record_model=WasteRecord, stats_model=UserDailyStats):
+    """
+    Recompute the rollup from WasteRecord (all users, or just `user_ids`); returns rows written.
+    Migrations pass their historical models.
+    """
+    records = record_model.objects.all()
+    stats = stats_model.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+        stats = stats.filter(user_id__in=user_ids)
+
+    type_counts = {
+        field: Count('id', filter=Q(waste_type__iexact=waste_type))
+        for waste_type, field in TYPE_FIELDS.items()
+    }
+    rows = (
+        records.annotate(day=TruncDate('disposed_at'))
+        .values('user_id', 'day')
+        .annotate(
+            items=Count('id'),
+            points=Coalesce(Sum('points_earned'), 0),
+            weight=Coalesce(Sum('weight_kg'), Value(0.0), output_field=FloatField()),
+            **type_counts,
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        stats.delete()
+        created = stats_model.objects.bulk_create(
+            (
+                stats_model(
+                    user_id=row['user_id'], date=row['day'], items=row['items'], points=row['points'],
+                    weight_kg=row['weight'], **{field: row[field] for field in TYPE_FIELDS.values()}
+                )
+                for row in rows.iterator()
+            ),
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def delete_records(records):
+    """
+    Delete a WasteRecord queryset, then rebuild the rollup of the users it
+    touched; returns the number of records deleted
+    """
+    with transaction.atomic():
+        user_ids = set(records.order_by().values_list('user_id', flat=True).distinct())
+        deleted, _ = records.delete()
+        rebuild(user_ids)
+    return deleted
+
+
+def totals_query(user, date_from=None, date_to=None):
+    """The user's rollup rows between two dates (inclusive), as summed by totals()"""
+    stats = UserDailyStats.objects.filter(user=user)
+    if date_from:
+        stats = stats.filter(date__gte=date_from)
+    if date_to:
+        stats = stats.filter(date__lte=date_to)
+    return stats
+
+
+def totals(user, date_from=None, date_to=None):
+    """
+    Sum of the user's rollup between two dates (inclusive), shaped like the old
+    WasteRecord aggregate: total_items, total_points, plastic, paper, metal, glass
+    """
+    return totals_query(user, date_from, date_to).aggregate(
+        total_items=Coalesce(Sum('items'), 0),
+        total_points=Sum('points'),
+        plastic=Coalesce(Sum('plastic_count'), 0),
+        paper=Coalesce(Sum('paper_count'), 0),
+        metal=Coalesce(Sum('metal_count'), 0),
+        glass=Coalesce(Sum('glass_count'), 0),
+    )
@@ -0,0 +1,501 @@
+"""
+Auto-disposal jobs for the QR LED screen
+The open lid -> wait -> capture -> classify -> sort -> close -> record sequence
+runs as a state machine on a small worker pool instead of inside the request
+
+    queued -> lid_open -> capturing -> classifying -> sorting -> closed -> recorded
+                                (any step) -> failed
+
+Waiting (user placing waste, waste dropping) is a timer, not a sleeping
+thread, so a handful of workers can drive many bins at once. With
+BIN_ASYNC_COMMANDS the lid / compartment commands are coroutines on the
+background event loop too: a slow or unreachable bin holds no pool worker
+while its command retries.
+"""
+
+import heapq
+import inspect
+import itertools
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import aio, bin_client, events, metrics, snapshot
+
+STATES = ('queued', 'lid_open', 'capturing', 'classifying', 'sorting', 'closed', 'recorded', 'failed')
+
+COMPARTMENT_MAP = {
+    'plastic': 'plastic',
+    'paper': 'paper',
+    'metal': 'metal',
+    'glass': 'glass',
+    'cardboard': 'paper',
+    'trash': 'plastic'  # Default
+}
+
+
+class BinBusy(Exception):
+    def __init__(self, job_id):
+        super().__init__(f"Bin is busy with disposal {job_id}")
+        self.job_id = job_id
+
+
+# ==================== JOB ====================
+
+class DisposalJob:
+    def __init__(self, user, bin_ip, camera_url):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.bin_ip = bin_ip
+        self.camera_url = camera_url
+        self.state = 'queued'
+        self.step = 0
+        self.history = [('queued', time.time())]
+        self.frame = None        # in-process only, never stored
+        self.captured_at = None
+        self.waste_type = None
+        self.confidence = None
+        self.result = None
+        self.error = None
+        self.done = False
+        self.created_at = time.time()
+
+    def transition(self, state):
+        self.state = state
+        self.history.append((state, time.time()))
+
+    def snapshot(self):
+        return {
+            'job_id': self.id,
+            'user_id': self.user.id,
+            'bin_ip': self.bin_ip,
+            'state': self.state,
+            'done': self.done,
+            'history': [{'state': s, 'at': at} for s, at in self.history],
+            'waste_type': self.waste_type,
+            'confidence': self.confidence,
+            'captured_at': self.captured_at,
+            'disposal_data': self.result,
+            'error': self.error,
+            'elapsed_s': round(time.time() - self.created_at, 2),
+        }
+
+
+# ==================== DEFAULT HARDWARE / MODEL HOOKS ====================
+
+def bin_command(job, command):
+    """Send a command through the pooled bin client; bin errors are logged, never fatal (as before)"""
+    try:
+        response = bin_client.get_client(job.bin_ip).command(command)
+        print(f"✅ Bin /{command}: {response.status_code}")
+    except bin_client.BinError as e:
+        print(f"⚠️ Bin /{command} warning: {str(e)}")
+
+
+async def abin_command(job, command):
+    """bin_command() on the async client; the runner awaits it on the background event loop"""
+    try:
+        response = await bin_client.get_async_client(job.bin_ip).command(command)
+        print(f"✅ Bin /{command}: {response.status_code}")
+    except bin_client.BinError as e:
+        print(f"⚠️ Bin /{command} warning: {str(e)}")
+
+
+def capture_frame(job):
+    """Freshest frame from a warm stream broker or the camera's still endpoint"""
+    if settings.CAMERA_KEEP_WARM:
+        snapshot.keep_warm(job.camera_url)
+    snap = snapshot.capture_snapshot(job.camera_url, snapshot_url=settings.ESP32_CAM_SNAPSHOT_URL)
+    if snap is None:
+        return None
+    job.captured_at = snap.timestamp
+    print(f"✅ Image captured via {snap.source}")
+    return snap.frame
+
+
+def classify_frame(frame):
+    """Return (waste_type, confidence %)"""
+    from .model_registry import classify, CLASS_LABELS as class_labels
+    from .preprocessing import preprocess
+
+    predictions = classify(preprocess(frame))
+    predicted_index = int(np.argmax(predictions))
+    return class_labels[predicted_index].lower(), float(np.max(predictions) * 100)
+
+
+def record_disposal(job):
+    """Save DetectedIssues + WasteRecord and update the user's profile"""
+    from . import points as points_ledger
+    from .models import DetectedIssues
+    from .views import calculate_points
+
+    user = job.user
+    waste_type = job.waste_type
+    points = calculate_points(waste_type)
+
+    with transaction.atomic():
+        detected_issue = DetectedIssues.objects.create(
+            user=user,
+            result=waste_type,
+            confidence=job.confidence,
+            is_processed=True,
+            points_awarded=points
+        )
+        waste_record, award = points_ledger.record_disposal(
+            user, waste_type, points,
+            detected_issue=detected_issue,
+            disposed_at=timezone.now()
+        )
+
+    print(f"✅ Disposal complete! User earned {points} points")
+    return {
+        'waste_type': waste_type,
+        'points_earned': points,
+        'total_points': award.total_points,
+        'confidence': job.confidence,
+        'record_id': waste_record.id
+    }
+
+
+# ==================== JOB STORES ====================
+
+class LocalJobStore:
+    """Job snapshots visible to this process only"""
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._data = {}
+
+    def set(self, job_id, snapshot):
+        now = time.time()
+        self._data[job_id] = (now + self.ttl, snapshot)
+        if len(self._data) > 1024:
+            for key in [k for k, (expires, _) in self._data.items() if expires < now]:
+                self._data.pop(key, None)
+
+    def get(self, job_id):
+        entry = self._data.get(job_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+
+class CacheJobStore:
+    """Job snapshots in a Django cache, so /api/qr/status/ works on any worker"""
+
+    def __init__(self, alias='default', ttl=600, prefix='disposal-job:'):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def set(self, job_id, snapshot):
+        self.cache.set(self.prefix + job_id, snapshot, self.ttl)
+
+    def get(self, job_id):
+        return self.cache.get(self.prefix + job_id)
+
+
+# ==================== RUNNER ====================
+
+class DisposalRunner:
+    """
+    Drives DisposalJobs through STEPS on a thread pool.
+
+    Each step does a short action and returns how long to wait before the
+    next one; waits are kept in a timer heap served by one scheduler thread.
+    `bin_command` may be a coroutine function: the step then returns a
+    Future and the job resumes on the pool once the command has finished.
+    """
+
+    def __init__(self, workers=4, store=None, place_seconds=5.0, drop_seconds=2.0,
+                 bin_command=bin_command, capture=capture_frame, classify=classify_frame,
+                 record=record_disposal):
+        self.place_seconds = place_seconds
+        self.drop_seconds = drop_seconds
+        self.store = store or LocalJobStore()
+        self.bin_command = bin_command
+        self.capture = capture
+        self.classify = classify
+        self.record = record
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='disposal')
+        self._jobs = {}
+        self._active_bins = {}     # bin_ip -> job_id
+        self._timers = []          # heap of (due, seq, job_id)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._timer_loop, name='disposal-timers', daemon=True)
+        self._thread.start()
+
+    # ---------- steps ----------
+
+    def _command(self, job, command, then=0):
+        """Send a bin command; an async hook runs on the event loop and this returns a Future of `then`"""
+        sent = self.bin_command(job, command)
+        if inspect.isawaitable(sent):
+            async def wait():
+                await sent
+                return then
+            return aio.submit(wait())
+        return then
+
+    def _open_lid(self, job):
+        print("🔓 Opening bin lid...")
+        print(f"⏱️ Waiting {self.place_seconds}s for user to place waste...")
+        return self._command(job, 'openlid', then=self.place_seconds)
+
+    def _capture(self, job):
+        print("📸 Capturing image...")
+        try:
+            job.frame = self.capture(job)
+        except Exception as e:
+            print(f"⚠️ Camera capture failed: {str(e)}")
+            job.frame = None
+        return 0
+
+    def _classify(self, job):
+        if job.frame is not None:
+            job.waste_type, job.confidence = self.classify(job.frame)
+            print(f"✅ Classified as: {job.waste_type} ({job.confidence:.2f}%)")
+        else:
+            # Default to plastic if no camera
+            job.waste_type, job.confidence = 'plastic', 85.0
+            print(f"⚠️ Using default: {job.waste_type}")
+        job.frame = None
+        return 0
+
+    def _sort(self, job):
+        compartment = COMPARTMENT_MAP.get(job.waste_type, 'plastic')
+        print(f"🚪 Opening {compartment} compartment...")
+        return self._command(job, compartment, then=self.drop_seconds)
+
+    def _close(self, job):
+        print("🔒 Closing bin...")
+        return self._command(job, 'closelid')
+
+    def _record(self, job):
+        print("💾 Saving to database...")
+        try:
+            job.result = self.record(job)
+        finally:
+            connection.close()  # pool threads never hit request_finished
+        return None
+
+    STEPS = (
+        ('lid_open', _open_lid),
+        ('capturing', _capture),
+        ('classifying', _classify),
+        ('sorting', _sort),
+        ('closed', _close),
+        ('recorded', _record),
+    )
+
+    # ---------- scheduling ----------
+
+    def submit(self, user, bin_ip=None, camera_url=None):
+        """Queue a disposal and return the job immediately; raises BinBusy"""
+        bin_ip = bin_ip or settings.ESP32_WROOM_IP
+        camera_url = camera_url or f"http://{settings.ESP32_CAM_IP}:81/stream"
+        job = DisposalJob(user, bin_ip, camera_url)
+        with self._cond:
+            active = self._active_bins.get(bin_ip)
+            if active is not None:
+                raise BinBusy(active)
+            self._active_bins[bin_ip] = job.id
+            self._jobs[job.id] = job
+        try:
+            self._publish(job)
+        except Exception:
+            self._release(job)
+            raise
+        metrics.counter('disposal.jobs_started').inc()
+        metrics.gauge('disposal.jobs_active').set(len(self._active_bins))
+        self._schedule(job, 0)
+        return job
+
+    def _schedule(self, job, delay):
+        if delay <= 0:
+            self._executor.submit(self._run_step, job)
+            return
+        with self._cond:
+            heapq.heappush(self._timers, (time.monotonic() + delay, next(self._seq), job))
+            self._cond.notify()
+
+    def _timer_loop(self):
+        while True:
+            with self._cond:
+                while not self._stopped and (
+                    not self._timers or self._timers[0][0] > time.monotonic()
+                ):
+                    timeout = self._timers[0][0] - time.monotonic() if self._timers else None
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, job = heapq.heappop(self._timers)
+            self._executor.submit(self._run_step, job)
+
+    def _run_step(self, job):
+        # Runs on the pool: an exception escaping here would vanish in the Future
+        try:
+            state, handler = self.STEPS[job.step]
+            if job.step < len(self.STEPS) - 1:
+                # Intermediate states describe the step in progress; 'recorded' only once saved
+                job.transition(state)
+                self._publish(job)
+            started = time.perf_counter()
+            try:
+                delay = handler(self, job)
+            except Exception as e:
+                self._advance(job, started, error=e)
+                return
+            if isinstance(delay, Future):
+                # An async bin command is in flight; continue on the pool when it completes
+                delay.add_done_callback(lambda done: self._resume(job, started, done))
+                return
+            self._advance(job, started, delay)
+        except Exception as e:
+            self._abort(job, e)
+
+    def _resume(self, job, started, done):
+        try:
+            error = done.exception()
+        except CancelledError as e:
+            error = e
+        delay = done.result() if error is None else None
+        try:
+            self._executor.submit(self._step_done, job, started, delay, error)
+        except RuntimeError:
+            self._abort(job, RuntimeError('runner stopped'))
+
+    def _step_done(self, job, started, delay=None, error=None):
+        try:
+            self._advance(job, started, delay, error)
+        except Exception as e:
+            self._abort(job, e)
+
+    def _advance(self, job, started, delay=None, error=None):
+        state, _ = self.STEPS[job.step]
+        last = job.step == len(self.STEPS) - 1
+        metrics.histogram(f'disposal.step_ms.{state}').observe((time.perf_counter() - started) * 1000)
+        if error is not None:
+            traceback.print_exception(type(error), error, error.__traceback__)
+            job.error = str(error)
+            job.transition('failed')
+            if 0 < job.step < 5:
+                try:
+                    self._command(job, 'closelid')  # don't leave the lid open
+                except Exception as e:
+                    print(f"⚠️ Could not close the lid after failure: {e}")
+            self._finish(job)
+            return
+
+        job.step += 1
+        if last:
+            job.transition(state)
+            self._finish(job)
+        else:
+            self._publish(job)
+            self._schedule(job, delay or 0)
+
+    def _finish(self, job):
+        job.done = True
+        self._release(job)  # before anything that can raise: a stuck entry blocks the bin for good
+        metrics.counter(f'disposal.jobs_{job.state}').inc()
+        metrics.histogram('disposal.job_ms').observe((time.time() - job.created_at) * 1000)
+        self._publish(job)
+
+    def _release(self, job):
+        with self._cond:
+            if self._active_bins.get(job.bin_ip) == job.id:
+                del self._active_bins[job.bin_ip]
+            self._jobs.pop(job.id, None)
+        metrics.gauge('disposal.jobs_active').set(len(self._active_bins))
+
+    def _abort(self, job, error):
+        """The runner's own bookkeeping raised: fail the job and free its bin whatever else breaks"""
+        traceback.print_exception(type(error), error, error.__traceback__)
+        first = not job.done
+        if first:
+            job.done = True
+            job.error = job.error or str(error)
+            job.transition('failed')
+            metrics.counter('disposal.jobs_failed').inc()
+            if 0 < job.step < 5:
+                try:
+                    self._command(job, 'closelid')
+                except Exception as e:
+                    print(f"⚠️ Could not close the lid after failure: {e}")
+        self._release(job)
+        if first:
+            try:
+                self._publish(job)
+            except Exception as e:
+                print(f"⚠️ Could not publish failed disposal {job.id}: {e}")
+
+    def _publish(self, job):
+        snapshot = job.snapshot()
+        self.store.set(job.id, snapshot)
+        for channel in (events.job_channel(job.id), events.user_channel(job.user.id), events.bin_channel(job.bin_ip)):
+            events.publish(channel, 'job', snapshot)
+
+    # ---------- queries ----------
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self.store.get(job_id)
+
+    def active_jobs(self):
+        return [job.snapshot() for job in list(self._jobs.values())]
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+
+# ==================== PROCESS-WIDE RUNNER ====================
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                if settings.DISPOSAL_JOB_STORE == 'cache':
+                    store = CacheJobStore(alias=settings.DISPOSAL_JOB_CACHE, ttl=settings.DISPOSAL_JOB_TTL)
+                else:
+                    store = LocalJobStore(ttl=settings.DISPOSAL_JOB_TTL)
+                _runner = DisposalRunner(
+                    workers=settings.DISPOSAL_WORKERS,
+                    store=store,
+                    place_seconds=settings.DISPOSAL_PLACE_SECONDS,
+                    drop_seconds=settings.DISPOSAL_DROP_SECONDS,
+                    bin_command=abin_command if settings.BIN_ASYNC_COMMANDS else bin_command,
+                )
+    return _runner
+
+
+def _after_fork_in_child():
+    # The pool and timer threads do not survive fork(); start fresh in the worker
+    global _runner, _runner_lock
+    _runner = None
+    _runner_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
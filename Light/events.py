@@ -0,0 +1,334 @@
+"""
+Live event push (Server-Sent Events)
+Pages subscribe to channels on /api/events/ instead of polling:
+
+    user:<pk>           points updates, the user's disposal jobs
+    camera:<session>    QR detections, frame captured / cleared
+    job:<id>            one disposal job's progress
+    bin:<bin ip or id>  disposal jobs on that bin (staff)
+
+Events carry a broker-wide increasing id. EventSource reconnects with
+Last-Event-ID and the broker replays what the channel missed from a short
+per-channel history.
+
+EVENTS_BACKEND='memory' delivers within one process. With several gunicorn
+workers use EVENTS_BACKEND='redis': publishes go through Redis PUBLISH (and
+a capped history list), and each worker runs one listener thread that
+PSUBSCRIBEs to every channel and hands events to its local subscribers.
+
+Under ASGI the view serves asse_stream(), which awaits events on the event
+loop, so an open stream holds no worker thread.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from django.conf import settings
+
+from . import aio, metrics
+
+Event = namedtuple('Event', ['id', 'channel', 'type', 'data'])
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def camera_channel(session_key):
+    return f'camera:{session_key}'
+
+
+def job_channel(job_id):
+    return f'job:{job_id}'
+
+
+def bin_channel(bin_ref):
+    return f'bin:{bin_ref}'
+
+
+# ==================== SUBSCRIPTIONS ====================
+
+class Subscription:
+    """One client's queue of events from a set of channels"""
+
+    def __init__(self, broker, channels, maxsize=256, after=None):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.after = after or 0  # ignore events the client already has
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self._seen = deque(maxlen=maxsize)  # ids already delivered (replay and live can overlap)
+        self._waiters = aio.Waiters()
+
+    def put(self, event):
+        if event.id <= self.after or event.id in self._seen:
+            return
+        self._seen.append(event.id)
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Slow client: drop the oldest event rather than block the publisher
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(event)
+            self.dropped += 1
+            metrics.counter('events.dropped').inc()
+        self._waiters.notify_all()
+
+    def get(self, timeout=None):
+        """Next event, or None after `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout=None):
+        """get() for coroutines: waits on the event loop instead of blocking a thread"""
+        await self._waiters.wait_for(lambda: not self.queue.empty(), timeout=timeout)
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class BaseBroker:
+    def __init__(self, history=100, queue_size=256):
+        self.history_size = history
+        self.queue_size = queue_size
+        self._subscribers = {}  # channel -> set of Subscriptions
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, last_event_id=None):
+        """Subscribe to `channels`; with last_event_id, first replay newer events from history"""
+        sub = Subscription(self, channels, self.queue_size, after=last_event_id)
+        with self._lock:
+            for channel in sub.channels:
+                self._subscribers.setdefault(channel, set()).add(sub)
+            count = sum(len(subs) for subs in self._subscribers.values())
+        metrics.gauge('events.subscriptions').set(count)
+        if last_event_id is not None:
+            missed = [e for channel in sub.channels for e in self.history(channel) if e.id > last_event_id]
+            for event in sorted(missed, key=lambda e: e.id):
+                sub.put(event)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._subscribers.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[channel]
+            count = sum(len(subs) for subs in self._subscribers.values())
+        metrics.gauge('events.subscriptions').set(count)
+
+    def _deliver(self, event):
+        with self._lock:
+            subs = list(self._subscribers.get(event.channel, ()))
+        for sub in subs:
+            sub.put(event)
+        metrics.counter('events.delivered').inc(len(subs))
+
+    def publish(self, channel, event_type, data):
+        raise NotImplementedError
+
+    def history(self, channel):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# ==================== IN-PROCESS BROKER ====================
+
+class LocalBroker(BaseBroker):
+    """Pub/sub within this process; history is kept for the most recent `max_channels` channels"""
+
+    def __init__(self, history=100, queue_size=256, max_channels=4096):
+        super().__init__(history, queue_size)
+        self.max_channels = max_channels
+        self._ids = itertools.count(1)
+        self._history = OrderedDict()
+
+    def publish(self, channel, event_type, data):
+        with self._lock:
+            event = Event(next(self._ids), channel, event_type, data)
+            recent = self._history.get(channel)
+            if recent is None:
+                recent = self._history[channel] = deque(maxlen=self.history_size)
+                while len(self._history) > self.max_channels:
+                    self._history.popitem(last=False)
+            self._history.move_to_end(channel)
+            recent.append(event)
+        self._deliver(event)
+        return event
+
+    def history(self, channel):
+        with self._lock:
+            return list(self._history.get(channel, ()))
+
+
+# ==================== REDIS BROKER ====================
+
+class RedisBroker(BaseBroker):
+    """
+    Pub/sub across processes through any Redis-protocol server. `client` is
+    a redis.Redis-compatible object (INCR, PUBLISH, RPUSH, LTRIM, EXPIRE,
+    LRANGE and pubsub() with PSUBSCRIBE / get_message).
+    """
+
+    def __init__(self, client, prefix='t2c:events:', history=100, queue_size=256, history_ttl=3600,
+                 poll_seconds=1.0):
+        super().__init__(history, queue_size)
+        self.client = client
+        self.prefix = prefix
+        self.history_ttl = history_ttl
+        self.poll_seconds = poll_seconds  # how often the listener checks for close()
+        self._stopped = threading.Event()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name='events-redis', daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, event_type, data):
+        event_id = int(self.client.incr(self.prefix + 'seq'))
+        payload = json.dumps({'id': event_id, 'type': event_type, 'data': data}, default=str)
+        key = self.prefix + 'history:' + channel
+        self.client.rpush(key, payload)
+        self.client.ltrim(key, -self.history_size, -1)
+        self.client.expire(key, self.history_ttl)
+        self.client.publish(self.prefix + channel, payload)
+        return Event(event_id, channel, event_type, data)
+
+    def history(self, channel):
+        return [self._decode(channel, raw) for raw in self.client.lrange(self.prefix + 'history:' + channel, 0, -1)]
+
+    def _decode(self, channel, raw):
+        message = json.loads(raw)
+        return Event(message['id'], channel, message['type'], message['data'])
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub()
+                pubsub.psubscribe(self.prefix + '*')
+                self._ready.set()
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=self.poll_seconds)
+                    if not message or message.get('type') != 'pmessage':
+                        continue
+                    channel = message['channel']
+                    channel = channel.decode() if isinstance(channel, bytes) else channel
+                    self._deliver(self._decode(channel[len(self.prefix):], message['data']))
+            except Exception as e:
+                metrics.counter('events.redis_errors').inc()
+                print(f"⚠️ Event listener error, reconnecting: {e}")
+                self._stopped.wait(1.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join(timeout=5)
+
+
+# ==================== SSE FORMAT ====================
+
+def format_sse(event):
+    data = json.dumps(event.data, default=str)
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+def sse_stream(sub, heartbeat=15.0, max_seconds=300.0, retry_ms=3000):
+    """
+    text/event-stream body for one subscription. Ends after `max_seconds`
+    (EventSource reconnects and resumes from Last-Event-ID), so a
+    long-lived stream never pins a worker thread forever.
+    """
+    deadline = time.monotonic() + max_seconds
+    metrics.counter('events.streams_opened').inc()
+    try:
+        yield f"retry: {retry_ms}\n: connected\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = sub.get(timeout=min(heartbeat, remaining))
+            yield format_sse(event) if event is not None else ": keepalive\n\n"
+    finally:
+        sub.close()
+
+
+async def asse_stream(sub, heartbeat=15.0, max_seconds=300.0, retry_ms=3000):
+    """sse_stream() as an async generator for ASGI workers"""
+    deadline = time.monotonic() + max_seconds
+    metrics.counter('events.streams_opened').inc()
+    try:
+        yield f"retry: {retry_ms}\n: connected\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = await sub.aget(timeout=min(heartbeat, remaining))
+            yield format_sse(event) if event is not None else ": keepalive\n\n"
+    finally:
+        sub.close()
+
+
+# ==================== PROCESS-WIDE BROKER ====================
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if settings.EVENTS_BACKEND == 'redis':
+                    import redis
+                    _broker = RedisBroker(
+                        redis.Redis.from_url(settings.EVENTS_REDIS_URL),
+                        history=settings.EVENTS_HISTORY,
+                        queue_size=settings.EVENTS_QUEUE_SIZE,
+                    )
+                else:
+                    _broker = LocalBroker(history=settings.EVENTS_HISTORY, queue_size=settings.EVENTS_QUEUE_SIZE)
+    return _broker
+
+
+def publish(channel, event_type, data):
+    """Publish through the process-wide broker; failures are logged, never raised to the caller"""
+    try:
+        get_broker().publish(channel, event_type, data)
+        metrics.counter(f'events.published.{event_type}').inc()
+    except Exception as e:
+        metrics.counter('events.publish_errors').inc()
+        print(f"⚠️ Could not publish {event_type} event to {channel}: {e}")
+
+
+def _after_fork_in_child():
+    # Subscriber queues and the Redis listener thread belong to the parent process
+    global _broker, _broker_lock
+    _broker = None
+    _broker_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
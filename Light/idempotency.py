@@ -0,0 +1,157 @@
+"""
+Idempotency keys for disposal endpoints
+Clients (LED screen, mobile app, bins) send an Idempotency-Key header or an
+`idempotency_key` body field. The first request with a key claims a row in
+the IdempotencyKey table (unique on scope + key, with logged-in callers' keys
+prefixed by their user) and its response is stored;
+repeats get the stored response back without running the view again, so a
+retried disposal never creates a second WasteRecord or re-sends bin commands.
+
+Rows expire after IDEMPOTENCY_TTL seconds (purge with
+`python manage.py purge_idempotency_keys`). A claim whose request never
+finished (worker crashed) is released after IDEMPOTENCY_LOCK_SECONDS.
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from . import metrics
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+BODY_FIELD = 'idempotency_key'
+
+# Responses a later retry could turn into a success are not stored
+RETRYABLE_STATUS = {409, 429}
+
+
+def request_key(request):
+    """Key from the Idempotency-Key header or the idempotency_key body field"""
+    key = request.META.get(HEADER)
+    if not key:
+        if request.content_type and 'json' in request.content_type:
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+            key = data.get(BODY_FIELD) if isinstance(data, dict) else None
+        else:
+            key = request.POST.get(BODY_FIELD)
+    return str(key)[:255] if key else None
+
+
+def principal_key(request, key):
+    """Keys of logged-in callers are their own: another user's identical key is another request"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}:{key}'[:255]
+    return key
+
+
+def _file_digest(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)  # the view reads it next
+    return digest.hexdigest()
+
+
+def fingerprint(request):
+    """sha256 of the request payload (uploaded files included), to catch a key reused for a different request"""
+    if request.content_type == 'multipart/form-data':
+        files = sorted((name, upload.name, _file_digest(upload))
+                       for name, uploads in request.FILES.lists() for upload in uploads)
+        payload = json.dumps([sorted(request.POST.lists()), files]).encode()
+    else:
+        payload = request.body
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _expired(row, now):
+    if row.status_code is None:
+        return row.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    return row.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+
+
+def claim(scope, key, request_hash):
+    """Returns (row, created). created=False means another request owns the key."""
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(scope=scope, key=key, request_hash=request_hash), True
+        except IntegrityError:
+            row = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if row is not None and not _expired(row, timezone.now()):
+                return row, False
+            if row is not None:
+                IdempotencyKey.objects.filter(pk=row.pk, created_at=row.created_at).delete()
+    raise IntegrityError(f"could not claim idempotency key {scope}:{key}")
+
+
+def replay(row):
+    response = HttpResponse(row.response, status=row.status_code, content_type=row.content_type or None)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """View decorator: replay the stored response for repeated POSTs with the same key"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request_key(request) if request.method == 'POST' else None
+            if not key:
+                return view(request, *args, **kwargs)
+            key = principal_key(request, key)
+
+            request_hash = fingerprint(request)
+            row, created = claim(scope, key, request_hash)
+            if not created:
+                if row.request_hash != request_hash:
+                    metrics.counter(f'idempotency.mismatches.{scope}').inc()
+                    return JsonResponse({
+                        'success': False,
+                        'message': 'Idempotency key was already used for a different request'
+                    }, status=422)
+                if row.status_code is None:
+                    metrics.counter(f'idempotency.in_progress.{scope}').inc()
+                    response = JsonResponse({
+                        'success': False,
+                        'message': 'A request with this idempotency key is still being processed'
+                    }, status=409)
+                    response['Retry-After'] = '1'
+                    return response
+                print(f"🔁 Replaying stored response for {scope} key {key}")
+                metrics.counter(f'idempotency.replays.{scope}').inc()
+                return replay(row)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                row.delete()
+                raise
+
+            if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS or response.streaming:
+                row.delete()
+            else:
+                row.status_code = response.status_code
+                row.content_type = response.get('Content-Type', '')
+                row.response = response.content.decode(response.charset or 'utf-8')
+                row.save(update_fields=['status_code', 'content_type', 'response'])
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired():
+    """Delete stored responses older than IDEMPOTENCY_TTL; returns the number removed"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,152 @@
+"""
+Batched inference engine for the waste classifier
+Coalesces concurrent classification requests into dynamic micro-batches
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from . import metrics
+
+
+class _Request:
+    """One pending classification (one or more images) waiting for a batch"""
+
+    __slots__ = ('images', 'future', 'enqueued_at')
+
+    def __init__(self, images, future):
+        self.images = images
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceEngine:
+    """
+    Runs a predict function on a background thread, batching requests.
+
+    Callers submit a (224, 224, 3) image or an (N, 224, 224, 3) batch and get
+    a Future resolving to the (N, num_classes) probabilities. The worker
+    thread waits for the first request, then keeps collecting until either
+    `max_batch_size` images are queued or `max_wait_ms` has passed, and runs
+    a single predict call for the whole micro-batch.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5, name='inference'):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ---------- public API ----------
+
+    def submit(self, images):
+        """Queue images for classification and return a Future"""
+        # Always a private copy: preprocess() hands out a thread-local buffer that the
+        # caller's next classification overwrites, possibly while this request is queued
+        images = np.array(images, dtype=np.float32, copy=True)
+        if images.ndim == 3:
+            images = images[np.newaxis, ...]
+        if images.ndim != 4:
+            raise ValueError(f"Expected (H, W, 3) or (N, H, W, 3) array, got shape {images.shape}")
+
+        self._ensure_started()
+        future = Future()
+        self._queue.put(_Request(images, future))
+        metrics.gauge(f'{self.name}.queue_depth').set(self._queue.qsize())
+        return future
+
+    def predict(self, images, timeout=None):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(images).result(timeout=timeout)
+
+    def stop(self, timeout=2.0):
+        """Stop the worker thread; pending requests fail with RuntimeError"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self._thread = None
+        self._fail_pending(RuntimeError("Inference engine stopped"))
+
+    def stats(self):
+        return metrics.snapshot(prefix=f'{self.name}.')
+
+    # ---------- worker ----------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name=f'{self.name}-worker', daemon=True
+                )
+                self._thread.start()
+
+    def _collect_batch(self):
+        """Block for the first request, then gather more until full or timed out"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        size = len(first.images)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.images)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect_batch()
+            metrics.gauge(f'{self.name}.queue_depth').set(self._queue.qsize())
+            if not batch:
+                continue
+            self._process(batch)
+
+    def _process(self, batch):
+        images = batch[0].images if len(batch) == 1 else np.concatenate([r.images for r in batch])
+        started = time.perf_counter()
+        try:
+            predictions = np.asarray(self.predict_fn(images))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            metrics.counter(f'{self.name}.errors').inc()
+            return
+        finished = time.perf_counter()
+
+        metrics.histogram(f'{self.name}.batch_size', buckets=(1, 2, 4, 8, 16, 32, 64)).observe(len(images))
+        metrics.histogram(f'{self.name}.predict_ms').observe((finished - started) * 1000)
+        metrics.counter(f'{self.name}.batches').inc()
+        metrics.counter(f'{self.name}.images').inc(len(images))
+
+        offset = 0
+        for request in batch:
+            count = len(request.images)
+            request.future.set_result(predictions[offset:offset + count])
+            offset += count
+            metrics.histogram(f'{self.name}.latency_ms').observe((finished - request.enqueued_at) * 1000)
+
+    def _fail_pending(self, exc):
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            request.future.set_exception(exc)
@@ -0,0 +1,141 @@
+"""
+Inference backends for the waste classifier
+Keras (default), TFLite and ONNX Runtime - all expose predict(batch) -> probabilities
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+
+class KerasBackend:
+    """Full Keras model (requires tensorflow / tensorflow-cpu)"""
+
+    name = 'keras'
+
+    def __init__(self, model_path, num_threads=0, model_content=None):
+        # model_content is ignored: Keras loads from the path
+        import tensorflow as tf
+
+        if num_threads:
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            except RuntimeError:
+                # Already initialised by an earlier model load in this process
+                pass
+        from tensorflow.keras.models import load_model
+
+        self.model_path = str(model_path)
+        self.model = load_model(self.model_path, compile=False)
+
+    def predict(self, batch):
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+def _load_tflite_interpreter():
+    """Prefer the standalone LiteRT / tflite-runtime packages; fall back to full TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteBackend:
+    """TFLite interpreter (float32, float16 or int8 artifact produced by `manage.py convert_model`)"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=0, model_content=None):
+        Interpreter = _load_tflite_interpreter()
+        self.model_path = str(model_path)
+        if model_content is not None:
+            self.interpreter = Interpreter(model_content=model_content, num_threads=num_threads or None)
+        else:
+            self.interpreter = Interpreter(model_path=self.model_path, num_threads=num_threads or None)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            shape = [batch_size] + list(self.input['shape'][1:])
+            self.interpreter.resize_tensor_input(self.input['index'], shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        self._resize(len(batch))
+
+        scale, zero_point = self.input.get('quantization', (0.0, 0))
+        if self.input['dtype'] != np.float32 and scale:
+            batch = np.round(batch / scale + zero_point).astype(self.input['dtype'])
+
+        self.interpreter.set_tensor(self.input['index'], batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output['index'])
+
+        scale, zero_point = self.output.get('quantization', (0.0, 0))
+        if self.output['dtype'] != np.float32 and scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return np.array(output, dtype=np.float32)
+
+
+class ONNXBackend:
+    """ONNX Runtime session (requires onnxruntime)"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, num_threads=0, model_content=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.model_path = str(model_path)
+        self.session = ort.InferenceSession(
+            self.model_path if model_content is None else model_content,
+            sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        return np.asarray(self.session.run(None, {self.input_name: batch})[0])
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    ONNXBackend.name: ONNXBackend,
+}
+
+
+def create_backend(name, model_path, num_threads=0, model_content=None):
+    """
+    Instantiate the backend called `name` for the model at `model_path`.
+    `model_content` (the file's bytes, read earlier) is used instead of the
+    path by the backends that can load from memory (tflite, onnx).
+    """
+    try:
+        backend_cls = BACKENDS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    return backend_cls(model_path, num_threads=num_threads, model_content=model_content)
+
+
+def artifact_path(model_path, fmt, quantize='none'):
+    """Default output path for a converted model, e.g. waste_classifier_final.float16.tflite"""
+    model_path = Path(model_path)
+    suffix = '' if quantize in (None, 'none') else f'.{quantize}'
+    return model_path.with_name(f"{model_path.stem}{suffix}.{fmt}")
@@ -0,0 +1,138 @@
+"""
+Convert the Keras waste classifier to a TFLite or ONNX artifact
+
+    python manage.py convert_model --format tflite --quantize float16
+    python manage.py convert_model --format tflite --quantize int8 --calibration-dir media/detectiveIssues
+
+After converting, the command runs an accuracy-parity check against the
+Keras model on the --calibration-dir images and fails if top-1 agreement
+drops below --min-agreement. int8 always needs --calibration-dir: quantization
+ranges and the parity check are only meaningful on real bin photos.
+Serve the artifact with INFERENCE_BACKEND=tflite MODEL_PATH=<artifact>.
+"""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Light.inference_backends import KerasBackend, artifact_path, create_backend
+from Light.model_registry import INPUT_SHAPE
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def load_samples(calibration_dir, count):
+    """Up to `count` preprocessed float32 samples from a directory of images (possibly none)"""
+    samples = []
+    for path in sorted(Path(calibration_dir).rglob('*')):
+        if len(samples) >= count:
+            break
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        img = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), INPUT_SHAPE[:2])
+        samples.append(img.astype(np.float32))
+    return np.stack(samples) if samples else np.empty((0, *INPUT_SHAPE), np.float32)
+
+
+class Command(BaseCommand):
+    help = 'Convert the Keras waste classifier to TFLite/ONNX and check accuracy parity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None,
+                            help='Keras model to convert (default: settings.MODEL_PATH)')
+        parser.add_argument('--format', choices=['tflite', 'onnx'], default='tflite')
+        parser.add_argument('--quantize', choices=['none', 'float16', 'int8'], default='float16')
+        parser.add_argument('--output', default=None,
+                            help='Output path (default: <model>.<quantize>.<format>)')
+        parser.add_argument('--calibration-dir', default=None,
+                            help='Images used for int8 calibration and the parity check '
+                                 '(required unless --skip-parity, and always for int8)')
+        parser.add_argument('--samples', type=int, default=32,
+                            help='Number of samples for calibration / parity check')
+        parser.add_argument('--min-agreement', type=float, default=0.95,
+                            help='Minimum top-1 agreement with the Keras model (0-1)')
+        parser.add_argument('--skip-parity', action='store_true')
+
+    def handle(self, *args, **options):
+        source = Path(options['source'] or settings.MODEL_PATH)
+        if source.suffix != '.keras':
+            raise CommandError(f"Source must be a .keras model, got {source}")
+        if not source.exists():
+            raise CommandError(f"Model not found: {source}")
+
+        fmt, quantize = options['format'], options['quantize']
+        output = Path(options['output'] or artifact_path(source, fmt, quantize))
+        calibration_dir = options['calibration_dir']
+        if not calibration_dir:
+            # Random noise would calibrate int8 ranges to nothing real, and a
+            # parity check on noise passes models that misclassify real bins
+            if quantize == 'int8':
+                raise CommandError("--quantize int8 needs --calibration-dir with real bin images")
+            if not options['skip_parity']:
+                raise CommandError("The parity check needs --calibration-dir with real bin images "
+                                   "(or pass --skip-parity)")
+            samples = None
+        else:
+            samples = load_samples(calibration_dir, options['samples'])
+            if not len(samples):
+                raise CommandError(f"No readable images in {calibration_dir}")
+            if len(samples) < options['samples']:
+                self.stderr.write(f"⚠️ Only {len(samples)} images in {calibration_dir}, "
+                                  f"{options['samples']} requested")
+
+        self.stdout.write(f"🧠 Loading {source}...")
+        keras_backend = KerasBackend(source)
+
+        self.stdout.write(f"🔧 Converting to {fmt} ({quantize})...")
+        if fmt == 'tflite':
+            output.write_bytes(self.convert_tflite(keras_backend.model, quantize, samples))
+        else:
+            self.convert_onnx(keras_backend.model, quantize, output)
+        self.stdout.write(f"✅ Wrote {output} ({output.stat().st_size / 1e6:.2f} MB, "
+                          f"source {source.stat().st_size / 1e6:.2f} MB)")
+
+        if options['skip_parity']:
+            return
+        agreement, max_diff = self.check_parity(keras_backend, create_backend(fmt, output), samples)
+        self.stdout.write(f"📊 Parity: top-1 agreement {agreement * 100:.1f}% "
+                          f"max |Δp| {max_diff:.4f} on {len(samples)} samples")
+        if agreement < options['min_agreement']:
+            raise CommandError(f"Top-1 agreement {agreement:.3f} below {options['min_agreement']}")
+
+    def convert_tflite(self, model, quantize, samples):
+        import tensorflow as tf
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantize == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantize == 'int8':
+            # Integer weights and activations; inputs/outputs stay float32 so
+            # the preprocessing pipeline does not change.
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: ([s[np.newaxis]] for s in samples)
+        return converter.convert()
+
+    def convert_onnx(self, model, quantize, output):
+        if quantize == 'float16':
+            raise CommandError("float16 is only supported for --format tflite")
+        try:
+            model.export(str(output), format='onnx')
+        except ImportError as e:
+            raise CommandError(f"ONNX export needs tf2onnx and onnxruntime installed ({e})")
+        if quantize == 'int8':
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(str(output), str(output), weight_type=QuantType.QInt8)
+
+    def check_parity(self, reference, candidate, samples):
+        expected = reference.predict(samples)
+        actual = np.concatenate([candidate.predict(samples[i:i + 8]) for i in range(0, len(samples), 8)])
+        agreement = float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+        return agreement, float(np.max(np.abs(expected - actual)))
@@ -0,0 +1,20 @@
+"""
+Delete stored idempotency responses older than IDEMPOTENCY_TTL
+
+    python manage.py purge_idempotency_keys
+
+Run it from cron (e.g. hourly); expired keys are otherwise only replaced
+when a client reuses them.
+"""
+
+from django.core.management.base import BaseCommand
+
+from Light.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired idempotency keys"
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
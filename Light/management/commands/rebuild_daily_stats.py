@@ -0,0 +1,31 @@
+"""
+Recompute the UserDailyStats rollup from WasteRecord
+
+    python manage.py rebuild_daily_stats
+    python manage.py rebuild_daily_stats --user 12 --user 15
+
+Migration 0017 backfills the rollup and deletes are tracked by a signal; run
+it after WasteRecord changes made outside the points ledger (imports, edits).
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from Light import daily_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user daily stats rollup"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='only rebuild this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = daily_stats.rebuild(options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rows} daily stats rows in {time.perf_counter() - started:.1f}s"
+        ))
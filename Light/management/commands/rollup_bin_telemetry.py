@@ -0,0 +1,30 @@
+"""
+Fold old raw bin telemetry into hourly rows and delete the raw samples
+
+    python manage.py rollup_bin_telemetry
+    python manage.py rollup_bin_telemetry --retention-hours 24
+
+Schedule it hourly (cron/systemd timer). Samples newer than the retention
+window stay raw; late samples for an hour already rolled up are merged in.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from Light import telemetry
+
+
+class Command(BaseCommand):
+    help = "Downsample raw bin telemetry into hourly rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-hours', type=int, default=None,
+                            help='keep this many hours of raw samples (default TELEMETRY_RAW_RETENTION_HOURS)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        hours, deleted = telemetry.rollup(options['retention_hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled {deleted} raw samples into {hours} hourly rows in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,181 @@
+"""
+Lightweight in-process metrics for TRASH2CASH
+Counters, gauges and histograms shared by the inference, streaming and API layers
+"""
+
+import bisect
+import hmac
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.http import JsonResponse
+
+
+# ==================== METRIC TYPES ====================
+
+class Counter:
+    """Monotonic counter (e.g. requests served, duplicate hits)"""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return {'type': 'counter', 'value': self._value}
+
+
+class Gauge:
+    """Point-in-time value (e.g. queue depth, active streams)"""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return {'type': 'gauge', 'value': self._value}
+
+
+# Default bucket boundaries in milliseconds / items
+DEFAULT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """
+    Bucketed distribution with a bounded sample window for percentiles.
+
+    Buckets count every observation forever; percentiles are computed over
+    the most recent `window` observations only, so memory stays bounded.
+    """
+
+    def __init__(self, name, buckets=DEFAULT_BUCKETS, window=1024):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._samples = deque(maxlen=window)
+        self._count = 0
+        self._sum = 0.0
+        self._min = None
+        self._max = None
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._samples.append(value)
+            self._count += 1
+            self._sum += value
+            self._min = value if self._min is None else min(self._min, value)
+            self._max = value if self._max is None else max(self._max, value)
+
+    @property
+    def count(self):
+        return self._count
+
+    def percentile(self, q):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            count, total = self._count, self._sum
+            low, high = self._min, self._max
+        labels = [f"le_{b}" for b in self.buckets] + ['le_inf']
+        return {
+            'type': 'histogram',
+            'count': count,
+            'sum': round(total, 3),
+            'mean': round(total / count, 3) if count else None,
+            'min': low,
+            'max': high,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(labels, counts)),
+        }
+
+
+# ==================== REGISTRY ====================
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = factory()
+                _registry[name] = metric
+    return metric
+
+
+def counter(name):
+    return _get_or_create(name, lambda: Counter(name))
+
+
+def gauge(name):
+    return _get_or_create(name, lambda: Gauge(name))
+
+
+def histogram(name, buckets=DEFAULT_BUCKETS):
+    return _get_or_create(name, lambda: Histogram(name, buckets=buckets))
+
+
+def snapshot(prefix=''):
+    """Return a JSON-serialisable dict of all metrics (optionally filtered by prefix)"""
+    return {
+        name: metric.snapshot()
+        for name, metric in sorted(_registry.items())
+        if name.startswith(prefix)
+    }
+
+
+def reset():
+    """Drop all registered metrics (used by tests)"""
+    with _registry_lock:
+        _registry.clear()
+
+
+# ==================== VIEW ====================
+
+def _may_read(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def metrics_view(request):
+    """
+    GET /api/metrics/?prefix=inference.
+
+    Returns a snapshot of all in-process metrics for this worker.
+    Staff only, or scrapers sending "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    if not _may_read(request):
+        return JsonResponse({'error': 'staff or metrics token required'}, status=403)
+    return JsonResponse({'metrics': snapshot(request.GET.get('prefix', ''))})
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0011_userprofile_qr_code_data_alter_userprofile_cnic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wasterecord',
+            name='event_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='wasterecord',
+            name='disposed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0013_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('items', models.IntegerField(default=0)),
+                ('points', models.IntegerField(default=0)),
+                ('weight_kg', models.FloatField(default=0.0)),
+                ('plastic_count', models.IntegerField(default=0)),
+                ('paper_count', models.IntegerField(default=0)),
+                ('metal_count', models.IntegerField(default=0)),
+                ('glass_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'User Daily Stats',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_user_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0014_userdailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bin',
+            index=models.Index(fields=['status', '-capacity_percentage'], name='bin_status_capacity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read'], name='notif_user_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='redemptionrequest',
+            index=models.Index(fields=['user', '-created_at'], name='redreq_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='redemptionrequest',
+            index=models.Index(fields=['user', 'status'], name='redreq_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rewardredemption',
+            index=models.Index(fields=['user', '-requested_at'], name='reward_user_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rewardredemption',
+            index=models.Index(fields=['status', '-requested_at'], name='reward_status_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wasterecord',
+            index=models.Index(fields=['user', '-disposed_at'], name='waste_user_disposed_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0015_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BinTelemetry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recorded_at', models.DateTimeField()),
+                ('plastic_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('paper_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('metal_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('glass_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('battery', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('rssi', models.SmallIntegerField(blank=True, null=True)),
+                ('lid_cycles', models.PositiveIntegerField(blank=True, null=True)),
+                ('bin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telemetry', to='Light.bin')),
+            ],
+            options={
+                'verbose_name_plural': 'Bin Telemetry',
+                'ordering': ['-recorded_at'],
+                'indexes': [models.Index(fields=['bin', '-recorded_at'], name='telemetry_bin_recorded_idx'), models.Index(fields=['recorded_at'], name='telemetry_recorded_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BinTelemetryHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('samples', models.IntegerField(default=0)),
+                ('plastic_level_avg', models.FloatField(blank=True, null=True)),
+                ('paper_level_avg', models.FloatField(blank=True, null=True)),
+                ('metal_level_avg', models.FloatField(blank=True, null=True)),
+                ('glass_level_avg', models.FloatField(blank=True, null=True)),
+                ('max_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('battery_min', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('rssi_avg', models.FloatField(blank=True, null=True)),
+                ('lid_cycles_max', models.PositiveIntegerField(blank=True, null=True)),
+                ('bin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='telemetry_hourly', to='Light.bin')),
+            ],
+            options={
+                'verbose_name_plural': 'Bin Telemetry (Hourly)',
+                'ordering': ['-hour'],
+                'constraints': [models.UniqueConstraint(fields=('bin', 'hour'), name='unique_bin_telemetry_hour')],
+            },
+        ),
+    ]
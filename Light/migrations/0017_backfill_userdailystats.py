@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    """Fill UserDailyStats from the WasteRecord rows written before the rollup existed"""
+    from Light import daily_stats
+
+    daily_stats.rebuild(
+        record_model=apps.get_model('Light', 'WasteRecord'),
+        stats_model=apps.get_model('Light', 'UserDailyStats'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0016_bintelemetry'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
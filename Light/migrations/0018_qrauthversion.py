@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0017_backfill_userdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QRAuthVersion',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0018_qrauthversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wasterecord',
+            index=models.Index(fields=['user', '-disposed_at', '-id'], name='waste_user_disposed_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='wasterecord',
+            name='waste_user_disposed_idx',
+        ),
+    ]
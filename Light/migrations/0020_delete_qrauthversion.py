@@ -0,0 +1,16 @@
+# Generated by Django 5.1.15 on 2026-10-18 09:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Light', '0019_waste_history_keyset_index'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='QRAuthVersion',
+        ),
+    ]
@@ -5,7 +5,9 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
 from django.utils import timezone
-from .models import UserProfile, WasteRecord, Bin
+from .models import UserProfile, Bin
+from . import points as points_ledger
+from .idempotency import idempotent
 import json
 from datetime import datetime
 
@@ -105,6 +107,7 @@ def validate_qr_code(request):
 
 
 @csrf_exempt
+@idempotent('mobile_qr_disposal')
 def qr_disposal(request):
     """
     POST /api/qr/dispose/
@@ -162,46 +165,21 @@ def qr_disposal(request):
             # Calculate points based on waste type and weight
             points = calculate_points(waste_type, weight_kg)
             
-            # Create waste record
-            record = WasteRecord.objects.create(
-                user=user,
+            # Create waste record and update the profile atomically
+            _, award = points_ledger.record_disposal(
+                user, waste_type, points,
                 bin=bin_obj,
-                waste_type=waste_type,
                 weight_kg=weight_kg,
-                points_earned=points,
                 disposed_at=timezone.now()
             )
-            
-            # Update user profile
-            old_points = profile.total_points
-            profile.total_points += points
-            profile.total_waste_disposed += 1
-            
-            # Update waste type counters
-            if waste_type.lower() == 'plastic':
-                profile.plastic_count += 1
-            elif waste_type.lower() == 'paper':
-                profile.paper_count += 1
-            elif waste_type.lower() == 'metal':
-                profile.metal_count += 1
-            elif waste_type.lower() == 'glass':
-                profile.glass_count += 1
-            
-            profile.save()
-            
-            # Check for level up
-            old_level = profile.level
-            profile.update_level()
-            new_level = profile.level
-            
-            level_up = new_level > old_level
+            level_up = award.level > award.old_level
             
             return JsonResponse({
                 'success': True,
                 'points_earned': points,
-                'total_points': profile.total_points,
-                'old_points': old_points,
-                'new_level': new_level,
+                'total_points': award.total_points,
+                'old_points': award.total_points - points,
+                'new_level': award.level,
                 'level_up': level_up,
                 'waste_type': waste_type,
                 'weight_kg': weight_kg,
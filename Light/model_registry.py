@@ -0,0 +1,136 @@
+"""
+Model registry - loads the waste classifier on first use
+Keeps TensorFlow out of Django startup, management commands and test runs
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .inference import InferenceEngine
+from .inference_backends import create_backend
+
+CLASS_LABELS = {
+    0: "cardboard",
+    1: "glass",
+    2: "metal",
+    3: "paper",
+    4: "plastic",
+    5: "trash"
+}
+
+INPUT_SHAPE = (224, 224, 3)
+
+_lock = threading.Lock()
+_model = None
+_engine = None
+_load_seconds = None
+_model_content = None   # model file bytes read by preload(), shared copy-on-write with workers
+
+
+def load_model():
+    """Create the configured inference backend (slow - only called once per process)"""
+    print(f"🧠 Loading model from {settings.MODEL_PATH} ({settings.INFERENCE_BACKEND} backend)...")
+    started = time.perf_counter()
+    model = create_backend(
+        settings.INFERENCE_BACKEND, settings.MODEL_PATH, num_threads=settings.INFERENCE_THREADS,
+        model_content=_model_content,
+    )
+    model.predict(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32))  # Warm-up
+    print(f"✅ Model loaded successfully in {time.perf_counter() - started:.2f}s.")
+    return model
+
+
+def get_model():
+    """Return the loaded model, loading it on first call"""
+    global _model, _load_seconds
+    if _model is None:
+        with _lock:
+            if _model is None:
+                started = time.perf_counter()
+                _model = load_model()
+                _load_seconds = time.perf_counter() - started
+    return _model
+
+
+def get_engine():
+    """Return this process's batched inference engine (model loads lazily on first call)"""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = InferenceEngine(
+                    lambda batch: get_model().predict(batch),
+                    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+                    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+                    name='inference',
+                )
+    return _engine
+
+
+def classify(img_array, timeout=None):
+    """Run the classifier on a preprocessed (N, 224, 224, 3) array and return probabilities"""
+    return get_engine().predict(img_array, timeout=timeout)
+
+
+def is_loaded():
+    return _model is not None
+
+
+def preload():
+    """
+    Read the model file in the gunicorn master before workers fork. No runtime
+    is created and nothing is predicted here: TensorFlow / ONNX Runtime thread
+    pools don't survive fork(), and a worker inheriting them can hang on its
+    first predict. Workers build the model from these bytes in warm_up().
+    """
+    global _model_content
+    if settings.INFERENCE_BACKEND.lower() != 'keras':  # Keras only loads from the path
+        _model_content = Path(settings.MODEL_PATH).read_bytes()
+    print(f"🧠 Preloaded {settings.MODEL_PATH} ({settings.INFERENCE_BACKEND} backend)")
+
+
+def warm_up():
+    """Build and warm the model in this process (gunicorn post_fork, after preload())"""
+    get_model()
+
+
+def status():
+    return {
+        'loaded': is_loaded(),
+        'backend': settings.INFERENCE_BACKEND,
+        'model_path': str(settings.MODEL_PATH),
+        'load_seconds': round(_load_seconds, 3) if _load_seconds is not None else None,
+        'pid': os.getpid(),
+    }
+
+
+def reset():
+    """Forget the loaded model and engine (used by tests)"""
+    global _model, _engine, _load_seconds, _model_content
+    with _lock:
+        if _engine is not None:
+            _engine.stop()
+        _model = None
+        _engine = None
+        _load_seconds = None
+        _model_content = None
+
+
+def _after_fork_in_child():
+    """
+    Threads do not survive fork(): drop the parent's engine so the child
+    starts its own batching thread. Preloaded model bytes are kept and shared
+    copy-on-write with the master.
+    """
+    global _engine, _lock
+    _lock = threading.Lock()
+    _engine = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
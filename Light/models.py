@@ -103,6 +103,10 @@ class Bin(models.Model):
 
     class Meta:
         ordering = ['-last_online']
+        indexes = [
+            # nearby_bins: bins by status, fullest first
+            models.Index(fields=['status', '-capacity_percentage'], name='bin_status_capacity_idx'),
+        ]
 
 
 # ========================================
@@ -151,13 +155,22 @@ class WasteRecord(models.Model):
     weight_kg = models.FloatField(default=0.0, blank=True, null=True)  # Future: weight sensor
     points_earned = models.IntegerField(default=10)
     
-    disposed_at = models.DateTimeField(auto_now_add=True)
+    # Client idempotency key for events uploaded by bins (batch ingest)
+    event_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    
+    # Defaults to now; buffered hardware events keep the time they happened
+    disposed_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.user.username} - {self.waste_type} - {self.points_earned} pts"
 
     class Meta:
         ordering = ['-disposed_at']
+        indexes = [
+            # History, recent activity and date-range filters for one user, newest first;
+            # id breaks ties so keyset pages (-disposed_at, -id) walk the index without sorting
+            models.Index(fields=['user', '-disposed_at', '-id'], name='waste_user_disposed_id_idx'),
+        ]
 
 
 # ========================================
@@ -220,6 +233,11 @@ class RewardRedemption(models.Model):
 
     class Meta:
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['user', '-requested_at'], name='reward_user_requested_idx'),
+            # Admin queue: pending redemptions, newest first
+            models.Index(fields=['status', '-requested_at'], name='reward_status_requested_idx'),
+        ]
 
 
 # ========================================
@@ -279,6 +297,11 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            # Unread badge counts
+            models.Index(fields=['user', 'is_read'], name='notif_user_read_idx'),
+        ]
 
 
 # ========================================
@@ -364,4 +387,117 @@ class RedemptionRequest(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Redemption Request"
-        verbose_name_plural = "Redemption Requests"
\ No newline at end of file
+        verbose_name_plural = "Redemption Requests"
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='redreq_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='redreq_user_status_idx'),
+        ]
+
+# ========================================
+# 10. IDEMPOTENCY KEYS - Retried Requests
+# ========================================
+class IdempotencyKey(models.Model):
+    scope = models.CharField(max_length=50)  # endpoint, e.g. "hardware_dispose"
+    key = models.CharField(max_length=255)  # Idempotency-Key header / idempotency_key field
+    request_hash = models.CharField(max_length=64)  # sha256 of the request body
+    
+    # Empty while the first request is still running
+    status_code = models.IntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    response = models.TextField(blank=True, default='')
+    
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status_code or 'in progress'})"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+
+# ========================================
+# 11. DAILY STATS - Per-User Daily Rollup
+# ========================================
+class UserDailyStats(models.Model):
+    """One row per user per local day, kept in step with WasteRecord by Light/daily_stats.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    
+    items = models.IntegerField(default=0)
+    points = models.IntegerField(default=0)
+    weight_kg = models.FloatField(default=0.0)
+    
+    plastic_count = models.IntegerField(default=0)
+    paper_count = models.IntegerField(default=0)
+    metal_count = models.IntegerField(default=0)
+    glass_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date} - {self.items} items"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = "User Daily Stats"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_user_daily_stats'),
+        ]
+
+
+# ========================================
+# 12. BIN TELEMETRY - ESP32 Sensor Samples
+# ========================================
+class BinTelemetry(models.Model):
+    """Append-only raw samples; rolled into BinTelemetryHourly and deleted after TELEMETRY_RAW_RETENTION_HOURS"""
+    bin = models.ForeignKey(Bin, on_delete=models.CASCADE, related_name='telemetry')
+    recorded_at = models.DateTimeField()
+    
+    # Fill level per compartment, 0-100
+    plastic_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    paper_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    metal_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    glass_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    
+    battery = models.PositiveSmallIntegerField(null=True, blank=True)  # percent
+    rssi = models.SmallIntegerField(null=True, blank=True)  # dBm
+    lid_cycles = models.PositiveIntegerField(null=True, blank=True)  # lifetime counter
+
+    def __str__(self):
+        return f"{self.bin_id} @ {self.recorded_at:%Y-%m-%d %H:%M:%S}"
+
+    class Meta:
+        ordering = ['-recorded_at']
+        verbose_name_plural = "Bin Telemetry"
+        indexes = [
+            models.Index(fields=['bin', '-recorded_at'], name='telemetry_bin_recorded_idx'),
+            # Rollup/retention works on time ranges across all bins
+            models.Index(fields=['recorded_at'], name='telemetry_recorded_idx'),
+        ]
+
+
+class BinTelemetryHourly(models.Model):
+    bin = models.ForeignKey(Bin, on_delete=models.CASCADE, related_name='telemetry_hourly')
+    hour = models.DateTimeField()
+    samples = models.IntegerField(default=0)
+    
+    plastic_level_avg = models.FloatField(null=True, blank=True)
+    paper_level_avg = models.FloatField(null=True, blank=True)
+    metal_level_avg = models.FloatField(null=True, blank=True)
+    glass_level_avg = models.FloatField(null=True, blank=True)
+    max_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    
+    battery_min = models.PositiveSmallIntegerField(null=True, blank=True)
+    rssi_avg = models.FloatField(null=True, blank=True)
+    lid_cycles_max = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.bin_id} @ {self.hour:%Y-%m-%d %H:00} ({self.samples} samples)"
+
+    class Meta:
+        ordering = ['-hour']
+        verbose_name_plural = "Bin Telemetry (Hourly)"
+        constraints = [
+            models.UniqueConstraint(fields=['bin', 'hour'], name='unique_bin_telemetry_hour'),
+        ]
+
@@ -0,0 +1,56 @@
+"""
+Keyset (cursor) pagination
+Pages are fetched with WHERE (ts, id) < (cursor ts, cursor id) on an index
+ordered newest first, so page 100 costs the same as page 1 (no OFFSET scan)
+and rows inserted while paging never shift or repeat a page.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(timestamp, pk):
+    raw = json.dumps([timestamp.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (timestamp, pk); raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        stamp, pk = json.loads(raw)
+        timestamp = parse_datetime(stamp)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+    if timestamp is None or not isinstance(pk, int):
+        raise ValueError("invalid cursor")
+    return timestamp, pk
+
+
+def keyset_query(queryset, cursor=None, limit=50, field='disposed_at', fields=()):
+    """
+    The unevaluated query behind keyset_page(): limit + 1 rows after `cursor`,
+    newest first by (`field`, id). Needs an index ending in (`field` DESC, id DESC).
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'id__lt': pk}))
+
+    fields = set(fields) | {'id', field}
+    return queryset.values(*fields)[:limit + 1]
+
+
+def keyset_page(queryset, cursor=None, limit=50, field='disposed_at', fields=()):
+    """
+    One page of `queryset`, newest first by (`field`, id), as .values(*fields) dicts.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    rows = list(keyset_query(queryset, cursor, limit, field, fields))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1][field], rows[-1]['id'])
@@ -0,0 +1,162 @@
+"""
+Points ledger
+Every disposal path (dashboard, hardware, mobile, QR auto-disposal) records
+waste and awards points through here: one UPDATE with F() expressions that
+bumps the counters and recomputes the level in the same statement, inside
+the transaction that creates the WasteRecord (and updates the daily rollup).
+No read-modify-write, so concurrent disposals for one user never lose points.
+"""
+
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from . import daily_stats, events, metrics, qr_auth_cache
+from .models import UserProfile, WasteRecord
+
+# (minimum points, level), highest first
+LEVEL_THRESHOLDS = ((1000, 5), (500, 4), (250, 3), (100, 2))
+
+# Waste type -> per-type counter on UserProfile (others only count towards the total)
+COUNTER_FIELDS = {
+    'plastic': 'plastic_count',
+    'paper': 'paper_count',
+    'cardboard': 'paper_count',
+    'metal': 'metal_count',
+    'glass': 'glass_count',
+}
+
+Award = namedtuple('Award', ['points', 'total_points', 'level', 'old_level', 'total_waste_disposed'])
+
+
+def level_for_points(points):
+    for minimum, level in LEVEL_THRESHOLDS:
+        if points >= minimum:
+            return level
+    return 1
+
+
+def level_expression(points_expr):
+    """SQL CASE equivalent of level_for_points()"""
+    return Case(
+        *[When(GreaterThanOrEqual(points_expr, Value(minimum)), then=Value(level))
+          for minimum, level in LEVEL_THRESHOLDS],
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def _profile_changes(points, counts):
+    """UPDATE kwargs adding `points` and {waste_type: n} disposals"""
+    new_points = F('total_points') + Value(points)
+    changes = {
+        'total_points': new_points,
+        'total_waste_disposed': F('total_waste_disposed') + Value(sum(counts.values())),
+        'level': level_expression(new_points),
+        'updated_at': timezone.now(),
+    }
+    fields = {}
+    for waste_type, n in counts.items():
+        counter = COUNTER_FIELDS.get((waste_type or '').lower())
+        if counter:
+            fields[counter] = fields.get(counter, 0) + n
+    for counter, n in fields.items():
+        changes[counter] = F(counter) + Value(n)
+    return changes
+
+
+def _apply(user_id, points, counts):
+    """Apply one user's delta; creates the profile if missing. Call inside a transaction."""
+    changes = _profile_changes(points, counts)
+    if not UserProfile.objects.filter(user_id=user_id).update(**changes):
+        UserProfile.objects.get_or_create(user_id=user_id)
+        UserProfile.objects.filter(user_id=user_id).update(**changes)
+    # QuerySet.update() skips post_save, so drop cached QR lookups ourselves
+    transaction.on_commit(lambda: qr_auth_cache.invalidate_user(user_id))
+
+
+def _publish_on_commit(user_id, award):
+    """Push the new totals to the user's live pages once the disposal is committed"""
+    transaction.on_commit(lambda: events.publish(events.user_channel(user_id), 'points', award._asdict()))
+
+
+def award_points(user, waste_type, points, items=1):
+    """
+    Atomically add `points` and `items` disposals of `waste_type` to the
+    user's profile (created if missing) and return the resulting Award.
+    """
+    user_id = getattr(user, 'pk', user)
+    with transaction.atomic():
+        _apply(user_id, points, {waste_type: items})
+        # Our UPDATE holds the row lock until commit, so this read is exactly our result
+        total_points, level, total = UserProfile.objects.filter(user_id=user_id).values_list(
+            'total_points', 'level', 'total_waste_disposed'
+        ).get()
+
+    award = Award(points, total_points, level, level_for_points(total_points - points), total)
+    _publish_on_commit(user_id, award)
+    metrics.counter('points.awards').inc()
+    return award
+
+
+def record_disposal(user, waste_type, points, **record_fields):
+    """
+    Create the WasteRecord and award its points in one transaction.
+    `record_fields` go to WasteRecord (bin, weight_kg, detected_issue, disposed_at, ...).
+    Returns (record, award).
+    """
+    with transaction.atomic():
+        record = WasteRecord.objects.create(user=user, waste_type=waste_type, points_earned=points, **record_fields)
+        award = award_points(user, waste_type, points)
+        daily_stats.record([record])
+    return record, award
+
+
+def record_disposals(events):
+    """
+    Bulk version of record_disposal() for batch ingest.
+
+    `events` are dicts of WasteRecord fields (user_id, waste_type,
+    points_earned, bin, weight_kg, disposed_at, event_id). Events whose
+    event_id already exists are skipped. Records go in with one bulk_create
+    and each user's profile gets a single aggregated UPDATE.
+
+    Returns ([WasteRecord, or None for a duplicate, per event], {user_id: Award}).
+    """
+    keys = [e['event_id'] for e in events if e.get('event_id')]
+    with transaction.atomic():
+        seen = set(WasteRecord.objects.filter(event_id__in=keys).values_list('event_id', flat=True)) if keys else set()
+        slots = []
+        for event in events:
+            key = event.get('event_id')
+            if key and key in seen:
+                slots.append(None)
+                continue
+            seen.add(key)
+            slots.append(WasteRecord(**event))
+
+        records = WasteRecord.objects.bulk_create([r for r in slots if r is not None])
+        daily_stats.record(records)
+
+        deltas = {}
+        for record in records:
+            points, counts = deltas.get(record.user_id, (0, {}))
+            counts[record.waste_type] = counts.get(record.waste_type, 0) + 1
+            deltas[record.user_id] = (points + record.points_earned, counts)
+        for user_id, (points, counts) in deltas.items():
+            _apply(user_id, points, counts)
+
+        totals = UserProfile.objects.filter(user_id__in=deltas).values_list('user_id', 'total_points', 'level', 'total_waste_disposed')
+        awards = {
+            user_id: Award(deltas[user_id][0], total_points, level,
+                           level_for_points(total_points - deltas[user_id][0]), total)
+            for user_id, total_points, level, total in totals
+        }
+        for user_id, award in awards.items():
+            _publish_on_commit(user_id, award)
+
+    metrics.counter('points.awards').inc(len(records))
+    return slots, awards
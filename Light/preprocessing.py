@@ -0,0 +1,123 @@
+"""
+Shared image preprocessing for the waste classifier
+Used by the dashboard (upload + live capture) and the QR auto-disposal paths
+
+MobileNetV3's Keras `preprocess_input` is a pass-through (the model rescales
+internally), so the model input is simply RGB float32 in [0, 255]. Doing it
+here with OpenCV keeps TensorFlow out of the request path.
+"""
+
+import io
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+INPUT_SIZE = (224, 224)
+
+# cv2 flags for JPEG DCT-domain downscaled decoding
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+_local = threading.local()
+
+
+# ==================== DECODING ====================
+
+def _read_bytes(data):
+    """Accept bytes, memoryview/bytearray or a file-like upload (Django UploadedFile)"""
+    if hasattr(data, 'read'):
+        if hasattr(data, 'seek'):
+            data.seek(0)
+        payload = data.read()
+        if hasattr(data, 'seek'):
+            data.seek(0)  # leave the upload readable for FileField.save()
+        return payload
+    return data
+
+
+def _decode_flag(data, size):
+    """Pick the largest JPEG reduction that still leaves the short side >= target"""
+    try:
+        header = Image.open(io.BytesIO(data))
+        if header.format != 'JPEG':
+            return cv2.IMREAD_COLOR
+        width, height = header.size
+    except Exception:
+        return cv2.IMREAD_COLOR
+    short_side = min(width, height)
+    for factor, flag in _REDUCED_FLAGS:
+        if short_side // factor >= max(size):
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_image(data, size=INPUT_SIZE):
+    """
+    Decode an encoded image (JPEG/PNG/...) straight from memory into a BGR array.
+
+    Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still covers
+    the model input, which is much cheaper than a full decode + resize.
+    """
+    data = _read_bytes(data)
+    if not data:
+        raise ValueError("Empty image data")
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    frame = cv2.imdecode(buffer, _decode_flag(data, size))
+    if frame is None:
+        raise ValueError("Invalid image file")
+    return frame
+
+
+# ==================== BATCH PREPROCESSING ====================
+
+def batch_buffer(batch_size, size=INPUT_SIZE):
+    """
+    Return this thread's reusable (batch_size, H, W, 3) float32 buffer.
+
+    The buffer grows when needed and is reused across calls on the same
+    thread, so the returned view is only valid until the next call.
+    """
+    buffer = getattr(_local, 'buffer', None)
+    shape = (size[1], size[0], 3)
+    if buffer is None or buffer.shape[0] < batch_size or buffer.shape[1:] != shape:
+        buffer = np.empty((max(batch_size, 1),) + shape, dtype=np.float32)
+        _local.buffer = buffer
+    return buffer[:batch_size]
+
+
+def preprocess_batch(images, out=None, size=INPUT_SIZE):
+    """
+    Convert N images into model input: (N, H, W, 3) RGB float32 in [0, 255].
+
+    `images` may contain BGR uint8 arrays (camera frames) and/or encoded
+    bytes / uploads, which are decoded in memory. Results are written into
+    `out` when given (see batch_buffer), otherwise a new array is allocated.
+    """
+    if isinstance(images, np.ndarray) and images.ndim == 3:
+        images = [images]
+    count = len(images)
+    if out is None:
+        out = np.empty((count, size[1], size[0], 3), dtype=np.float32)
+    elif out.shape[0] < count:
+        raise ValueError(f"Output buffer holds {out.shape[0]} images, got {count}")
+
+    resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    for i, img in enumerate(images):
+        if not isinstance(img, np.ndarray):
+            img = decode_image(img, size)
+        # Resize first, then convert colour on the small image
+        cv2.resize(img, size, dst=resized, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=resized)
+        out[i] = resized
+    return out[:count]
+
+
+def preprocess(images):
+    """preprocess_batch() into this thread's reusable buffer (valid until the next call)"""
+    count = 1 if isinstance(images, np.ndarray) and images.ndim == 3 else len(images)
+    return preprocess_batch(images, out=batch_buffer(count))
@@ -0,0 +1,157 @@
+"""
+QR payload -> user summary cache for the LED disposal screen
+The kiosk re-scans the same card every second; cache hits cost no database
+round trips (and, for CNIC+PASS codes, no password hashing)
+
+Without QR_AUTH_CACHE_BACKEND each worker caches and invalidates on its own:
+a profile or password change made through one worker only reaches the others
+when their entries expire (QR_AUTH_CACHE_TTL). Point QR_AUTH_CACHE_BACKEND at a
+shared cache (Redis, Memcached) for invalidations that reach every worker.
+
+Entries are invalidated by Light/signals.py whenever a User or UserProfile is
+saved or deleted. Code that updates profiles with QuerySet.update() bypasses
+signals and must call invalidate_user() itself.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import metrics
+
+
+def payload_key(qr_data):
+    # Hash so CNIC+PASS payloads never sit in a shared cache in clear text
+    return hashlib.sha256(qr_data.strip().encode('utf-8')).hexdigest()
+
+
+class QRAuthCache:
+    """
+    Bounded in-process LRU with a TTL, optionally backed by a shared Django cache.
+
+    Each user has a generation: the time of their last invalidate_user(). A hit
+    is only served while the user's generation still matches the entry's, and a
+    lookup that started before the user's latest invalidation is not stored.
+    Generations live in the shared backend when there is one (one key per user,
+    so an invalidation in one worker reaches every worker); otherwise they are
+    local to this process.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, backend=None, prefix='qrauth:'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.prefix = prefix
+        self._entries = OrderedDict()   # key -> (expires_at, generation, user_data)
+        self._generations = {}          # user_id -> generation (local backend only)
+        self._lock = threading.Lock()
+
+    # ---------- generations ----------
+
+    def _generation(self, user_id):
+        if self.backend is not None:
+            return self.backend.get(f'{self.prefix}gen:{user_id}', 0)
+        return self._generations.get(user_id, 0)
+
+    def invalidate_user(self, user_id):
+        # Wall clock, compared with other workers' started(): hosts sharing a backend need NTP
+        generation = time.time_ns()
+        if self.backend is not None:
+            self.backend.set(f'{self.prefix}gen:{user_id}', generation, None)
+        with self._lock:
+            self._generations[user_id] = max(generation, self._generations.get(user_id, 0) + 1)
+            stale = [k for k, (_, _, data) in self._entries.items() if data['user_id'] == user_id]
+            for k in stale:
+                del self._entries[k]
+        metrics.counter('qr_auth.invalidations').inc()
+
+    # ---------- lookups ----------
+
+    def get(self, qr_data):
+        key = payload_key(qr_data)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.backend is not None:
+            shared = self.backend.get(self.prefix + key)
+            if shared is not None:
+                entry = (now + self.ttl, shared['generation'], shared['user_data'])
+                self._store(key, entry)
+
+        if entry is not None:
+            expires_at, generation, user_data = entry
+            if expires_at > now and generation == self._generation(user_data['user_id']):
+                metrics.counter('qr_auth.cache_hits').inc()
+                return dict(user_data)
+            with self._lock:
+                self._entries.pop(key, None)
+        metrics.counter('qr_auth.cache_misses').inc()
+        return None
+
+    def started(self):
+        """Take before a database lookup and pass to set()"""
+        return time.time_ns()
+
+    def set(self, qr_data, user_data, started=None):
+        """
+        Cache a lookup result. When the user was invalidated after `started`
+        (from started() before the lookup), the result may predate the change
+        and nothing is cached.
+        """
+        key = payload_key(qr_data)
+        generation = self._generation(user_data['user_id'])
+        if started is not None and generation >= started:
+            return
+        self._store(key, (time.monotonic() + self.ttl, generation, dict(user_data)))
+        if self.backend is not None:
+            self.backend.set(self.prefix + key, {'generation': generation, 'user_data': dict(user_data)}, self.ttl)
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+# ==================== PROCESS-WIDE CACHE ====================
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                alias = settings.QR_AUTH_CACHE_BACKEND
+                _cache = QRAuthCache(
+                    max_entries=settings.QR_AUTH_CACHE_SIZE,
+                    ttl=settings.QR_AUTH_CACHE_TTL,
+                    backend=caches[alias] if alias else None,
+                )
+    return _cache
+
+
+def invalidate_user(user_id):
+    """
+    Drop cached lookups for a user. Inside a transaction the bump is repeated
+    on commit, so a lookup racing the transaction can't cache the old row
+    under the new generation.
+    """
+    get_cache().invalidate_user(user_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: get_cache().invalidate_user(user_id))
@@ -5,18 +5,14 @@ Handles QR scanning, user authentication, and AUTO disposal functionality
 
 from django.http import JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
-from Light.models import UserProfile, WasteRecord, DetectedIssues
-from Light.views import calculate_points
+from Light.models import UserProfile, Bin
+from Light import bin_client, camera_sessions, disposal_jobs, metrics, qr_auth_cache, qr_pipeline
+from Light.idempotency import idempotent
 import json
 import base64
-import cv2
-import numpy as np
-from pyzbar import pyzbar
-from datetime import datetime
-import time
-import requests
 
 
 # ==================== MAIN QR DISPOSAL SCREEN ====================
@@ -32,6 +28,35 @@ def qr_disposal_screen(request):
 
 # ==================== QR SCANNING & AUTHENTICATION ====================
 
+FRAME_SIZE_BUCKETS = (16_384, 32_768, 65_536, 131_072, 262_144, 524_288, 1_048_576, 2_097_152, 4_194_304)
+
+
+def read_qr_frame(request):
+    """
+    Return (image_bytes, source) from a /api/qr/scan/ request.
+
+    - raw body with Content-Type image/* (preferred, no base64 / JSON overhead;
+      np.frombuffer wraps request.body without copying)
+    - multipart/form-data with an `image` file
+    - legacy JSON {"image": "data:image/jpeg;base64,..."}
+    Returns (None, source) when no image was sent.
+    """
+    content_type = request.content_type or ''
+    if content_type.startswith('image/') or content_type == 'application/octet-stream':
+        return request.body or None, 'raw'
+    if content_type.startswith('multipart/'):
+        upload = request.FILES.get('image')
+        return (upload.read() if upload else None), 'multipart'
+
+    data = json.loads(request.body) if request.body else {}
+    image_data = data.get('image')
+    if not image_data:
+        return None, 'json'
+    if 'base64,' in image_data:
+        image_data = image_data.split('base64,')[1]
+    return base64.b64decode(image_data), 'json'
+
+
 @csrf_exempt
 def scan_qr_code(request):
     """
@@ -39,9 +64,10 @@ def scan_qr_code(request):
     
     Receives camera frame, detects QR code, authenticates user
     
-    Body: {
-        "image": "data:image/jpeg;base64,..."
-    }
+    Body (any of):
+        raw JPEG/PNG bytes with Content-Type: image/jpeg
+        multipart/form-data with an "image" file
+        {"image": "data:image/jpeg;base64,..."}
     
     Response: {
         "qr_detected": true,
@@ -62,38 +88,32 @@ def scan_qr_code(request):
             print("🔍 QR SCAN REQUEST RECEIVED")
             print("=" * 60)
             
-            data = json.loads(request.body)
-            image_data = data.get('image')
+            img_bytes, source = read_qr_frame(request)
+            metrics.counter(f'qr.requests.{source}').inc()
             
-            if not image_data:
+            if not img_bytes:
                 print("❌ No image data provided")
                 return JsonResponse({
                     'qr_detected': False,
                     'message': 'No image provided'
                 })
             
-            print("✅ Image data received, decoding...")
+            metrics.histogram('qr.request_bytes', buckets=FRAME_SIZE_BUCKETS).observe(len(img_bytes))
+            print(f"✅ Image data received ({source}, {len(img_bytes)} bytes), decoding...")
             
-            # Decode base64 image
-            if 'base64,' in image_data:
-                image_data = image_data.split('base64,')[1]
-            
-            img_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if frame is None:
+            # Grayscale (reduced) decode + ROI / duplicate-frame aware scan,
+            # with per-screen state kept in this client's camera session
+            scanner = camera_sessions.qr_scanner(request)
+            try:
+                qr_codes, how = scanner.scan_bytes(img_bytes)
+            except ValueError:
                 print("❌ Failed to decode image")
                 return JsonResponse({
                     'qr_detected': False,
                     'message': 'Invalid image'
                 })
             
-            print(f"✅ Image decoded successfully ({frame.shape[1]}x{frame.shape[0]})")
-            print("🔎 Scanning for QR codes...")
-            
-            # Detect QR codes
-            qr_codes = detect_qr_codes_from_frame(frame)
+            print(f"🔎 QR scan: {how}")
             
             if not qr_codes:
                 print("⏳ No QR code detected in frame")
@@ -154,27 +174,49 @@ def detect_qr_codes_from_frame(frame):
     Returns list of QR code data
     """
     try:
-        # Convert to grayscale for better detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect QR codes
-        decoded_objects = pyzbar.decode(gray)
-        
-        qr_codes = []
-        for obj in decoded_objects:
-            qr_data = obj.data.decode('utf-8')
-            qr_codes.append({
-                'data': qr_data,
-                'type': obj.type
-            })
-        
-        return qr_codes
+        return [
+            {'data': qr['data'], 'type': qr['type']}
+            for qr in qr_pipeline.scan_image(frame)
+        ]
     except Exception as e:
         print(f"❌ QR Detection Error: {str(e)}")
         return []
 
 
+def _user_summary(user, profile, cnic):
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'cnic': cnic,
+        'total_points': profile.total_points,
+        'level': profile.level,
+        'total_waste_disposed': profile.total_waste_disposed,
+        'plastic_count': profile.plastic_count,
+        'paper_count': profile.paper_count,
+        'metal_count': profile.metal_count,
+        'glass_count': profile.glass_count
+    }
+
+
 def authenticate_user_from_qr(qr_data):
+    """
+    Authenticate a QR payload, serving repeated scans of the same card from
+    the QR auth cache (no database round trips on a hit)
+    """
+    cache = qr_auth_cache.get_cache()
+    user_data = cache.get(qr_data)
+    if user_data is not None:
+        print(f"⚡ QR auth cache hit: {user_data['username']}")
+        return user_data
+
+    started = cache.started()
+    user_data = lookup_user_from_qr(qr_data)
+    if user_data:
+        cache.set(qr_data, user_data, started=started)
+    return user_data
+
+
+def lookup_user_from_qr(qr_data):
     """
     Extract CNIC from QR data and authenticate user
     
@@ -193,23 +235,12 @@ def authenticate_user_from_qr(qr_data):
             print(f"📱 Plain CNIC detected: {cnic}")
             
             try:
-                profile = UserProfile.objects.get(cnic=cnic)
+                profile = UserProfile.objects.select_related('user').get(cnic=cnic)
                 user = profile.user
                 
                 print(f"✅ User found: {user.username}")
                 
-                return {
-                    'user_id': user.id,
-                    'username': user.username,
-                    'cnic': cnic,
-                    'total_points': profile.total_points,
-                    'level': profile.level,
-                    'total_waste_disposed': profile.total_waste_disposed,
-                    'plastic_count': profile.plastic_count,
-                    'paper_count': profile.paper_count,
-                    'metal_count': profile.metal_count,
-                    'glass_count': profile.glass_count
-                }
+                return _user_summary(user, profile, cnic)
             except UserProfile.DoesNotExist:
                 print(f"❌ User not found with CNIC: {cnic}")
                 return None
@@ -231,23 +262,12 @@ def authenticate_user_from_qr(qr_data):
             print(f"📱 CNIC-only authentication: {cnic}")
             
             try:
-                profile = UserProfile.objects.get(cnic=cnic)
+                profile = UserProfile.objects.select_related('user').get(cnic=cnic)
                 user = profile.user
                 
                 print(f"✅ User authenticated: {user.username}")
                 
-                return {
-                    'user_id': user.id,
-                    'username': user.username,
-                    'cnic': cnic,
-                    'total_points': profile.total_points,
-                    'level': profile.level,
-                    'total_waste_disposed': profile.total_waste_disposed,
-                    'plastic_count': profile.plastic_count,
-                    'paper_count': profile.paper_count,
-                    'metal_count': profile.metal_count,
-                    'glass_count': profile.glass_count
-                }
+                return _user_summary(user, profile, cnic)
             except UserProfile.DoesNotExist:
                 print(f"❌ User not found with CNIC: {cnic}")
                 return None
@@ -260,24 +280,13 @@ def authenticate_user_from_qr(qr_data):
             print(f"🔐 CNIC + Password authentication")
             
             try:
-                profile = UserProfile.objects.get(cnic=cnic)
+                profile = UserProfile.objects.select_related('user').get(cnic=cnic)
                 user = profile.user
                 
                 # Verify password
                 if user.check_password(password):
                     print(f"✅ Password verified for: {user.username}")
-                    return {
-                        'user_id': user.id,
-                        'username': user.username,
-                        'cnic': cnic,
-                        'total_points': profile.total_points,
-                        'level': profile.level,
-                        'total_waste_disposed': profile.total_waste_disposed,
-                        'plastic_count': profile.plastic_count,
-                        'paper_count': profile.paper_count,
-                        'metal_count': profile.metal_count,
-                        'glass_count': profile.glass_count
-                    }
+                    return _user_summary(user, profile, cnic)
                 else:
                     print(f"❌ Password verification failed")
                     return None
@@ -291,23 +300,12 @@ def authenticate_user_from_qr(qr_data):
             cnic = user_data['CNIC']
             
             try:
-                user = User.objects.get(id=user_id)
+                user = User.objects.select_related('profile').get(id=user_id)
                 profile = user.profile
                 
                 # Verify CNIC matches
                 if profile.cnic == cnic:
-                    return {
-                        'user_id': user.id,
-                        'username': user.username,
-                        'cnic': cnic,
-                        'total_points': profile.total_points,
-                        'level': profile.level,
-                        'total_waste_disposed': profile.total_waste_disposed,
-                        'plastic_count': profile.plastic_count,
-                        'paper_count': profile.paper_count,
-                        'metal_count': profile.metal_count,
-                        'glass_count': profile.glass_count
-                    }
+                    return _user_summary(user, profile, cnic)
             except User.DoesNotExist:
                 print(f"❌ User not found with ID: {user_id}")
                 return None
@@ -323,25 +321,25 @@ def authenticate_user_from_qr(qr_data):
 # ==================== DISPOSAL FUNCTIONALITY ====================
 
 @csrf_exempt
+@idempotent('start_disposal')
 def start_disposal(request):
     """
     POST /api/qr/start-disposal/
     
-    Triggers AUTO disposal functionality (same as dashboard.html)
+    Queues an AUTO disposal (same sequence as the dashboard AUTO button) and
+    returns immediately; poll /api/qr/status/?job=<job_id> for progress
     
     Body: {
         "user_id": 10,
-        "cnic": "12345-1234567-1"
+        "cnic": "12345-1234567-1",
+        "bin_id": "BIN-001"          (optional, defaults to ESP32_WROOM_IP)
     }
     
-    Response: {
+    Response (202): {
         "success": true,
-        "disposal_data": {
-            "waste_type": "plastic",
-            "points_earned": 10,
-            "total_points": 60,
-            "confidence": 95.3
-        }
+        "job_id": "3f2c...",
+        "state": "queued",
+        "status_url": "/api/qr/status/?job=3f2c..."
     }
     """
     if request.method == 'POST':
@@ -354,7 +352,7 @@ def start_disposal(request):
             
             # Get user
             try:
-                user = User.objects.get(id=user_id)
+                user = User.objects.select_related('profile').get(id=user_id)
                 profile = user.profile
                 
                 # Verify CNIC
@@ -369,19 +367,32 @@ def start_disposal(request):
                     'message': 'User not found'
                 })
             
-            # Execute AUTO disposal sequence
-            disposal_result = execute_auto_disposal(user)
+            # Resolve the bin's control address (Bin.ip_address or settings.ESP32_WROOM_IP)
+            bin_obj = None
+            if data.get('bin_id'):
+                bin_obj = Bin.objects.filter(bin_id=data['bin_id']).first()
+                if bin_obj is None:
+                    return JsonResponse({'success': False, 'message': 'Bin not found'}, status=404)
+            host = bin_client.bin_host(bin_obj)
+            if not bin_client.get_client(host).available:
+                return JsonResponse({'success': False, 'message': 'Bin is offline'}, status=503)
             
-            if disposal_result['success']:
-                return JsonResponse({
-                    'success': True,
-                    'disposal_data': disposal_result['data']
-                })
-            else:
+            # Queue AUTO disposal sequence on the disposal worker pool
+            try:
+                job = disposal_jobs.get_runner().submit(user, bin_ip=host)
+            except disposal_jobs.BinBusy as busy:
                 return JsonResponse({
                     'success': False,
-                    'message': disposal_result.get('message', 'Disposal failed')
-                })
+                    'message': 'Bin is busy with another disposal',
+                    'job_id': busy.job_id
+                }, status=409)
+            
+            return JsonResponse({
+                'success': True,
+                'job_id': job.id,
+                'state': job.state,
+                'status_url': f"{reverse('disposal_status')}?job={job.id}"
+            }, status=202)
                 
         except Exception as e:
             print(f"❌ Disposal Error: {str(e)}")
@@ -393,188 +404,27 @@ def start_disposal(request):
     return JsonResponse({'success': False, 'message': 'Only POST allowed'})
 
 
-def execute_auto_disposal(user):
-    """
-    Execute AUTO disposal sequence (same as dashboard.html AUTO button)
-    
-    Steps:
-    1. Open bin lid
-    2. Wait for user to place waste (5 seconds)
-    3. Capture image from ESP32 camera
-    4. Classify waste using AI
-    5. Open correct compartment
-    6. Close compartment and lid
-    7. Save to database
-    """
-    try:
-        print("🤖 Executing AUTO disposal sequence...")
-        
-        # IoT Bin IP (same as dashboard)
-        bin_ip = "192.168.4.81"
-        
-        # STEP 1: Open lid
-        print("🔓 Step 1: Opening bin lid...")
-        try:
-            response = requests.get(f"http://{bin_ip}/openlid", timeout=5)
-            print(f"✅ Lid opened: {response.status_code}")
-        except Exception as e:
-            print(f"⚠️ Lid open warning: {str(e)}")
-        
-        # STEP 2: Wait for user to place waste
-        print("⏱️ Step 2: Waiting 5 seconds for user to place waste...")
-        time.sleep(5)
-        
-        # STEP 3: Capture image from ESP32 camera
-        print("📸 Step 3: Capturing image...")
-        camera_url = f"http://192.168.4.1:81/stream"  # ESP32 camera
-        
-        try:
-            # Capture frame from camera
-            import cv2
-            cap = cv2.VideoCapture(camera_url)
-            ret, frame = cap.read()
-            cap.release()
-            
-            if not ret:
-                raise Exception("Failed to capture image")
-            
-            print("✅ Image captured")
-        except Exception as e:
-            print(f"⚠️ Camera capture failed: {str(e)}")
-            # Use default/test image if camera fails
-            frame = None
-        
-        # STEP 4: Classify waste using AI
-        print("🤖 Step 4: Classifying waste...")
-        
-        if frame is not None:
-            # Use actual AI classification (from views.py)
-            from Light.views import model, class_labels
-            import tensorflow as tf
-            
-            # Preprocess image
-            img_resized = cv2.resize(frame, (224, 224))
-            img_array = np.expand_dims(img_resized, axis=0)
-            img_array = img_array / 255.0
-            
-            # Predict
-            predictions = model.predict(img_array)
-            predicted_index = np.argmax(predictions)
-            predicted_label = class_labels[predicted_index]
-            confidence = float(np.max(predictions) * 100)
-            
-            waste_type = predicted_label.lower()
-            
-            print(f"✅ Classified as: {waste_type} ({confidence:.2f}%)")
-        else:
-            # Default to plastic if no camera
-            waste_type = "plastic"
-            confidence = 85.0
-            print(f"⚠️ Using default: {waste_type}")
-        
-        # STEP 5: Open correct compartment
-        print(f"🚪 Step 5: Opening {waste_type} compartment...")
-        
-        compartment_map = {
-            'plastic': 'plastic',
-            'paper': 'paper',
-            'metal': 'metal',
-            'glass': 'glass',
-            'cardboard': 'paper',
-            'trash': 'plastic'  # Default
-        }
-        
-        compartment = compartment_map.get(waste_type, 'plastic')
-        
-        try:
-            response = requests.get(f"http://{bin_ip}/{compartment}", timeout=5)
-            print(f"✅ Compartment opened: {response.status_code}")
-        except Exception as e:
-            print(f"⚠️ Compartment warning: {str(e)}")
-        
-        # Wait for waste to fall
-        time.sleep(2)
-        
-        # STEP 6: Close compartment and lid
-        print("🔒 Step 6: Closing bin...")
-        try:
-            response = requests.get(f"http://{bin_ip}/closelid", timeout=5)
-            print(f"✅ Bin closed: {response.status_code}")
-        except Exception as e:
-            print(f"⚠️ Close warning: {str(e)}")
-        
-        # STEP 7: Calculate points and save to database
-        print("💾 Step 7: Saving to database...")
-        
-        points = calculate_points(waste_type)
-        
-        # Create DetectedIssue record
-        detected_issue = DetectedIssues.objects.create(
-            user=user,
-            result=waste_type,
-            confidence=confidence,
-            is_processed=True,
-            points_awarded=points
-        )
-        
-        # Create WasteRecord
-        waste_record = WasteRecord.objects.create(
-            user=user,
-            waste_type=waste_type,
-            points_earned=points,
-            detected_issue=detected_issue,
-            disposed_at=datetime.now()
-        )
-        
-        # Update UserProfile
-        profile = user.profile
-        profile.total_points += points
-        profile.total_waste_disposed += 1
-        
-        # Update waste type counters
-        if waste_type == 'plastic':
-            profile.plastic_count += 1
-        elif waste_type == 'paper' or waste_type == 'cardboard':
-            profile.paper_count += 1
-        elif waste_type == 'metal':
-            profile.metal_count += 1
-        elif waste_type == 'glass':
-            profile.glass_count += 1
-        
-        profile.save()
-        profile.update_level()
-        
-        print(f"✅ Disposal complete! User earned {points} points")
-        
-        return {
-            'success': True,
-            'data': {
-                'waste_type': waste_type,
-                'points_earned': points,
-                'total_points': profile.total_points,
-                'confidence': confidence,
-                'record_id': waste_record.id
-            }
-        }
-        
-    except Exception as e:
-        print(f"❌ AUTO Disposal Error: {str(e)}")
-        return {
-            'success': False,
-            'message': f'Error: {str(e)}'
-        }
-
-
 # ==================== STATUS & UTILITY ====================
 
 def get_disposal_status(request):
     """
-    GET /api/qr/status/
+    GET /api/qr/status/?job=<job_id>
     
-    Returns current disposal status (for real-time updates)
+    Live progress of one disposal job (state, history, result), or without
+    ?job= the overall status and the jobs running on this worker
     """
-    # This can be enhanced with Redis/WebSocket for real-time updates
+    job_id = request.GET.get('job')
+    runner = disposal_jobs.get_runner()
+    if job_id:
+        job = runner.status(job_id)
+        if job is None:
+            return JsonResponse({'status': 'unknown', 'message': 'Unknown disposal job'}, status=404)
+        return JsonResponse({'status': job['state'], **job})
+
+    active = runner.active_jobs()
     return JsonResponse({
-        'status': 'ready',
-        'message': 'System ready for disposal'
+        'status': 'busy' if active else 'ready',
+        'message': 'Disposal in progress' if active else 'System ready for disposal',
+        'jobs': active,
+        'bins': bin_client.client_stats()
     })
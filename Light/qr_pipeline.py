@@ -0,0 +1,284 @@
+"""
+Fast QR decode pipeline
+Used by the LED disposal screen (/api/qr/scan/), the QR scanner stream and
+image uploads
+
+- decodes JPEGs straight to grayscale, at 1/2-1/8 scale when the frame is large
+- downscales adaptively so zbar never sees more than QR_MAX_SIDE pixels
+- rescans the last QR bounding box (region of interest) first
+- skips frames that are near-identical to the previous one
+- uses pyzbar when libzbar is installed, OpenCV's QRCodeDetector otherwise
+  (or as a fallback when zbar finds nothing)
+"""
+
+import io
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from . import metrics
+
+QR_MAX_SIDE = 800          # adaptive downscale target for full-frame scans
+QR_MIN_SIDE = 480          # never decode JPEGs smaller than this on the long side
+ROI_MARGIN = 0.35          # ROI = last bbox grown by this fraction on each side
+DUPLICATE_THRESHOLD = 6.0  # max per-cell change (0-255) of the 32x24 frame signature
+
+_REDUCED_GRAY_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+# ==================== DECODERS ====================
+
+_pyzbar = None
+_pyzbar_checked = False
+_local = threading.local()
+
+
+def _zbar():
+    """pyzbar module, or None when it (or the libzbar shared library) is missing"""
+    global _pyzbar, _pyzbar_checked
+    if not _pyzbar_checked:
+        try:
+            from pyzbar import pyzbar
+            _pyzbar = pyzbar
+        except (ImportError, OSError) as e:
+            print(f"⚠️ pyzbar unavailable ({e}), using OpenCV QRCodeDetector")
+        _pyzbar_checked = True
+    return _pyzbar
+
+
+def _opencv_detector():
+    # QRCodeDetector is not thread-safe, keep one per thread
+    detector = getattr(_local, 'detector', None)
+    if detector is None:
+        detector = cv2.QRCodeDetector()
+        _local.detector = detector
+    return detector
+
+
+def _decode_zbar(gray):
+    codes = []
+    for obj in _zbar().decode(gray):
+        try:
+            data = obj.data.decode('utf-8')
+        except UnicodeDecodeError:
+            continue
+        codes.append({
+            'data': data,
+            'type': obj.type,
+            'points': [(p.x, p.y) for p in obj.polygon],
+        })
+    return codes
+
+
+def _decode_opencv(gray):
+    try:
+        ok, decoded, points, _ = _opencv_detector().detectAndDecodeMulti(gray)
+    except cv2.error:
+        return []
+    if not ok or points is None:
+        return []
+    return [
+        {'data': data, 'type': 'QRCODE', 'points': [(int(x), int(y)) for x, y in quad]}
+        for data, quad in zip(decoded, points)
+        if data
+    ]
+
+
+def decode(gray, fallback=True):
+    """Decode QR codes in a grayscale image: [{'data', 'type', 'points'}, ...]"""
+    if _zbar() is not None:
+        codes = _decode_zbar(gray)
+        if codes or not fallback:
+            return codes
+    return _decode_opencv(gray)
+
+
+# ==================== IMAGE LOADING ====================
+
+def _gray_flag(data, min_side):
+    """Largest JPEG reduction that keeps the long side >= min_side"""
+    try:
+        header = Image.open(io.BytesIO(data))
+        if header.format != 'JPEG':
+            return cv2.IMREAD_GRAYSCALE, 1
+        long_side = max(header.size)
+    except Exception:
+        return cv2.IMREAD_GRAYSCALE, 1
+    for factor, flag in _REDUCED_GRAY_FLAGS:
+        if long_side // factor >= min_side:
+            return flag, factor
+    return cv2.IMREAD_GRAYSCALE, 1
+
+
+def decode_gray(data, min_side=QR_MIN_SIDE):
+    """
+    Decode encoded image bytes straight to grayscale.
+
+    Returns (gray, scale) where `scale` maps gray coordinates back to the
+    original image (1, 2, 4 or 8). Raises ValueError on undecodable data.
+    """
+    if not data:
+        raise ValueError("Empty image data")
+    started = time.perf_counter()
+    flag, factor = _gray_flag(data, min_side)
+    # np.frombuffer wraps the request body / upload bytes without copying
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if gray is None:
+        raise ValueError("Invalid image")
+    metrics.histogram('qr.image_decode_ms').observe((time.perf_counter() - started) * 1000)
+    return gray, factor
+
+
+def to_gray(frame):
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def frame_signature(gray):
+    """
+    32x24 cells of (mean, contrast). Contrast matters: an area-averaged QR
+    code is mid-gray, so brightness alone misses a code entering the frame.
+    """
+    small = cv2.resize(gray, (128, 96), interpolation=cv2.INTER_AREA).astype(np.float32)
+    mean = cv2.resize(small, (32, 24), interpolation=cv2.INTER_AREA)
+    sq = cv2.resize(small * small, (32, 24), interpolation=cv2.INTER_AREA)
+    return np.stack([mean, np.sqrt(np.maximum(sq - mean * mean, 0))])
+
+
+def _bbox(points):
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _scaled(codes, scale, dx=0, dy=0):
+    for code in codes:
+        code['points'] = [(int(x * scale + dx), int(y * scale + dy)) for x, y in code['points']]
+    return codes
+
+
+# ==================== STATEFUL SCANNER ====================
+
+class QRScanner:
+    """
+    QR scanner for one camera / screen.
+
+    Remembers the previous frame's thumbnail and QR position, so a client
+    polling the same scene pays for a thumbnail diff, and a client holding a
+    code steady in front of the camera pays for a small ROI scan.
+    """
+
+    def __init__(self, max_side=QR_MAX_SIDE, duplicate_threshold=DUPLICATE_THRESHOLD, fallback=True):
+        self.max_side = max_side
+        self.duplicate_threshold = duplicate_threshold
+        self.fallback = fallback
+        self._thumb = None
+        self._roi = None          # (x0, y0, x1, y1) in full-frame coordinates
+        self._last_codes = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._thumb = None
+            self._roi = None
+            self._last_codes = []
+
+    def scan(self, gray, scale=1):
+        """
+        Scan a grayscale frame. `scale` maps its coordinates to the original
+        frame (see decode_gray). Returns (codes, how) where `how` is one of
+        'duplicate', 'roi', 'full' or 'none'.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            codes, how = self._scan(gray, scale)
+        metrics.histogram('qr.decode_ms').observe((time.perf_counter() - started) * 1000)
+        metrics.counter(f'qr.scans.{how}').inc()
+        return [dict(code) for code in codes], how
+
+    def _scan(self, gray, scale):
+        thumb = frame_signature(gray)
+        if self._thumb is not None and float(np.abs(thumb - self._thumb).max()) < self.duplicate_threshold:
+            return self._last_codes, 'duplicate'
+        self._thumb = thumb
+
+        if self._roi is not None:
+            codes = self._scan_roi(gray, scale)
+            if codes:
+                return self._remember(codes), 'roi'
+
+        codes = self._scan_full(gray, scale)
+        if codes:
+            return self._remember(codes), 'full'
+        self._roi = None
+        self._last_codes = []
+        return [], 'none'
+
+    def _scan_roi(self, gray, scale):
+        height, width = gray.shape[:2]
+        x0, y0, x1, y1 = (v / scale for v in self._roi)
+        mx, my = (x1 - x0) * ROI_MARGIN, (y1 - y0) * ROI_MARGIN
+        x0, y0 = max(int(x0 - mx), 0), max(int(y0 - my), 0)
+        x1, y1 = min(int(x1 + mx), width), min(int(y1 + my), height)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return []
+        codes = decode(gray[y0:y1, x0:x1], fallback=self.fallback)
+        return _scaled(codes, scale, x0 * scale, y0 * scale)
+
+    def _scan_full(self, gray, scale):
+        factor = 1.0
+        long_side = max(gray.shape[:2])
+        if long_side > self.max_side:
+            factor = self.max_side / long_side
+            gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+        codes = decode(gray, fallback=self.fallback)
+        return _scaled(codes, scale / factor)
+
+    def _remember(self, codes):
+        boxes = [_bbox(code['points']) for code in codes if code['points']]
+        if boxes:
+            self._roi = (
+                min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes),
+            )
+        self._last_codes = codes
+        return codes
+
+    def scan_bytes(self, data):
+        """Decode an encoded frame (reduced grayscale decode) and scan it"""
+        gray, scale = decode_gray(data)
+        return self.scan(gray, scale)
+
+    def scan_frame(self, frame):
+        """Scan a BGR or grayscale frame"""
+        return self.scan(to_gray(frame))
+
+
+def scan_image(frame_or_bytes):
+    """One-shot scan without ROI / duplicate state (uploads, single images)"""
+    scanner = QRScanner(duplicate_threshold=-1)
+    if isinstance(frame_or_bytes, np.ndarray):
+        return scanner.scan_frame(frame_or_bytes)[0]
+    return scanner.scan_bytes(frame_or_bytes)[0]
+
+
+def draw_codes(frame, codes):
+    """Outline and label decoded codes on a BGR frame (in place)"""
+    for code in codes:
+        points = code['points']
+        if len(points) == 4:
+            for i in range(4):
+                cv2.line(frame, points[i], points[(i + 1) % 4], (0, 255, 0), 3)
+        if points:
+            x0, y0, _, _ = _bbox(points)
+            cv2.putText(frame, f"QR: {code['data']}", (x0, y0 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    return frame
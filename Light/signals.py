@@ -0,0 +1,34 @@
+"""
+Model signal handlers
+Connected in LightConfig.ready()
+"""
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import bin_index, qr_auth_cache
+from .models import Bin, UserProfile
+
+
+# ==================== QR AUTH CACHE INVALIDATION ====================
+
+@receiver([post_save, post_delete], sender=UserProfile, dispatch_uid='qr_auth_profile_changed')
+def profile_changed(sender, instance, **kwargs):
+    """Points, level, counters or CNIC changed: drop cached QR lookups for this user"""
+    qr_auth_cache.invalidate_user(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User, dispatch_uid='qr_auth_user_changed')
+def user_changed(sender, instance, created=False, **kwargs):
+    """Username / password changed (CNIC+PASS codes) or user removed"""
+    if not created:
+        qr_auth_cache.invalidate_user(instance.pk)
+
+
+# ==================== NEAREST-BIN INDEX ====================
+
+@receiver([post_save, post_delete], sender=Bin, dispatch_uid='bin_index_bin_changed')
+def bin_changed(sender, instance, **kwargs):
+    """Positions may have changed: rebuild this worker's grid index on the next search"""
+    bin_index.invalidate()
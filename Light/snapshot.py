@@ -0,0 +1,104 @@
+"""
+Single-frame snapshot capture from the ESP32-CAM
+Used by auto-disposal and capture_image.py instead of opening the MJPEG
+stream (FFmpeg probe + connection setup + stale buffered frame) per capture
+
+Sources, in order:
+1. a running FrameBroker for the stream: wait for the next frame it decodes
+2. the camera's still endpoint (CameraWebServer serves http://<cam>/capture)
+   over a keep-alive session
+3. fallback: open the stream with cv2.VideoCapture and read one frame
+"""
+
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+import requests
+
+from . import metrics, streaming
+
+Snapshot = namedtuple('Snapshot', ['frame', 'timestamp', 'source'])
+
+_session = requests.Session()
+_warm = {}
+_warm_lock = threading.Lock()
+
+
+def still_url(stream_url):
+    """'http://192.168.4.1:81/stream' -> 'http://192.168.4.1/capture' (ESP32 CameraWebServer layout)"""
+    parts = urlsplit(stream_url)
+    if parts.scheme not in ('http', 'https'):
+        return None
+    return f"{parts.scheme}://{parts.hostname}/capture"
+
+
+def keep_warm(stream_url):
+    """Hold a permanent broker reference so snapshots never pay stream setup"""
+    with _warm_lock:
+        if stream_url not in _warm or _warm[stream_url].stopped:
+            _warm[stream_url] = streaming.acquire(stream_url)
+        return _warm[stream_url]
+
+
+def _from_broker(broker, timeout):
+    # Wait for a frame decoded *after* the request, not the one already buffered
+    seq = broker.wait_for_frame(broker.seq, timeout=timeout)
+    if seq is None:
+        return None
+    _, frame, ts = broker.latest()
+    return Snapshot(frame.copy(), ts, 'stream')
+
+
+def _from_still(url, timeout):
+    response = _session.get(url, timeout=timeout)
+    response.raise_for_status()
+    frame = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError(f"{url} did not return an image")
+    return Snapshot(frame, time.time(), 'still')
+
+
+def _from_stream_open(stream_url):
+    cap = cv2.VideoCapture(stream_url)
+    try:
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+    return Snapshot(frame, time.time(), 'stream_open') if ret else None
+
+
+def capture_snapshot(stream_url, snapshot_url=None, timeout=3.0, fallback=True):
+    """
+    Return the freshest available Snapshot(frame, timestamp, source) or None.
+
+    `snapshot_url` overrides the still endpoint derived from `stream_url`;
+    pass '' to skip the still endpoint.
+    """
+    started = time.perf_counter()
+    snap = None
+
+    broker = streaming.get_broker(stream_url)
+    if broker is not None:
+        snap = _from_broker(broker, timeout)
+
+    if snap is None:
+        url = still_url(stream_url) if snapshot_url is None else snapshot_url
+        if url:
+            try:
+                snap = _from_still(url, timeout)
+            except (requests.RequestException, ValueError) as e:
+                print(f"⚠️ Still capture failed ({e})")
+
+    if snap is None and fallback:
+        print("📹 Falling back to opening the stream for one frame")
+        snap = _from_stream_open(stream_url)
+
+    if snap is not None:
+        metrics.histogram(f'snapshot.ms.{snap.source}').observe((time.perf_counter() - started) * 1000)
+    else:
+        metrics.counter('snapshot.failures').inc()
+    return snap
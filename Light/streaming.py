@@ -0,0 +1,366 @@
+"""
+Shared frame broker for ESP32-CAM streams
+One capture thread per stream URL, fanned out to any number of viewers,
+QR detectors and capture requests
+
+mjpeg_frames() serves a viewer from a WSGI worker thread; amjpeg_frames()
+serves it from the ASGI event loop, where a waiting viewer holds no thread.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+import traceback
+from urllib.parse import urlsplit
+
+import cv2
+
+from . import aio, metrics
+
+
+def normalize_stream_url(ip):
+    """
+    Accept 'http://host:81/stream' or the dashboard's '192_168_4_1:81/stream' form.
+    Anything else (file paths, file:/concat:/rtsp: and other FFmpeg protocols)
+    raises ValueError: this comes straight from the ?ip= query parameter.
+    """
+    ip = ip.strip()
+    if '://' not in ip:
+        ip = "http://" + ip.replace('_', '.')
+    parts = urlsplit(ip)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"Unsupported stream URL: {ip!r}")
+    return ip
+
+
+class FrameBroker:
+    """
+    Owns a single cv2.VideoCapture for one stream URL.
+
+    The capture thread publishes each decoded frame with an increasing
+    sequence number. Readers share the latest frame (treat it as read-only)
+    and JPEG encodings are cached per (sequence number, quality), so N
+    viewers cost one encode per frame instead of N.
+    """
+
+    def __init__(self, url, jpeg_quality=80):
+        self.url = url
+        self.jpeg_quality = jpeg_quality
+        print(f"📹 Connecting to camera stream: {url}")
+        self.video = cv2.VideoCapture(url)
+        if not self.video.isOpened():
+            raise ValueError(f"Cannot open video stream at {url}")
+        self.video.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = None
+        self._jpeg_cache = {}
+        self._encode_lock = threading.Lock()
+        self._waiters = aio.Waiters()  # async viewers
+        self._refs = 0
+        self.stopped = False
+
+        self._thread = threading.Thread(target=self._update, name=f'broker-{url}', daemon=True)
+        self._thread.start()
+
+    # ---------- capture thread ----------
+
+    def _update(self):
+        retry_count = 0
+        max_retries = 3
+        while not self.stopped:
+            grabbed, frame = self.video.read()
+            if not grabbed:
+                retry_count += 1
+                if retry_count >= max_retries:
+                    print("⚠️ Frame grab failed after retries — possible stream drop.")
+                    break
+                time.sleep(0.1)
+                continue
+            retry_count = 0
+            with self._cond:
+                self._frame = frame
+                self._seq += 1
+                self._timestamp = time.time()
+                self._cond.notify_all()
+            self._waiters.notify_all()
+            metrics.counter('stream.frames_captured').inc()
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+        self._waiters.notify_all()
+        print("🛑 Camera thread stopped.")
+
+    # ---------- readers ----------
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def latest(self):
+        """Return (seq, frame, timestamp); frame is shared, copy it before drawing on it"""
+        with self._cond:
+            return self._seq, self._frame, self._timestamp
+
+    def wait_for_frame(self, after_seq=0, timeout=None):
+        """Block until a frame newer than `after_seq` exists; returns the new seq (or None)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > after_seq or self.stopped, timeout=timeout)
+            return self._seq if self._seq > after_seq else None
+
+    async def await_frame(self, after_seq=0, timeout=None):
+        """wait_for_frame() for coroutines: waits on the event loop instead of a thread"""
+        await self._waiters.wait_for(lambda: self._seq > after_seq or self.stopped, timeout=timeout)
+        return self._seq if self._seq > after_seq else None
+
+    def jpeg(self, quality=None):
+        """Return (seq, jpeg_bytes) for the latest frame, encoding at most once per frame"""
+        quality = quality or self.jpeg_quality
+        seq, frame, _ = self.latest()
+        if frame is None:
+            return seq, None
+        cached = self._jpeg_cache.get(quality)
+        if cached and cached[0] == seq:
+            metrics.counter('stream.jpeg_cache_hits').inc()
+            return cached
+        with self._encode_lock:
+            cached = self._jpeg_cache.get(quality)
+            if cached and cached[0] == seq:
+                return cached
+            ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+            if not ok:
+                return seq, None
+            cached = (seq, buffer.tobytes())
+            self._jpeg_cache[quality] = cached
+            metrics.counter('stream.jpeg_encodes').inc()
+        return cached
+
+    # ---------- lifecycle ----------
+
+    def stop(self):
+        """Stop the capture thread and release the stream"""
+        if self._thread is None:
+            return
+        print("🛑 Stopping camera...")
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+        self._waiters.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        if self.video.isOpened():
+            try:
+                self.video.release()
+            except Exception as e:
+                if "libavformat" in str(e) or "stream_index" in str(e):
+                    print(f"⚠️ Suppressed FFmpeg assertion on release: {e}")
+                else:
+                    traceback.print_exc()
+        print("📷 Camera stopped and released.")
+
+
+# ==================== MJPEG GENERATOR ====================
+
+class StreamStats:
+    """Per-client stream counters: frames sent, frames skipped, fps and encode time"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, url, kind='mjpeg', target_fps=None, quality=None):
+        self.id = next(self._ids)
+        self.url = url
+        self.kind = kind
+        self.target_fps = target_fps
+        self.quality = quality
+        self.started = time.time()
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.encode_ms_total = 0.0
+        self._recent = []  # send timestamps within the last second
+
+    def record(self, encode_ms, dropped):
+        now = time.perf_counter()
+        self.frames_sent += 1
+        self.frames_dropped += dropped
+        self.encode_ms_total += encode_ms
+        self._recent = [t for t in self._recent if now - t < 1.0]
+        self._recent.append(now)
+        metrics.counter('stream.frames_sent').inc()
+        if dropped:
+            metrics.counter('stream.frames_dropped').inc(dropped)
+        metrics.histogram('stream.encode_ms').observe(encode_ms)
+
+    def snapshot(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'kind': self.kind,
+            'target_fps': self.target_fps,
+            'quality': self.quality,
+            'fps': len(self._recent),
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'avg_encode_ms': round(self.encode_ms_total / self.frames_sent, 3) if self.frames_sent else None,
+            'uptime_s': round(time.time() - self.started, 1),
+        }
+
+
+_streams = {}
+
+
+def _open_stats(broker, fps, quality, kind):
+    stats = StreamStats(broker.url, kind=kind, target_fps=fps, quality=quality or broker.jpeg_quality)
+    _streams[stats.id] = stats
+    metrics.gauge('stream.active_clients').set(len(_streams))
+    return stats
+
+
+def _close_stats(stats):
+    _streams.pop(stats.id, None)
+    metrics.gauge('stream.active_clients').set(len(_streams))
+
+
+def _part(jpeg):
+    return b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n\r\n'
+
+
+def _encode(broker, render, quality):
+    if render is not None:
+        seq, frame, _ = broker.latest()
+        return seq, render(frame, quality)
+    return broker.jpeg(quality)
+
+
+def mjpeg_frames(broker, fps=None, quality=None, render=None, stop=None, kind='mjpeg', idle_timeout=5.0):
+    """
+    Yield multipart MJPEG parts, one per *new* camera frame, at most `fps` per second.
+
+    Blocks on the broker's new-frame condition instead of polling, so an idle
+    or slow camera costs no CPU. Frames the client could not keep up with are
+    skipped (and counted as dropped). `render(frame, quality)` can replace the
+    shared cached JPEG, e.g. to draw a QR overlay. Stops when the stream ends,
+    `stop()` returns True, or no frame arrives for `idle_timeout` seconds.
+    """
+    stats = _open_stats(broker, fps, quality, kind)
+    interval = 1.0 / fps if fps else 0.0
+    next_due = 0.0
+    last_seq = 0
+    try:
+        while not (stop and stop()):
+            seq = broker.wait_for_frame(last_seq, timeout=idle_timeout)
+            if seq is None:
+                if not broker.stopped:
+                    print("⚠️ No new frame within timeout, closing stream.")
+                break
+
+            wait = next_due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+            started = time.perf_counter()
+            seq, jpeg = _encode(broker, render, quality)
+            encode_ms = (time.perf_counter() - started) * 1000
+            if jpeg is None:
+                break
+
+            stats.record(encode_ms, dropped=max(0, seq - last_seq - 1) if last_seq else 0)
+            last_seq = seq
+            next_due = max(next_due, started) + interval
+            yield _part(jpeg)
+    finally:
+        _close_stats(stats)
+
+
+async def amjpeg_frames(broker, fps=None, quality=None, render=None, stop=None, kind='mjpeg', idle_timeout=5.0):
+    """
+    mjpeg_frames() as an async generator for ASGI workers. Waiting for a
+    frame and pacing happen on the event loop; only the JPEG encode / render
+    runs on a thread, so hundreds of idle or throttled viewers cost no threads.
+    """
+    stats = _open_stats(broker, fps, quality, kind)
+    interval = 1.0 / fps if fps else 0.0
+    next_due = 0.0
+    last_seq = 0
+    try:
+        while not (stop and stop()):
+            seq = await broker.await_frame(last_seq, timeout=idle_timeout)
+            if seq is None:
+                if not broker.stopped:
+                    print("⚠️ No new frame within timeout, closing stream.")
+                break
+
+            wait = next_due - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            started = time.perf_counter()
+            seq, jpeg = await asyncio.to_thread(_encode, broker, render, quality)
+            encode_ms = (time.perf_counter() - started) * 1000
+            if jpeg is None:
+                break
+
+            stats.record(encode_ms, dropped=max(0, seq - last_seq - 1) if last_seq else 0)
+            last_seq = seq
+            next_due = max(next_due, started) + interval
+            yield _part(jpeg)
+    finally:
+        _close_stats(stats)
+
+
+def stream_stats():
+    """Snapshot of every active MJPEG client in this process"""
+    return [s.snapshot() for s in list(_streams.values())]
+
+
+# ==================== BROKER REGISTRY ====================
+
+_brokers = {}
+_brokers_lock = threading.Lock()
+
+
+def acquire(url):
+    """Get (or open) the broker for a stream URL and take a reference on it"""
+    with _brokers_lock:
+        broker = _brokers.get(url)
+        if broker is not None and not broker.stopped:
+            broker._refs += 1
+            return broker
+
+    # Opening blocks for seconds on an unreachable camera: keep other feeds out of it
+    opened = FrameBroker(url)
+    with _brokers_lock:
+        broker = _brokers.get(url)
+        if broker is None or broker.stopped:
+            broker = _brokers[url] = opened
+            opened = None
+        broker._refs += 1
+        metrics.gauge('stream.active_brokers').set(len(_brokers))
+    if opened is not None:
+        opened.stop()  # another viewer opened this stream first
+    return broker
+
+
+def release(broker):
+    """Drop a reference; the last one closes the capture"""
+    with _brokers_lock:
+        broker._refs -= 1
+        if broker._refs > 0:
+            return
+        if _brokers.get(broker.url) is broker:
+            del _brokers[broker.url]
+        metrics.gauge('stream.active_brokers').set(len(_brokers))
+    broker.stop()
+
+
+def get_broker(url):
+    """Return the running broker for a stream URL without opening one"""
+    broker = _brokers.get(url)
+    return broker if broker is not None and not broker.stopped else None
+
+
+def active_brokers():
+    return {url: {'refs': b._refs, 'seq': b.seq, 'stopped': b.stopped} for url, b in _brokers.items()}
@@ -0,0 +1,351 @@
+"""
+Bin telemetry ingest
+ESP32 bins post fill levels, battery, RSSI and lid cycles every few seconds.
+Samples are appended to BinTelemetry with batched inserts, and each bin's
+"latest state" (capacity, *_full flags, status, last_online) is refreshed with
+one conditional UPDATE per bin per batch. The UPDATE only applies if the sample
+is newer than last_online, so late or out-of-order samples never roll it back.
+
+With TELEMETRY_BUFFERED the endpoint only queues samples; a background thread
+writes them every TELEMETRY_FLUSH_SECONDS or TELEMETRY_BATCH_SIZE samples.
+Samples still queued when a worker dies are lost (acceptable for telemetry).
+
+Old raw samples are folded into BinTelemetryHourly and deleted by
+`python manage.py rollup_bin_telemetry`. BinTelemetry is an ordinary table
+on Postgres as well as SQLite, not partitioned by recorded_at (Django's
+migrations can't manage declarative partitions), so retention deletes old
+rows in id batches selected on the recorded_at index.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Avg, Case, Count, F, Max, Min, Q, Value, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import metrics
+
+LEVEL_FIELDS = ('plastic_level', 'paper_level', 'metal_level', 'glass_level')
+FIELDS = LEVEL_FIELDS + ('battery', 'rssi', 'lid_cycles')
+RANGES = {field: (0, 100) for field in LEVEL_FIELDS + ('battery',)}
+RANGES.update(rssi=(-127, 0), lid_cycles=(0, 2 ** 31 - 1))
+
+# Compact sample: [unix_ts, plastic, paper, metal, glass, battery, rssi, lid_cycles]
+COMPACT_FIELDS = ('t',) + FIELDS
+
+
+class TelemetryError(ValueError):
+    """Malformed telemetry payload"""
+
+
+# ==================== PARSING ====================
+
+def _timestamp(value):
+    if value in (None, ''):
+        return timezone.now()
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise TelemetryError(f"timestamp {value!r} out of range")
+    try:
+        parsed = parse_datetime(str(value))
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise TelemetryError(f"bad timestamp {value!r}")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _sample(values):
+    sample = {'recorded_at': _timestamp(values.get('t', values.get('recorded_at')))}
+    for field in FIELDS:
+        value = values.get(field)
+        if value is None:
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError, OverflowError):
+            raise TelemetryError(f"{field} must be an integer")
+        low, high = RANGES[field]
+        if not low <= value <= high:
+            raise TelemetryError(f"{field}={value} out of range {low}..{high}")
+        sample[field] = value
+    return sample
+
+
+def parse_payload(payload):
+    """
+    Accepts one message or a list of them:
+      {"b": "BIN-001", "s": [[t, plastic, paper, metal, glass, battery, rssi, lid_cycles], ...]}
+      {"bin_id": "BIN-001", "recorded_at": ..., "plastic_level": 40, ...}
+    Returns [(bin_code, sample dict)].
+    """
+    messages = payload if isinstance(payload, list) else [payload]
+    samples = []
+    for message in messages:
+        if not isinstance(message, dict):
+            raise TelemetryError("each message must be an object")
+        code = message.get('b') or message.get('bin_id')
+        if not code or not isinstance(code, str):
+            raise TelemetryError("bin_id (b) is required and must be a string")
+        if 's' in message:
+            if not isinstance(message['s'], list):
+                raise TelemetryError("s must be a list of samples")
+            for row in message['s']:
+                if not isinstance(row, list) or len(row) > len(COMPACT_FIELDS):
+                    raise TelemetryError(f"compact samples are [{', '.join(COMPACT_FIELDS)}]")
+                samples.append((code, _sample(dict(zip(COMPACT_FIELDS, row)))))
+        else:
+            samples.append((code, _sample(message)))
+    return samples
+
+
+# ==================== BIN LOOKUP ====================
+
+_bin_pks = {}
+_bin_pks_at = 0.0
+
+
+def resolve_bins(codes, ttl=60.0):
+    """{bin_id code: pk} for known codes, cached per worker"""
+    global _bin_pks, _bin_pks_at
+    from .models import Bin
+    if time.monotonic() - _bin_pks_at > ttl:
+        _bin_pks, _bin_pks_at = {}, time.monotonic()
+    missing = set(codes) - _bin_pks.keys()
+    if missing:
+        _bin_pks.update(Bin.objects.filter(bin_id__in=missing).values_list('bin_id', 'pk'))
+    return {code: _bin_pks[code] for code in codes if code in _bin_pks}
+
+
+# ==================== WRITER ====================
+
+def update_latest(bin_pk, sample, full_percent):
+    """Refresh the Bin row from its newest sample, unless it already has newer data"""
+    from .models import Bin
+    ts = sample['recorded_at']
+    changes = {'last_online': ts}
+    levels = {field: sample[field] for field in LEVEL_FIELDS if sample.get(field) is not None}
+    if levels:
+        capacity = max(levels.values())
+        changes['capacity_percentage'] = capacity
+        changes['status'] = Case(
+            When(status='maintenance', then=F('status')),
+            default=Value('full' if capacity >= full_percent else 'active'),
+        )
+        for field, level in levels.items():
+            changes[field.replace('_level', '_full')] = level >= full_percent
+    return Bin.objects.filter(pk=bin_pk).filter(Q(last_online__isnull=True) | Q(last_online__lt=ts)).update(**changes)
+
+
+class TelemetryWriter:
+    """Batches samples into bulk inserts; write() is synchronous, submit() queues for the flush thread"""
+
+    def __init__(self, batch_size=500, flush_seconds=1.0, full_percent=90):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.full_percent = full_percent
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def write(self, samples):
+        """Insert [(bin_pk, sample)] and update each bin's latest state; returns rows written"""
+        from .models import Bin, BinTelemetry
+        if not samples:
+            return 0
+        started = time.perf_counter()
+        rows = [BinTelemetry(bin_id=pk, **sample) for pk, sample in samples]
+        latest = {}
+        for pk, sample in samples:
+            if pk not in latest or sample['recorded_at'] > latest[pk]['recorded_at']:
+                latest[pk] = sample
+
+        # One transaction per batch: a commit (fsync) per bin would dominate the cost
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    BinTelemetry.objects.bulk_create(rows, batch_size=self.batch_size)
+            except IntegrityError:
+                # A bin was deleted since its code was cached; drop its samples
+                existing = set(Bin.objects.filter(pk__in=latest).values_list('pk', flat=True))
+                rows = [row for row in rows if row.bin_id in existing]
+                metrics.counter('telemetry.dropped').inc(len(samples) - len(rows))
+                BinTelemetry.objects.bulk_create(rows, batch_size=self.batch_size)
+            for pk, sample in latest.items():
+                update_latest(pk, sample, self.full_percent)
+
+        metrics.counter('telemetry.samples').inc(len(rows))
+        metrics.histogram('telemetry.batch_size').observe(len(rows))
+        metrics.histogram('telemetry.flush_ms').observe((time.perf_counter() - started) * 1000)
+        return len(rows)
+
+    def submit(self, samples):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name='telemetry-writer', daemon=True)
+                self._thread.start()
+            self._buffer.extend(samples)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        try:
+            return self.write(batch)
+        except Exception as e:
+            metrics.counter('telemetry.dropped').inc(len(batch))
+            print(f"⚠️ Telemetry flush failed, {len(batch)} samples dropped: {e}")
+            return 0
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or len(self._buffer) >= self.batch_size,
+                                    timeout=self.flush_seconds)
+                stopped = self._stopped
+            self.flush()
+            connection.close()
+            if stopped:
+                return
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        else:
+            self.flush()
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+
+# ==================== HOURLY ROLLUP ====================
+
+def rollup(retention_hours=None, batch_size=5000):
+    """
+    Fold raw samples older than the retention window (whole hours) into
+    BinTelemetryHourly and delete them. Returns (hourly rows written, raw rows removed).
+
+    Works through the old samples `batch_size` ids at a time: each batch is
+    selected first, then aggregated and deleted by exactly those ids in one
+    transaction, so a late sample landing below the cutoff mid-run is either
+    in a batch or left for the next run, never deleted unaggregated.
+    """
+    from .models import BinTelemetry
+    retention_hours = settings.TELEMETRY_RAW_RETENTION_HOURS if retention_hours is None else retention_hours
+    cutoff = (timezone.now() - timedelta(hours=retention_hours)).replace(minute=0, second=0, microsecond=0)
+    raw = BinTelemetry.objects.filter(recorded_at__lt=cutoff).order_by('id')
+
+    hours = deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(raw.select_for_update().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return hours, deleted
+            hours += _rollup_batch(BinTelemetry.objects.filter(id__in=ids))
+            deleted += BinTelemetry.objects.filter(id__in=ids).delete()[0]
+
+
+def _rollup_batch(raw):
+    """Merge `raw` into BinTelemetryHourly; returns hourly rows written. Call inside a transaction."""
+    from .models import BinTelemetryHourly
+    aggregates = {f'{field}_avg': Avg(field) for field in LEVEL_FIELDS}
+    aggregates.update({f'{field}_max': Max(field) for field in LEVEL_FIELDS})
+    rows = (
+        raw.annotate(hour=TruncHour('recorded_at', tzinfo=dt_timezone.utc))
+        .values('bin_id', 'hour')
+        .annotate(samples=Count('id'), battery_min=Min('battery'), rssi_avg=Avg('rssi'),
+                  lid_cycles_max=Max('lid_cycles'), **aggregates)
+        .order_by()
+    )
+
+    fresh = {}
+    for row in rows:
+        maxes = [row.pop(f'{field}_max') for field in LEVEL_FIELDS]
+        row['max_level'] = max((m for m in maxes if m is not None), default=None)
+        fresh[(row.pop('bin_id'), row.pop('hour'))] = row
+
+    # Late samples for an hour that was already rolled up: merge, weighting by sample count
+    existing = {
+        (h.bin_id, h.hour): h for h in BinTelemetryHourly.objects.filter(
+            bin_id__in={b for b, _ in fresh}, hour__in={hour for _, hour in fresh})
+    }
+    created, updated = [], []
+    for (bin_id, hour), row in fresh.items():
+        current = existing.get((bin_id, hour))
+        if current is None:
+            created.append(BinTelemetryHourly(bin_id=bin_id, hour=hour, **row))
+            continue
+        total = current.samples + row['samples']
+        for field in [f'{f}_avg' for f in LEVEL_FIELDS] + ['rssi_avg']:
+            old, new = getattr(current, field), row[field]
+            if old is None or new is None:
+                setattr(current, field, new if old is None else old)
+            else:
+                setattr(current, field, (old * current.samples + new * row['samples']) / total)
+        for field, pick in (('max_level', max), ('lid_cycles_max', max), ('battery_min', min)):
+            values = [v for v in (getattr(current, field), row[field]) if v is not None]
+            setattr(current, field, pick(values) if values else None)
+        current.samples = total
+        updated.append(current)
+
+    BinTelemetryHourly.objects.bulk_create(created, batch_size=1000)
+    if updated:
+        BinTelemetryHourly.objects.bulk_update(updated, [
+            'samples', 'max_level', 'battery_min', 'rssi_avg', 'lid_cycles_max',
+            *[f'{f}_avg' for f in LEVEL_FIELDS],
+        ], batch_size=1000)
+    return len(created) + len(updated)
+
+
+# ==================== PROCESS-WIDE WRITER ====================
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = TelemetryWriter(
+                    batch_size=settings.TELEMETRY_BATCH_SIZE,
+                    flush_seconds=settings.TELEMETRY_FLUSH_SECONDS,
+                    full_percent=settings.BIN_FULL_PERCENT,
+                )
+    return _writer
+
+
+def ingest(samples):
+    """[(bin_pk, sample)] -> written now, or queued with TELEMETRY_BUFFERED"""
+    writer = get_writer()
+    if settings.TELEMETRY_BUFFERED:
+        writer.submit(samples)
+    else:
+        writer.write(samples)
+    return len(samples)
+
+
+def _after_fork_in_child():
+    # The flush thread and its buffer belong to the parent process
+    global _writer, _writer_lock
+    _writer = None
+    _writer_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from . import metrics
+from .bin_client import (
+    AsyncBinClient, BinClient, BinError, BinUnavailable, CircuitBreaker, mark_offline, mark_online,
+)
+from .models import Bin
+
+
+class FakeESP32:
+    """Minimal ESP32 bin firmware stand-in: GET /<command> -> 200 "OK" over keep-alive HTTP/1.1"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fail_next = 0        # respond 500 to the next N requests
+        self.requests = []
+        self.connections = set()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake.requests.append(self.path)
+                fake.connections.add(self.client_address)
+                time.sleep(fake.delay)
+                status = 200
+                if fake.fail_next:
+                    fake.fail_next -= 1
+                    status = 500
+                body = b'OK' if status == 200 else b'ERR'
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.host = f'127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class BinClientTests(SimpleTestCase):
+    def setUp(self):
+        self.esp = FakeESP32()
+        metrics.reset()
+
+    def tearDown(self):
+        self.esp.stop()
+
+    def test_commands_reuse_one_connection(self):
+        client = BinClient(self.esp.host)
+        for command in ('openlid', 'plastic', 'closelid'):
+            self.assertEqual(client.command(command).text, 'OK')
+        self.assertEqual(self.esp.requests, ['/openlid', '/plastic', '/closelid'])
+        self.assertEqual(len(self.esp.connections), 1)
+        self.assertEqual(metrics.snapshot('bin.command_ms.')['bin.command_ms.openlid']['count'], 1)
+
+    def test_retries_server_errors(self):
+        client = BinClient(self.esp.host, retries=2, backoff=0.01)
+        self.esp.fail_next = 2
+        self.assertEqual(client.command('openlid').status_code, 200)
+        self.assertEqual(len(self.esp.requests), 3)
+        self.assertEqual(metrics.snapshot('bin.retries')['bin.retries']['value'], 2)
+
+    def test_timeout(self):
+        self.esp.delay = 0.3
+        client = BinClient(self.esp.host, retries=0, timeouts={'openlid': (0.5, 0.05)})
+        with self.assertRaises(BinError):
+            client.command('openlid')
+
+    def test_circuit_opens_then_recovers(self):
+        offline, online = [], []
+        client = BinClient(self.esp.host, retries=0, failure_threshold=2, reset_timeout=0.1,
+                           on_offline=offline.append, on_online=online.append)
+        self.esp.fail_next = 2
+        for _ in range(2):
+            with self.assertRaises(BinError):
+                client.command('openlid')
+        self.assertEqual(offline, [client])
+
+        with self.assertRaises(BinUnavailable):
+            client.command('openlid')
+        self.assertEqual(len(self.esp.requests), 2)
+
+        time.sleep(0.15)
+        self.assertEqual(client.command('openlid').status_code, 200)
+        self.assertEqual(online, [client])
+        self.assertEqual(client.breaker.state, 'closed')
+
+    def test_status_checks_leave_the_trial_alone(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.would_allow())
+        time.sleep(0.06)
+        for _ in range(3):
+            self.assertTrue(breaker.would_allow())
+        self.assertEqual(breaker.state, 'open')
+
+        # Once half open, only one caller at a time gets the trial request
+        granted = []
+        threads = [threading.Thread(target=lambda: granted.append(breaker.allow())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(granted), [False] * 7 + [True])
+        self.assertFalse(breaker.would_allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow() and breaker.allow())
+
+    def test_unreachable_bin(self):
+        port = self.esp.server.server_port
+        self.esp.stop()
+        client = BinClient(f'127.0.0.1:{port}', retries=1, backoff=0.01)
+        with self.assertRaises(BinError):
+            client.command('closelid')
+        self.esp = FakeESP32()  # for tearDown
+
+
+class AsyncBinClientTests(SimpleTestCase):
+    def setUp(self):
+        self.esp = FakeESP32(delay=0.2)
+        metrics.reset()
+
+    def tearDown(self):
+        self.esp.stop()
+
+    async def test_concurrent_commands_and_retries(self):
+        client = AsyncBinClient(self.esp.host, retries=1, backoff=0.01)
+        self.esp.fail_next = 1
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.command(c) for c in ('openlid', 'plastic', 'closelid')))
+        elapsed = time.perf_counter() - started
+        await client.close()
+
+        self.assertEqual([r.text for r in responses], ['OK'] * 3)
+        self.assertEqual(len(self.esp.requests), 4)
+        # three 200 ms commands (one retried) in flight together, not one after another
+        self.assertLess(elapsed, 0.55)
+
+    async def test_shares_the_sync_clients_circuit(self):
+        sync_client = BinClient(self.esp.host, retries=0, failure_threshold=1)
+        client = AsyncBinClient(self.esp.host, retries=0, breaker=sync_client.breaker)
+        self.esp.fail_next = 1
+        with self.assertRaises(BinError):
+            await client.command('openlid')
+        with self.assertRaises(BinUnavailable):
+            sync_client.command('openlid')
+        await client.close()
+
+
+class BinStatusHookTests(TestCase):
+    def test_offline_and_back(self):
+        bin_obj = Bin.objects.create(
+            bin_id='BIN-001', name='Gate', location_name='Main gate',
+            latitude=Decimal('33.6'), longitude=Decimal('73.0'), ip_address='10.0.0.9',
+        )
+        client = BinClient('10.0.0.9')
+        mark_offline(client)
+        bin_obj.refresh_from_db()
+        self.assertEqual(bin_obj.status, 'offline')
+        mark_online(client)
+        bin_obj.refresh_from_db()
+        self.assertEqual(bin_obj.status, 'active')
+        self.assertIsNotNone(bin_obj.last_online)
+
+
+class BinStatusHookThreadTests(TransactionTestCase):
+    def test_hooks_release_pool_thread_connections(self):
+        open_after = []
+
+        def pool_thread():
+            mark_offline(BinClient('10.0.0.10'))
+            open_after.append(connection.connection is not None)
+
+        thread = threading.Thread(target=pool_thread)
+        thread.start()
+        thread.join()
+        self.assertEqual(open_after, [False])
@@ -0,0 +1,92 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from . import bin_index
+from .bin_index import BinGridIndex, haversine_km
+from .models import Bin
+
+
+class BinGridIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(1)
+        # Dense city centre plus scattered outliers up to ~100 km away
+        self.points = [(i, 31.52 + rng.gauss(0, 0.05), 74.35 + rng.gauss(0, 0.05)) for i in range(2000)]
+        self.points += [(2000 + i, 31.52 + rng.uniform(-1, 1), 74.35 + rng.uniform(-1, 1)) for i in range(200)]
+        self.index = BinGridIndex(self.points)
+
+    def brute_force(self, lat, lng):
+        return sorted((haversine_km(lat, lng, plat, plng), pk) for pk, plat, plng in self.points)
+
+    def test_matches_brute_force_order(self):
+        rng = random.Random(2)
+        for _ in range(25):
+            lat, lng = 31.52 + rng.uniform(-1.2, 1.2), 74.35 + rng.uniform(-1.2, 1.2)
+            expected = self.brute_force(lat, lng)
+            got = list(self.index.nearest(lat, lng))
+            self.assertEqual([pk for _, pk in got], [pk for _, pk in expected])
+
+    def test_radius_limits_results(self):
+        got = list(self.index.nearest(31.52, 74.35, radius_km=2))
+        expected = [pk for d, pk in self.brute_force(31.52, 74.35) if d <= 2]
+        self.assertEqual([pk for _, pk in got], expected)
+
+    def test_query_far_from_every_bin_is_fast(self):
+        index = BinGridIndex([(1, 31.52, 74.35), (2, 31.48, 74.30)])
+        for lat, lng in ((0, 40), (-60, -100), (89.9, -179.9)):
+            started = time.perf_counter()
+            got = list(index.nearest(lat, lng))
+            self.assertLess(time.perf_counter() - started, 0.1)
+            self.assertEqual(got, sorted((haversine_km(lat, lng, plat, plng), pk)
+                                         for pk, plat, plng in ((1, 31.52, 74.35), (2, 31.48, 74.30))))
+        far = self.brute_force(-60, -100)
+        self.assertEqual([pk for _, pk in self.index.nearest(-60, -100)], [pk for _, pk in far])
+
+    def test_haversine(self):
+        # Lahore -> Islamabad, ~270 km
+        self.assertAlmostEqual(haversine_km(31.5204, 74.3587, 33.6844, 73.0479), 270, delta=5)
+
+
+class NearbyBinsApiTests(TestCase):
+    def setUp(self):
+        bin_index.invalidate()
+        specs = [
+            ('B1', 31.5200, 74.3500, 'active', False),
+            ('B2', 31.5210, 74.3510, 'active', True),    # plastic compartment full
+            ('B3', 31.5300, 74.3600, 'full', False),
+            ('B4', 31.6000, 74.4000, 'active', False),
+        ]
+        for bin_id, lat, lng, status, plastic_full in specs:
+            Bin.objects.create(bin_id=bin_id, name=bin_id, location_name='Lahore', latitude=lat, longitude=lng,
+                               status=status, plastic_full=plastic_full)
+
+    def get(self, **params):
+        return self.client.get(reverse('nearby_bins_api'), params)
+
+    def test_nearest_active_bins(self):
+        data = self.get(lat=31.5201, lng=74.3501, k=10).json()
+        self.assertEqual([b['bin_id'] for b in data['bins']], ['B1', 'B2', 'B4'])
+        self.assertLess(data['bins'][0]['distance_km'], 0.05)
+
+    def test_filters(self):
+        self.assertEqual([b['bin_id'] for b in self.get(lat=31.52, lng=74.35, compartment='plastic').json()['bins']],
+                         ['B1', 'B4'])
+        self.assertEqual(self.get(lat=31.52, lng=74.35, radius=1).json()['count'], 2)
+        self.assertEqual(self.get(lat=31.52, lng=74.35, status='any', k=3).json()['count'], 3)
+        self.assertEqual(self.get(lat=31.52).status_code, 400)
+        self.assertEqual(self.get(lat=31.52, lng=74.35, compartment='lava').status_code, 400)
+
+    def test_saved_bin_refreshes_index(self):
+        self.get(lat=31.52, lng=74.35)
+        Bin.objects.create(bin_id='B5', name='B5', location_name='Lahore', latitude=31.5201, longitude=74.3501)
+        self.assertEqual(self.get(lat=31.5201, lng=74.3501, k=1).json()['bins'][0]['bin_id'], 'B5')
+
+    def test_page_lists_nearest_bins(self):
+        get_user_model().objects.create_user(username='walker', password='pass')
+        self.client.login(username='walker', password='pass')
+        response = self.client.get(reverse('nearby_bins'), {'lat': 31.6, 'lng': 74.4})
+        self.assertEqual(response.context['bins'][0].bin_id, 'B4')
+        self.assertEqual((response.context['total_bins'], response.context['active_bins']), (4, 3))
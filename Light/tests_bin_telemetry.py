@@ -0,0 +1,152 @@
+import json
+import time
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import telemetry
+from .models import Bin, BinTelemetry, BinTelemetryHourly
+
+
+class TelemetryIngestTests(TestCase):
+    def setUp(self):
+        telemetry._bin_pks.clear()
+        self.bin = Bin.objects.create(bin_id='BIN-T1', name='T1', location_name='Lahore',
+                                      latitude=31.52, longitude=74.35)
+        self.now = int(time.time())
+
+    def post(self, payload, content_type='application/json'):
+        body = payload if isinstance(payload, str) else json.dumps(payload)
+        return self.client.post(reverse('hardware_telemetry'), body, content_type=content_type)
+
+    def test_compact_batch_updates_latest_state(self):
+        response = self.post({'b': 'BIN-T1', 's': [
+            [self.now - 20, 10, 20, 30, 40, 90, -60, 100],
+            [self.now, 95, 20, 30, 40, 88, -61, 102],
+            [self.now - 10, 50, 20, 30, 40, 89, -60, 101],  # out of order
+        ]})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['accepted'], 3)
+        self.assertEqual(BinTelemetry.objects.filter(bin=self.bin).count(), 3)
+
+        self.bin.refresh_from_db()
+        self.assertEqual(self.bin.capacity_percentage, 95)
+        self.assertEqual(self.bin.status, 'full')
+        self.assertTrue(self.bin.plastic_full)
+        self.assertFalse(self.bin.glass_full)
+        self.assertEqual(int(self.bin.last_online.timestamp()), self.now)
+
+    def test_older_sample_does_not_roll_back_state(self):
+        self.post({'b': 'BIN-T1', 's': [[self.now, 20, 20, 20, 20]]})
+        self.post({'bin_id': 'BIN-T1', 'recorded_at': self.now - 60, 'plastic_level': 99})
+        self.bin.refresh_from_db()
+        self.assertEqual((self.bin.capacity_percentage, self.bin.status), (20, 'active'))
+        self.assertEqual(BinTelemetry.objects.count(), 2)
+
+    def test_maintenance_status_is_kept(self):
+        Bin.objects.filter(pk=self.bin.pk).update(status='maintenance')
+        self.post({'b': 'BIN-T1', 's': [[self.now, 100, 0, 0, 0]]})
+        self.bin.refresh_from_db()
+        self.assertEqual((self.bin.status, self.bin.capacity_percentage), ('maintenance', 100))
+
+    def test_ndjson_and_errors(self):
+        lines = '\n'.join(json.dumps({'b': 'BIN-T1', 's': [[self.now + i, i]]}) for i in range(3))
+        self.assertEqual(self.post(lines, 'application/x-ndjson').json()['accepted'], 3)
+        self.assertEqual(self.post({'b': 'NOPE', 's': [[self.now, 1]]}).status_code, 404)
+        self.assertEqual(self.post({'b': 'BIN-T1', 's': [[self.now, 101]]}).status_code, 400)
+        self.assertEqual(self.post({'s': [[self.now, 1]]}).status_code, 400)
+        self.assertEqual(self.post('{not json').status_code, 400)
+
+    def test_malformed_payloads_are_rejected(self):
+        for payload in (
+            {'b': 'BIN-T1', 's': [[10 ** 20, 1]]},                       # timestamp overflow
+            {'b': 'BIN-T1', 's': [[-10 ** 15, 1]]},                      # before year 1
+            {'b': 'BIN-T1', 's': [['2024-13-45T00:00:00', 1]]},          # impossible date
+            {'b': 'BIN-T1', 's': [[self.now, float('inf')]]},            # level is not a finite integer
+            {'b': 'BIN-T1', 's': {'t': self.now}},                       # s not a list
+            {'b': 'BIN-T1', 's': 'abc'},
+            {'b': ['BIN-T1'], 's': [[self.now, 1]]},                     # b not a string
+            {'bin_id': {'id': 1}, 'plastic_level': 1},
+        ):
+            response = self.post(payload)
+            self.assertEqual(response.status_code, 400, payload)
+            self.assertIn('error', response.json())
+        self.assertFalse(BinTelemetry.objects.exists())
+
+    def test_query_count_is_per_bin_not_per_sample(self):
+        other = Bin.objects.create(bin_id='BIN-T2', name='T2', location_name='Lahore', latitude=31.5, longitude=74.3)
+        payload = [{'b': code, 's': [[self.now - i, i % 100] for i in range(200)]} for code in ('BIN-T1', 'BIN-T2')]
+        self.post(payload)  # warm the bin code cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.post(payload)
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries]
+        # Multi-row INSERTs (sqlite caps rows per statement), one UPDATE per bin, no lookups
+        self.assertEqual(statements.count('UPDATE'), 2)
+        self.assertEqual(statements.count('SELECT'), 0)
+        self.assertLessEqual(statements.count('INSERT'), 4)
+        self.assertEqual(BinTelemetry.objects.filter(bin=other).count(), 400)
+
+    def test_buffered_writer_flushes(self):
+        writer = telemetry.TelemetryWriter(batch_size=1000, flush_seconds=60)
+        writer.submit([(self.bin.pk, {'recorded_at': timezone.now(), 'plastic_level': 5})] * 3)
+        self.assertEqual(writer.pending, 3)
+        self.assertEqual(writer.flush(), 3)
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(BinTelemetry.objects.count(), 3)
+
+
+class TelemetryRollupTests(TestCase):
+    def setUp(self):
+        self.bin = Bin.objects.create(bin_id='BIN-R1', name='R1', location_name='Lahore',
+                                      latitude=31.52, longitude=74.35)
+        self.hour = (timezone.now() - timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+
+    def add(self, minute, plastic, battery):
+        BinTelemetry.objects.create(bin=self.bin, recorded_at=self.hour + timedelta(minutes=minute),
+                                    plastic_level=plastic, battery=battery, rssi=-70, lid_cycles=minute)
+
+    def test_rollup_downsamples_and_merges_late_samples(self):
+        self.add(0, 10, 80)
+        self.add(30, 30, 75)
+        BinTelemetry.objects.create(bin=self.bin, recorded_at=timezone.now(), plastic_level=1)  # recent: kept raw
+
+        call_command('rollup_bin_telemetry', stdout=StringIO())
+        row = BinTelemetryHourly.objects.get(bin=self.bin, hour=self.hour)
+        self.assertEqual((row.samples, row.plastic_level_avg, row.max_level, row.battery_min, row.lid_cycles_max),
+                         (2, 20.0, 30, 75, 30))
+        self.assertEqual(BinTelemetry.objects.count(), 1)
+
+        self.add(45, 60, 70)
+        self.assertEqual(telemetry.rollup(), (1, 1))
+        row.refresh_from_db()
+        self.assertEqual((row.samples, row.plastic_level_avg, row.max_level, row.battery_min), (3, 100 / 3, 60, 70))
+
+    def test_sample_arriving_mid_rollup_is_not_deleted_unaggregated(self):
+        self.add(0, 10, 80)
+        bulk_create = BinTelemetryHourly.objects.bulk_create
+
+        def late_insert(*args, **kwargs):
+            if not late:
+                late.append(self.add(50, 90, 60))  # the device backfills while the batch is aggregated
+            return bulk_create(*args, **kwargs)
+
+        late = []
+        with mock.patch.object(BinTelemetryHourly.objects, 'bulk_create', side_effect=late_insert):
+            self.assertEqual(telemetry.rollup(batch_size=1), (2, 2))
+        row = BinTelemetryHourly.objects.get(bin=self.bin, hour=self.hour)
+        self.assertEqual((row.samples, row.plastic_level_avg, row.max_level), (2, 50.0, 90))
+        self.assertFalse(BinTelemetry.objects.exists())
+
+    def test_batches_match_a_single_pass(self):
+        for minute in range(0, 60, 10):
+            self.add(minute, minute, 100 - minute)
+        self.assertEqual(telemetry.rollup(batch_size=4), (2, 6))
+        row = BinTelemetryHourly.objects.get(bin=self.bin, hour=self.hour)
+        self.assertEqual((row.samples, row.plastic_level_avg, row.max_level, row.battery_min), (6, 25.0, 50, 50))
@@ -0,0 +1,182 @@
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from . import camera_sessions
+from .camera_sessions import CacheCaptureStore, CameraSessionManager, SessionLimitReached, session_key
+
+
+class FakeCamera:
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class CameraSessionManagerTests(SimpleTestCase):
+    def setUp(self):
+        self.manager = CameraSessionManager(max_sessions=3, idle_timeout=60)
+        self.frame = np.full((48, 64, 3), 200, dtype=np.uint8)
+
+    def test_sessions_are_isolated(self):
+        bin_a = self.manager.get('bin:1')
+        bin_b = self.manager.get('bin:2')
+        self.manager.save_capture(bin_a, self.frame)
+        bin_b.add_qr_codes([{'data': 'QR-B'}])
+
+        self.assertIsNotNone(self.manager.load_capture(bin_a))
+        self.assertIsNone(self.manager.load_capture(bin_b))
+        self.assertEqual(bin_a.qr_detected_codes, [])
+        self.assertIs(self.manager.get('bin:1'), bin_a)
+
+    def test_qr_codes_deduplicated_per_session(self):
+        session = self.manager.get('op')
+        self.assertEqual(len(session.add_qr_codes([{'data': 'X'}, {'data': 'Y'}])), 2)
+        self.assertEqual(session.add_qr_codes([{'data': 'X'}]), [])
+        self.assertEqual(len(session.qr_detected_codes), 2)
+
+    def test_lru_eviction_prefers_sessions_without_stream(self):
+        streaming = self.manager.get('a')
+        camera = FakeCamera()
+        streaming.set_camera(camera)
+        self.manager.get('b')
+        self.manager.get('c')
+        self.manager.get('d')
+
+        self.assertIsNotNone(self.manager.peek('a'))
+        self.assertIsNone(self.manager.peek('b'))
+        self.assertFalse(camera.stopped)
+
+    def test_full_of_live_feeds_refuses_instead_of_evicting(self):
+        cameras = [FakeCamera() for _ in range(3)]
+        for key, camera in zip('abc', cameras):
+            self.manager.get(key).set_camera(camera)
+
+        with self.assertRaises(SessionLimitReached):
+            self.manager.get('d')
+        self.assertIsNone(self.manager.peek('d'))
+        self.assertTrue(all(self.manager.peek(key) for key in 'abc'))
+        self.assertFalse(any(camera.stopped for camera in cameras))
+
+        cameras[1].stopped = True  # a feed ends, its slot can be reused
+        self.assertIsNotNone(self.manager.get('d'))
+        self.assertIsNone(self.manager.peek('b'))
+
+    def test_idle_sessions_are_closed(self):
+        session = self.manager.get('old')
+        camera = FakeCamera()
+        session.set_qr_camera(camera)
+        camera.stopped = True  # stream ended on its own
+        session.last_used = time.monotonic() - 120
+        self.assertEqual(self.manager.evict_idle(), 1)
+        self.assertIsNone(self.manager.peek('old'))
+
+    def test_replacing_camera_stops_previous(self):
+        session = self.manager.get('a')
+        first, second = FakeCamera(), FakeCamera()
+        session.set_camera(first)
+        session.set_camera(second)
+        self.assertTrue(first.stopped)
+        self.assertFalse(second.stopped)
+
+    def test_concurrent_access(self):
+        manager = CameraSessionManager(max_sessions=8, idle_timeout=60)
+
+        def worker(i):
+            for _ in range(50):
+                session = manager.get(f'bin:{i % 12}')
+                session.add_qr_codes([{'data': str(i)}])
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(24)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(len(manager.stats()['sessions']), 8)
+
+    def test_cache_store_shares_capture_between_managers(self):
+        store = CacheCaptureStore(prefix='test-camsession:')
+        worker_a = CameraSessionManager(store=store)
+        worker_b = CameraSessionManager(store=store)
+        worker_a.save_capture(worker_a.get('bin:7'), self.frame)
+
+        frame = worker_b.load_capture(worker_b.get('bin:7'))
+        self.assertEqual(frame.shape, self.frame.shape)
+        worker_b.clear_capture(worker_b.get('bin:7'))
+        self.assertIsNone(store.get('bin:7'))
+
+
+class SessionKeyTests(SimpleTestCase):
+    def test_key_sources(self):
+        factory = RequestFactory()
+        request = factory.get('/livefe/', {'session': 'bin-3'})
+        request.user = User(pk=1, username='ops', is_staff=True)
+        self.assertEqual(session_key(request), 'session:bin-3')
+
+        request = factory.get('/livefe/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        key = session_key(request)
+        self.assertTrue(key.startswith('browser:'))
+        self.assertEqual(session_key(request), key)
+
+    def test_lookup_without_create(self):
+        request = RequestFactory().get('/get_qr_results/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        self.assertIsNone(session_key(request, create=False))
+        self.assertNotIn('camera_session', request.session)
+
+        key = session_key(request)
+        self.assertEqual(session_key(request, create=False), key)
+
+    def test_only_staff_and_devices_name_sessions(self):
+        factory = RequestFactory()
+        request = factory.get('/api/events/', {'session': 'bin-3'})
+        request.user = User(pk=7, username='visitor')
+        self.assertEqual(session_key(request), 'user:7')
+
+        def device(token):
+            request = factory.get('/livefe/', {'session': 'bin-3'}, HTTP_X_CAMERA_TOKEN=token)
+            request.user = AnonymousUser()
+            request.session = SessionStore()
+            return session_key(request)
+
+        with self.settings(CAMERA_SESSION_TOKEN='s3cret'):
+            self.assertTrue(device('wrong').startswith('browser:'))
+            self.assertEqual(device('s3cret'), 'session:bin-3')
+        with self.settings(CAMERA_SESSION_TOKEN=''):
+            self.assertTrue(device('').startswith('browser:'))
+
+
+class CameraSessionViewTests(TestCase):
+    def setUp(self):
+        self.manager = CameraSessionManager(max_sessions=2, idle_timeout=60)
+        patcher = mock.patch.object(camera_sessions, '_manager', self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_read_only_endpoints_create_no_sessions(self):
+        for name in ('get_qr_results', 'is_streaming', 'has_captured_frame', 'clear_qr_results'):
+            response = self.client.get(f'/{name}/')
+            self.assertEqual(response.status_code, 200, name)
+        self.assertEqual(self.manager.stats()['sessions'], [])
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_new_anonymous_session_is_refused_when_feeds_fill_every_slot(self):
+        cameras = [FakeCamera() for _ in range(2)]
+        for key, camera in zip(('user:1', 'user:2'), cameras):
+            self.manager.get(key).set_camera(camera)
+
+        with mock.patch('Light.views.VideoCamera') as camera_cls:
+            response = self.client.get('/livefe/', {'ip': '192.168.1.20:81/stream'})
+
+        self.assertEqual(response.status_code, 503)
+        camera_cls.assert_not_called()
+        self.assertFalse(any(camera.stopped for camera in cameras))
@@ -0,0 +1,103 @@
+import importlib
+from datetime import timedelta
+from io import StringIO
+
+from django.apps import apps
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models.deletion import Collector
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import daily_stats, points
+from .models import UserDailyStats, UserProfile, WasteRecord
+
+
+class DailyStatsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='roller', password='pass')
+        UserProfile.objects.create(user=self.user)
+        now = timezone.now()
+        for days, waste_type, weight in [(0, 'plastic', 0.2), (0, 'metal', None), (1, 'plastic', 0.1),
+                                         (3, 'glass', 0.5), (40, 'paper', None), (40, 'trash', None)]:
+            points.record_disposal(self.user, waste_type, 10, weight_kg=weight,
+                                   disposed_at=now - timedelta(days=days))
+
+    def snapshot(self):
+        return list(UserDailyStats.objects.filter(user=self.user).order_by('date').values(
+            'date', *daily_stats.STAT_FIELDS))
+
+    def test_disposals_maintain_rollup(self):
+        today = UserDailyStats.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual((today.items, today.points, today.plastic_count, today.metal_count), (2, 20, 1, 1))
+        self.assertAlmostEqual(today.weight_kg, 0.2)
+        self.assertEqual(UserDailyStats.objects.filter(user=self.user).count(), 4)
+
+    def test_rebuild_matches_incremental(self):
+        incremental = self.snapshot()
+        UserDailyStats.objects.all().delete()
+        call_command('rebuild_daily_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_migration_backfills_existing_records(self):
+        incremental = self.snapshot()
+        UserDailyStats.objects.all().delete()
+        migration = importlib.import_module('Light.migrations.0017_backfill_userdailystats')
+        migration.backfill(apps, None)
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_deleted_records_leave_the_rollup(self):
+        today = timezone.localdate()
+        self.assertEqual(daily_stats.delete_records(WasteRecord.objects.filter(user=self.user, waste_type='metal')), 1)
+        row = UserDailyStats.objects.get(user=self.user, date=today)
+        self.assertEqual((row.items, row.points, row.metal_count, row.plastic_count), (1, 10, 0, 1))
+
+        daily_stats.delete_records(
+            WasteRecord.objects.filter(user=self.user, disposed_at__date__lt=today - timedelta(days=30)))
+        self.assertFalse(UserDailyStats.objects.filter(user=self.user, date__lt=today - timedelta(days=30)).exists())
+
+    def test_admin_bulk_delete_rebuilds_rollup(self):
+        get_user_model().objects.create_superuser(username='admin', password='pass')
+        self.client.login(username='admin', password='pass')
+        glass = WasteRecord.objects.filter(user=self.user, waste_type='glass')
+        self.client.post(reverse('admin:Light_wasterecord_changelist'), {
+            'action': 'delete_selected', 'post': 'yes',
+            '_selected_action': [str(pk) for pk in glass.values_list('pk', flat=True)],
+        })
+        self.assertFalse(glass.exists())
+        incremental = self.snapshot()
+        daily_stats.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_deletes_stay_bulk(self):
+        # No per-row WasteRecord signals: queryset and cascade deletes stay single DELETEs
+        self.assertTrue(Collector(using='default').can_fast_delete(WasteRecord.objects.all()))
+        self.user.delete()
+        self.assertFalse(UserDailyStats.objects.exists())
+
+    def test_batch_ingest_updates_rollup(self):
+        points.record_disposals([
+            {'user_id': self.user.pk, 'waste_type': 'glass', 'points_earned': 12, 'disposed_at': timezone.now()}
+            for _ in range(3)
+        ])
+        today = UserDailyStats.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual((today.items, today.glass_count), (5, 3))
+
+    def test_history_stats_read_rollup(self):
+        self.client.login(username='roller', password='pass')
+        url = reverse('waste_history')
+        from_date = (timezone.localdate() - timedelta(days=7)).isoformat()
+        stats = self.client.get(url, {'from': from_date}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()['stats']
+        self.assertEqual(stats, {'total_items': 4, 'total_points': 40, 'plastic': 2, 'paper': 0, 'metal': 1, 'glass': 1})
+
+        # Type filters still aggregate the raw records
+        stats = self.client.get(url, {'type': 'paper'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest').json()['stats']
+        self.assertEqual((stats['total_items'], stats['paper']), (1, 1))
+
+    def test_profile_monthly_stats(self):
+        self.client.login(username='roller', password='pass')
+        response = self.client.get(reverse('user_profile'))
+        self.assertEqual(response.context['monthly_stats'], {'total_items': 4, 'total_points': 40})
+        self.assertEqual(WasteRecord.objects.filter(user=self.user).count(), 6)
@@ -0,0 +1,161 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from . import disposal_jobs
+from .disposal_jobs import BinBusy, DisposalRunner
+from .models import UserProfile, WasteRecord
+
+
+class FakeBin:
+    def __init__(self):
+        self.commands = []
+        self.lock = threading.Lock()
+
+    def __call__(self, job, command):
+        with self.lock:
+            self.commands.append((job.bin_ip, command))
+
+
+def wait_done(runner, job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = runner.status(job.id)
+        if status['done']:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"job stuck in {runner.status(job.id)['state']}")
+
+
+class DisposalRunnerTests(TransactionTestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='binuser', password='pass')
+        UserProfile.objects.create(user=self.user, cnic='12345-1234567-1')
+        self.bin = FakeBin()
+        # One worker: sqlite's shared in-memory test database can't take parallel writers
+        self.runner = DisposalRunner(
+            workers=1, place_seconds=0.2, drop_seconds=0.05, bin_command=self.bin,
+            capture=lambda job: np.zeros((8, 8, 3), dtype=np.uint8),
+            classify=lambda frame: ('metal', 97.0),
+        )
+
+    def tearDown(self):
+        self.runner.stop()
+
+    def test_job_walks_every_state(self):
+        job = self.runner.submit(self.user, bin_ip='bin-1')
+        status = wait_done(self.runner, job)
+
+        self.assertEqual(
+            [h['state'] for h in status['history']],
+            ['queued', 'lid_open', 'capturing', 'classifying', 'sorting', 'closed', 'recorded'],
+        )
+        self.assertEqual([c for _, c in self.bin.commands], ['openlid', 'metal', 'closelid'])
+        self.assertEqual(status['disposal_data']['points_earned'], 15)
+        self.assertEqual(UserProfile.objects.get(user=self.user).metal_count, 1)
+        self.assertEqual(WasteRecord.objects.filter(user=self.user).count(), 1)
+
+    def test_waits_do_not_hold_workers(self):
+        jobs = [self.runner.submit(self.user, bin_ip=f'bin-{i}') for i in range(8)]
+        started = time.monotonic()
+        for job in jobs:
+            wait_done(self.runner, job)
+        # 8 bins x 0.25s of waiting on one worker would take >= 2s if waits blocked it
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(WasteRecord.objects.count(), 8)
+
+    def test_one_job_per_bin(self):
+        job = self.runner.submit(self.user, bin_ip='bin-1')
+        with self.assertRaises(BinBusy) as busy:
+            self.runner.submit(self.user, bin_ip='bin-1')
+        self.assertEqual(busy.exception.job_id, job.id)
+        wait_done(self.runner, job)
+        wait_done(self.runner, self.runner.submit(self.user, bin_ip='bin-1'))
+
+    def test_failure_closes_lid(self):
+        def broken(frame):
+            raise RuntimeError('model missing')
+        self.runner.classify = broken
+        status = wait_done(self.runner, self.runner.submit(self.user, bin_ip='bin-1'))
+        self.assertEqual((status['state'], status['error']), ('failed', 'model missing'))
+        self.assertEqual(self.bin.commands[-1], ('bin-1', 'closelid'))
+
+    def test_bookkeeping_errors_fail_the_job_and_free_the_bin(self):
+        class FlakyStore(disposal_jobs.LocalJobStore):
+            def set(self, job_id, snapshot):
+                if snapshot['state'] == 'capturing':
+                    raise ConnectionError('cache down')
+                super().set(job_id, snapshot)
+
+        self.runner.store = FlakyStore()
+        status = wait_done(self.runner, self.runner.submit(self.user, bin_ip='bin-1'))
+        self.assertEqual((status['state'], status['error']), ('failed', 'cache down'))
+        self.assertEqual(self.runner.active_jobs(), [])
+        self.assertEqual(self.bin.commands[-1], ('bin-1', 'closelid'))
+
+        self.runner.store = disposal_jobs.LocalJobStore()
+        status = wait_done(self.runner, self.runner.submit(self.user, bin_ip='bin-1'))  # no BinBusy
+        self.assertEqual(status['state'], 'recorded')
+
+
+    def test_async_bin_commands_do_not_hold_workers(self):
+        sent = []
+
+        async def slow_bin(job, command):
+            await asyncio.sleep(0.1)  # a bin that takes 100 ms to answer
+            sent.append((job.bin_ip, command))
+
+        self.runner.bin_command = slow_bin
+        self.runner.place_seconds = self.runner.drop_seconds = 0
+        jobs = [self.runner.submit(self.user, bin_ip=f'bin-{i}') for i in range(8)]
+        started = time.monotonic()
+        statuses = [wait_done(self.runner, job) for job in jobs]
+        # 8 bins x 3 commands x 0.1s on one worker would take >= 2.4s if commands blocked it
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual({s['state'] for s in statuses}, {'recorded'})
+        self.assertEqual([c for b, c in sent if b == 'bin-0'], ['openlid', 'metal', 'closelid'])
+
+
+class DisposalEndpointTests(TransactionTestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='kiosk', password='pass')
+        UserProfile.objects.create(user=self.user, cnic='12345-1234567-1')
+        self.runner = DisposalRunner(
+            workers=1, place_seconds=0.01, drop_seconds=0.01, bin_command=FakeBin(),
+            capture=lambda job: None,
+        )
+        disposal_jobs._runner = self.runner
+
+    def tearDown(self):
+        disposal_jobs._runner = None
+        self.runner.stop()
+
+    def test_start_returns_job_and_status_reports_progress(self):
+        resp = self.client.post(
+            reverse('start_disposal'),
+            data={'user_id': self.user.id, 'cnic': '12345-1234567-1'},
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 202)
+        data = resp.json()
+        self.assertTrue(data['success'])
+
+        deadline = time.monotonic() + 5
+        while True:
+            status = self.client.get(data['status_url']).json()
+            if status['done'] or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        self.assertEqual(status['status'], 'recorded')
+        self.assertEqual(status['disposal_data']['waste_type'], 'plastic')
+
+    def test_unknown_job(self):
+        resp = self.client.get(reverse('disposal_status'), {'job': 'nope'})
+        self.assertEqual(resp.status_code, 404)
@@ -0,0 +1,239 @@
+import fnmatch
+import json
+import threading
+from collections import deque
+from types import SimpleNamespace
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import events, points as points_ledger
+from .disposal_jobs import DisposalRunner
+from .events import LocalBroker, RedisBroker
+
+
+class FakeRedis:
+    """Local stand-in for a Redis server: the commands RedisBroker uses, shared by every 'worker'"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.lists = {}
+        self.listeners = []
+
+    def incr(self, key):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + 1
+            return self.values[key]
+
+    def rpush(self, key, value):
+        with self.lock:
+            self.lists.setdefault(key, []).append(value.encode())
+
+    def ltrim(self, key, start, end):
+        with self.lock:
+            items = self.lists.get(key, [])
+            self.lists[key] = items[start:] if end == -1 else items[start:end + 1]
+
+    def expire(self, key, seconds):
+        pass
+
+    def lrange(self, key, start, end):
+        with self.lock:
+            items = self.lists.get(key, [])
+            return list(items[start:] if end == -1 else items[start:end + 1])
+
+    def publish(self, channel, payload):
+        with self.lock:
+            listeners = list(self.listeners)
+        for pubsub in listeners:
+            pubsub.deliver(channel, payload)
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.patterns = []
+        self.messages = deque()
+        self.ready = threading.Condition()
+
+    def psubscribe(self, pattern):
+        self.patterns.append(pattern)
+        with self.server.lock:
+            self.server.listeners.append(self)
+
+    def deliver(self, channel, payload):
+        for pattern in self.patterns:
+            if fnmatch.fnmatchcase(channel, pattern):
+                with self.ready:
+                    self.messages.append({'type': 'pmessage', 'pattern': pattern.encode(),
+                                          'channel': channel.encode(), 'data': payload.encode()})
+                    self.ready.notify()
+
+    def get_message(self, timeout=0.0):
+        with self.ready:
+            if not self.messages:
+                self.ready.wait(timeout)
+            return self.messages.popleft() if self.messages else None
+
+    def close(self):
+        with self.server.lock:
+            if self in self.server.listeners:
+                self.server.listeners.remove(self)
+
+
+class LocalBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = LocalBroker(history=3, queue_size=4)
+
+    def test_delivers_only_subscribed_channels(self):
+        sub = self.broker.subscribe(['user:1', 'camera:a'])
+        self.broker.publish('user:1', 'points', {'total_points': 10})
+        self.broker.publish('user:2', 'points', {'total_points': 99})
+        self.broker.publish('camera:a', 'qr', {'qr_codes': []})
+
+        got = [sub.get(timeout=0.1) for _ in range(2)]
+        self.assertEqual([(e.channel, e.type) for e in got], [('user:1', 'points'), ('camera:a', 'qr')])
+        self.assertIsNone(sub.get(timeout=0.01))
+        sub.close()
+        self.broker.publish('user:1', 'points', {})
+        self.assertIsNone(sub.get(timeout=0.01))
+
+    def test_replays_missed_events_from_history(self):
+        first = self.broker.publish('job:x', 'job', {'state': 'queued'})
+        for state in ('lid_open', 'capturing', 'classifying'):
+            self.broker.publish('job:x', 'job', {'state': state})
+
+        sub = self.broker.subscribe(['job:x'], last_event_id=first.id)
+        # History keeps the last 3 events, all newer than `first`
+        self.assertEqual([sub.get(timeout=0.1).data['state'] for _ in range(3)],
+                         ['lid_open', 'capturing', 'classifying'])
+
+    async def test_async_get_is_woken_by_other_threads(self):
+        sub = self.broker.subscribe(['job:z'])
+        threading.Timer(0.05, self.broker.publish, ('job:z', 'job', {'state': 'closed'})).start()
+        self.assertIsNone(await sub.aget(timeout=0.01))
+        event = await sub.aget(timeout=2)
+        self.assertEqual(event.data, {'state': 'closed'})
+
+    def test_slow_subscriber_drops_oldest(self):
+        sub = self.broker.subscribe(['camera:a'])
+        for i in range(6):
+            self.broker.publish('camera:a', 'qr', {'n': i})
+        self.assertEqual([sub.get(timeout=0.1).data['n'] for _ in range(4)], [2, 3, 4, 5])
+        self.assertEqual(sub.dropped, 2)
+
+
+class RedisBrokerTests(SimpleTestCase):
+    def setUp(self):
+        server = FakeRedis()
+        self.worker_a = RedisBroker(server, history=10, poll_seconds=0.05)
+        self.worker_b = RedisBroker(server, history=10, poll_seconds=0.05)
+        for broker in (self.worker_a, self.worker_b):
+            self.assertTrue(broker._ready.wait(2))
+
+    def tearDown(self):
+        self.worker_a.close()
+        self.worker_b.close()
+
+    def test_event_reaches_other_worker(self):
+        sub = self.worker_b.subscribe(['user:5'])
+        self.worker_a.publish('user:5', 'points', {'total_points': 40})
+        event = sub.get(timeout=2)
+        self.assertEqual((event.channel, event.type, event.data), ('user:5', 'points', {'total_points': 40}))
+
+    def test_replay_from_shared_history(self):
+        first = self.worker_a.publish('job:y', 'job', {'state': 'queued'})
+        self.worker_a.publish('job:y', 'job', {'state': 'lid_open'})
+        sub = self.worker_b.subscribe(['job:y'], last_event_id=first.id)
+        self.assertEqual(sub.get(timeout=2).data, {'state': 'lid_open'})
+        self.assertIsNone(sub.get(timeout=0.05))
+
+
+class PublisherTests(SimpleTestCase):
+    def test_disposal_job_progress_is_pushed(self):
+        user = SimpleNamespace(id=4242)
+        sub = events.get_broker().subscribe([events.user_channel(user.id)])
+        runner = DisposalRunner(
+            workers=1, place_seconds=0, drop_seconds=0, bin_command=lambda job, command: None,
+            capture=lambda job: np.zeros((4, 4, 3), dtype=np.uint8),
+            classify=lambda frame: ('glass', 90.0),
+            record=lambda job: {'waste_type': job.waste_type, 'points_earned': 20},
+        )
+        try:
+            runner.submit(user, bin_ip='bin-events')
+            states = []
+            while not states or states[-1] != 'recorded':
+                event = sub.get(timeout=5)
+                self.assertIsNotNone(event, f"stream stalled after {states}")
+                if event.data['state'] not in states:
+                    states.append(event.data['state'])
+        finally:
+            runner.stop()
+            sub.close()
+        self.assertEqual(states, ['queued', 'lid_open', 'capturing', 'classifying', 'sorting', 'closed', 'recorded'])
+
+
+@override_settings(EVENTS_SSE=True, EVENTS_HEARTBEAT_SECONDS=0.05, EVENTS_MAX_STREAM_SECONDS=0.3)
+class EventStreamViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='live', password='pass')
+
+    def read(self, response):
+        body = b''.join(response.streaming_content).decode()
+        parsed = []
+        for block in body.split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':') and ': ' in line)
+            if 'event' in fields:
+                parsed.append((fields['event'], json.loads(fields['data'])))
+        return parsed
+
+    def test_points_update_is_streamed(self):
+        self.client.login(username='live', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            points_ledger.award_points(self.user, 'plastic', 10)
+
+        response = self.client.get(reverse('event_stream'), {'channels': 'user', 'last_event_id': 0})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        received = self.read(response)
+        self.assertIn(('points', {'points': 10, 'total_points': 10, 'level': 1, 'old_level': 1,
+                                  'total_waste_disposed': 1}), received)
+
+    def test_channel_permissions(self):
+        self.assertEqual(self.client.get(reverse('event_stream'), {'channels': 'user'}).status_code, 403)
+        self.client.login(username='live', password='pass')
+        self.assertEqual(self.client.get(reverse('event_stream'), {'channels': 'user:999'}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('event_stream'), {'channels': 'bin:BIN-1'}).status_code, 403)
+
+    def test_camera_channel_follows_session(self):
+        self.client.login(username='live', password='pass')
+        broker = events.get_broker()
+        mine = broker.publish(events.camera_channel(f'user:{self.user.pk}'), 'qr', {'qr_codes': [{'data': 'x'}]})
+        broker.publish(events.camera_channel('user:0'), 'qr', {'qr_codes': [{'data': 'other'}]})
+        received = self.read(self.client.get(reverse('event_stream'), {'channels': 'camera', 'last_event_id': mine.id - 1}))
+        self.assertEqual(received, [('qr', {'qr_codes': [{'data': 'x'}]})])
+
+    async def test_stream_is_async_under_asgi(self):
+        response = await self.async_client.get(reverse('event_stream'), {'channels': 'job:asgi-test'})
+        self.assertTrue(response.is_async)
+        events.get_broker().publish(events.job_channel('asgi-test'), 'job', {'state': 'queued'})
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertIn('event: job\ndata: {"state": "queued"}', body)
+
+
+@override_settings(EVENTS_SSE=False)
+class PollingFallbackTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='poller', password='pass')
+        self.client.login(username='poller', password='pass')
+
+    def test_streams_are_refused_and_dashboard_does_not_poll(self):
+        self.assertEqual(self.client.get(reverse('event_stream'), {'channels': 'user'}).status_code, 503)
+        page = self.client.get(reverse('user_dashboard')).content.decode()
+        self.assertIn('const LIVE_EVENTS = false;', page)
+        self.assertNotIn('setInterval', page)
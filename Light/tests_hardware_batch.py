@@ -0,0 +1,137 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import points as points_ledger
+from .models import Bin, UserProfile, WasteRecord
+
+
+class HardwareBatchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+        UserProfile.objects.create(user=self.alice, cnic='11111-1111111-1', total_points=90)
+        UserProfile.objects.create(user=self.bob, cnic='22222-2222222-2')
+        self.bin = Bin.objects.create(bin_id='BIN-001', name='Gate', location_name='Gate',
+                                      latitude=33.6, longitude=73.0)
+        self.url = reverse('hardware_dispose_batch')
+
+    def post(self, body, content_type='application/json'):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def events(self, n, prefix='e'):
+        users = [self.alice.pk, self.bob.pk]
+        types = ['plastic', 'paper', 'metal', 'glass']
+        return [{'event_id': f'{prefix}{i}', 'user_id': users[i % 2], 'waste_type': types[i % 4]} for i in range(n)]
+
+    def test_batch_aggregates_profile_updates(self):
+        self.post({'bin_id': 'BIN-001', 'events': self.events(2, 'w')})  # creates today's rollup rows
+        with CaptureQueriesContext(connection) as small:
+            self.post({'bin_id': 'BIN-001', 'events': self.events(4, 'a')})
+        with CaptureQueriesContext(connection) as large:
+            response = self.post({'bin_id': 'BIN-001', 'events': self.events(40, 'b')})
+
+        # Query count depends on distinct users and days, not on batch size
+        self.assertEqual(len(small), len(large))
+        data = response.json()
+        self.assertEqual(data['created'], 40)
+        self.assertEqual(WasteRecord.objects.filter(bin=self.bin).count(), 46)
+
+        alice = UserProfile.objects.get(user=self.alice)
+        # alice gets the even events: plastic (10) and metal (15), 23 of them
+        self.assertEqual(alice.total_points, 90 + 12 * 10 + 11 * 15)
+        self.assertEqual((alice.plastic_count, alice.metal_count, alice.total_waste_disposed), (12, 11, 23))
+        self.assertEqual(alice.level, 3)
+        self.assertEqual(data['profiles'][str(self.alice.pk)], {'total_points': alice.total_points, 'level': 3})
+
+    def test_repeated_event_ids_are_skipped(self):
+        events = self.events(3)
+        self.post(events)
+        events.append(dict(events[0]))
+        events.append({'event_id': 'new', 'user_id': self.bob.pk, 'waste_type': 'glass'})
+        events.append({'event_id': 'new', 'user_id': self.bob.pk, 'waste_type': 'glass'})
+        data = self.post(events).json()
+
+        self.assertEqual([r['status'] for r in data['results']],
+                         ['duplicate'] * 4 + ['created', 'duplicate'])
+        self.assertEqual(WasteRecord.objects.count(), 4)
+        self.assertEqual(UserProfile.objects.get(user=self.bob).total_points, 8 + 12)
+
+    def test_ndjson_keeps_event_time(self):
+        body = '\n'.join(json.dumps(e) for e in [
+            {'event_id': 'n1', 'user_id': self.bob.pk, 'waste_type': 'metal', 'bin_id': 'BIN-001',
+             'disposed_at': '2026-01-02T03:04:05Z'},
+            {'event_id': 'n2', 'user_id': self.bob.pk, 'waste_type': 'metal', 'timestamp': 1767225600},
+        ])
+        data = self.post(body, 'application/x-ndjson').json()
+        self.assertEqual(data['created'], 2)
+        times = dict(WasteRecord.objects.values_list('event_id', 'disposed_at'))
+        self.assertEqual(times['n1'], datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc))
+        self.assertEqual(times['n2'], datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_bad_events_reported_individually(self):
+        data = self.post([
+            {'event_id': 'x1', 'user_id': 9999, 'waste_type': 'paper'},
+            {'event_id': 'x2', 'user_id': self.bob.pk, 'bin_id': 'NOPE'},
+            {'event_id': 'x3', 'user_id': self.bob.pk, 'waste_type': 'paper', 'disposed_at': 'yesterday'},
+            {'event_id': 'x4', 'user_id': self.bob.pk, 'waste_type': 'paper'},
+        ]).json()
+        self.assertEqual([r['status'] for r in data['results']], ['error', 'error', 'error', 'created'])
+        self.assertEqual(data['results'][0]['error'], 'user not found')
+        self.assertEqual(WasteRecord.objects.get().event_id, 'x4')
+
+    def test_malformed_events_do_not_fail_the_batch(self):
+        bob = self.bob.pk
+        body = json.dumps([
+            'not an event',
+            {'event_id': 'm1', 'user_id': bob, 'bin_id': ['BIN-001']},
+            {'event_id': 'm2', 'user_id': bob, 'bin_id': {'id': 1}},
+            {'event_id': 'm3', 'user_id': bob, 'waste_type': 'paper', 'disposed_at': 10 ** 20},
+            {'event_id': 'm4', 'user_id': bob, 'waste_type': 'paper', 'disposed_at': -10 ** 15},
+            {'event_id': 'm5', 'user_id': bob, 'waste_type': 7},
+            {'event_id': 'm6', 'user_id': 1e400, 'waste_type': 'paper'},
+            {'event_id': 'm7', 'user_id': bob, 'waste_type': 'paper', 'points': 1e400},
+            {'event_id': 'ok', 'user_id': bob, 'waste_type': 'paper', 'bin_id': 'BIN-001'},
+        ]).replace('Infinity', '1e400')
+        response = self.post(body)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], ['error'] * 8 + ['created'])
+        self.assertEqual(results[0]['error'], 'event must be an object')
+        self.assertEqual(WasteRecord.objects.get().event_id, 'ok')
+
+    def test_repeated_conflicts_are_reported_per_event(self):
+        real = points_ledger.record_disposals
+
+        def racing(events):
+            # Two whole-batch attempts lose the race; then x2 was committed elsewhere and x3 keeps failing
+            if len(events) > 1 or events[0]['event_id'] == 'x3':
+                if events[0]['event_id'] == 'x1' and len(events) > 1:
+                    WasteRecord.objects.get_or_create(event_id='x2', defaults={'user': self.bob, 'waste_type': 'paper'})
+                raise IntegrityError('UNIQUE constraint failed: Light_wasterecord.event_id')
+            return real(events)
+
+        events = [{'event_id': f'x{i}', 'user_id': self.bob.pk, 'waste_type': 'paper'} for i in (1, 2, 3)]
+        with mock.patch.object(points_ledger, 'record_disposals', side_effect=racing) as record:
+            response = self.post(events)
+        self.assertEqual(record.call_count, 5)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'duplicate', 'error'])
+        self.assertEqual((data['created'], data['duplicates'], data['errors']), (1, 1, 1))
+        self.assertEqual(data['profiles'][str(self.bob.pk)]['total_points'], 8)
+
+    def test_malformed_body(self):
+        self.assertEqual(self.post('{not json').status_code, 400)
+        self.assertEqual(self.post({'events': 'nope'}).status_code, 400)
+        with self.settings(HARDWARE_BATCH_MAX_EVENTS=2):
+            self.assertEqual(self.post(self.events(3)).status_code, 413)
@@ -0,0 +1,128 @@
+import json
+from datetime import timedelta
+from hashlib import sha256
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics
+from .idempotency import idempotent
+from .models import IdempotencyKey, UserProfile, WasteRecord
+
+
+class DisposalIdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='retry')
+        UserProfile.objects.create(user=self.user, cnic='12345-1234567-1')
+
+    def dispose(self, key, waste_type='metal', **extra):
+        body = json.dumps({'user_id': self.user.pk, 'waste_type': waste_type})
+        return self.client.post(reverse('hardware_dispose'), body, content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key, **extra)
+
+    def test_retry_replays_first_response(self):
+        replays = metrics.counter('idempotency.replays.hardware_dispose')
+        before = replays.value
+        first = self.dispose('k1')
+        second = self.dispose('k1')
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(WasteRecord.objects.count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).total_points, 15)
+        self.assertEqual(replays.value, before + 1)
+
+        self.dispose('k2')
+        self.assertEqual(WasteRecord.objects.count(), 2)
+
+    def test_body_key_on_mobile_disposal(self):
+        body = json.dumps({'user_id': self.user.pk, 'waste_type': 'glass', 'idempotency_key': 'm1'})
+        responses = [self.client.post(reverse('qr_disposal'), body, content_type='application/json').json()
+                     for _ in range(3)]
+        self.assertEqual(responses[0], responses[2])
+        self.assertEqual(UserProfile.objects.get(user=self.user).total_points, responses[0]['points_earned'])
+        self.assertEqual(WasteRecord.objects.count(), 1)
+
+    def test_key_reused_for_different_request(self):
+        self.dispose('k1')
+        self.assertEqual(self.dispose('k1', waste_type='paper').status_code, 422)
+        self.assertEqual(WasteRecord.objects.count(), 1)
+
+    def test_in_progress_and_expired_claims(self):
+        row = IdempotencyKey.objects.create(scope='hardware_dispose', key='k1', request_hash='x')
+        response = self.dispose('k1')
+        self.assertEqual(response.status_code, 422)  # different body hash
+
+        body = json.dumps({'user_id': self.user.pk, 'waste_type': 'metal'}).encode()
+        row.request_hash = sha256(body).hexdigest()
+        row.save()
+        response = self.dispose('k1')
+        self.assertEqual((response.status_code, response['Retry-After']), (409, '1'))
+
+        # The claim of a crashed worker is released after IDEMPOTENCY_LOCK_SECONDS
+        IdempotencyKey.objects.filter(pk=row.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self.dispose('k1').status_code, 200)
+        self.assertEqual(WasteRecord.objects.count(), 1)
+
+    def test_purge_command(self):
+        self.dispose('old')
+        self.dispose('new')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class IdempotentDecoratorTests(TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.status = 200
+
+        @idempotent('test')
+        def view(request):
+            self.calls += 1
+            return JsonResponse({'call': self.calls}, status=self.status)
+
+        self.view = view
+        self.factory = RequestFactory()
+
+    def post(self, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.view(self.factory.post('/x/', {'a': '1'}, **headers))
+
+    def test_failures_are_not_stored(self):
+        self.status = 503
+        self.post('k')
+        self.status = 200
+        self.assertEqual(json.loads(self.post('k').content), {'call': 2})
+        self.assertEqual(json.loads(self.post('k').content), {'call': 2})
+
+    def test_keys_are_per_user(self):
+        users = [get_user_model().objects.create_user(username=name) for name in ('alice', 'bob')]
+        responses = []
+        for user in users + users:
+            request = self.factory.post('/x/', {'a': '1'}, HTTP_IDEMPOTENCY_KEY='shared')
+            request.user = user
+            responses.append(json.loads(self.view(request).content))
+        self.assertEqual(responses, [{'call': 1}, {'call': 2}, {'call': 1}, {'call': 2}])
+
+    def test_uploaded_files_are_part_of_the_request(self):
+        def upload(content):
+            image = SimpleUploadedFile('frame.jpg', content, content_type='image/jpeg')
+            return self.view(self.factory.post('/x/', {'a': '1', 'image': image}, HTTP_IDEMPOTENCY_KEY='img'))
+
+        self.assertEqual(upload(b'first frame').status_code, 200)
+        self.assertEqual(upload(b'first frame')['Idempotent-Replayed'], 'true')
+        self.assertEqual(upload(b'other frame').status_code, 422)
+        self.assertEqual(self.calls, 1)
+
+    def test_requests_without_key_always_run(self):
+        self.post()
+        self.post()
+        self.assertEqual(self.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
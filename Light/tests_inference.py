@@ -0,0 +1,93 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from .inference import InferenceEngine
+
+
+class RecordingModel:
+    """Fake predictor: returns the per-image mean as a single 'probability'"""
+
+    def __init__(self, delay=0.0):
+        self.batch_sizes = []
+        self.delay = delay
+
+    def __call__(self, batch):
+        self.batch_sizes.append(len(batch))
+        time.sleep(self.delay)
+        return batch.reshape(len(batch), -1).mean(axis=1, keepdims=True)
+
+
+class InferenceEngineTests(SimpleTestCase):
+    def make_engine(self, model, **kwargs):
+        engine = InferenceEngine(model, name='test_inference', **kwargs)
+        self.addCleanup(engine.stop)
+        return engine
+
+    def test_single_image_round_trip(self):
+        engine = self.make_engine(RecordingModel(), max_batch_size=4, max_wait_ms=1)
+        result = engine.predict(np.full((8, 8, 3), 3.0), timeout=5)
+        self.assertEqual(result.shape, (1, 1))
+        self.assertAlmostEqual(float(result[0][0]), 3.0)
+
+    def test_concurrent_requests_are_coalesced(self):
+        model = RecordingModel(delay=0.02)
+        engine = self.make_engine(model, max_batch_size=16, max_wait_ms=50)
+        results = {}
+
+        def worker(i):
+            results[i] = engine.predict(np.full((1, 8, 8, 3), float(i)), timeout=5)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Each caller gets its own row back
+        for i in range(12):
+            self.assertAlmostEqual(float(results[i][0][0]), float(i))
+        self.assertEqual(sum(model.batch_sizes), 12)
+        self.assertLess(len(model.batch_sizes), 12)
+        self.assertLessEqual(max(model.batch_sizes), 16)
+
+    def test_queued_request_owns_its_pixels(self):
+        engine = self.make_engine(RecordingModel(delay=0.1), max_batch_size=1, max_wait_ms=1)
+        busy = engine.submit(np.zeros((8, 8, 3)))
+        buffer = np.full((1, 8, 8, 3), 5.0, dtype=np.float32)  # like preprocess()'s reused buffer
+        queued = engine.submit(buffer)
+        buffer.fill(9.0)  # the caller timed out and classified the next frame
+        busy.result(timeout=5)
+        self.assertAlmostEqual(float(queued.result(timeout=5)[0][0]), 5.0)
+
+    def test_batch_size_is_capped(self):
+        model = RecordingModel()
+        engine = self.make_engine(model, max_batch_size=2, max_wait_ms=20)
+        futures = [engine.submit(np.zeros((8, 8, 3))) for _ in range(5)]
+        for f in futures:
+            f.result(timeout=5)
+        self.assertTrue(all(size <= 2 for size in model.batch_sizes))
+
+    def test_predict_errors_propagate_to_callers(self):
+        def broken(batch):
+            raise RuntimeError('model exploded')
+
+        engine = self.make_engine(broken, max_batch_size=4, max_wait_ms=1)
+        with self.assertRaises(RuntimeError):
+            engine.predict(np.zeros((8, 8, 3)), timeout=5)
+
+    def test_rejects_bad_shapes(self):
+        engine = self.make_engine(RecordingModel())
+        with self.assertRaises(ValueError):
+            engine.submit(np.zeros((8, 8)))
+
+    def test_metrics_are_recorded(self):
+        engine = self.make_engine(RecordingModel(), max_batch_size=4, max_wait_ms=1)
+        engine.predict(np.zeros((2, 8, 8, 3)), timeout=5)
+        stats = engine.stats()
+        self.assertIn('test_inference.batch_size', stats)
+        self.assertIn('test_inference.latency_ms', stats)
+        self.assertIn('test_inference.queue_depth', stats)
+        self.assertGreaterEqual(stats['test_inference.images']['value'], 2)
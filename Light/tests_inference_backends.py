@@ -0,0 +1,110 @@
+import importlib.util
+import io
+import tempfile
+import unittest
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from .inference_backends import artifact_path, create_backend
+
+HAS_TENSORFLOW = importlib.util.find_spec('tensorflow') is not None
+
+
+class ArtifactPathTests(SimpleTestCase):
+    def test_artifact_path_includes_quantization(self):
+        self.assertEqual(
+            artifact_path('models/waste.keras', 'tflite', 'float16'),
+            Path('models/waste.float16.tflite'),
+        )
+        self.assertEqual(artifact_path('waste.keras', 'onnx'), Path('waste.onnx'))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_backend('caffe', 'model.bin')
+
+
+class ConvertModelOptionTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.source = self.tmp / 'tiny.keras'
+        self.source.touch()
+
+    def convert(self, **options):
+        call_command('convert_model', source=str(self.source), format='tflite',
+                     stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_int8_refuses_to_calibrate_without_images(self):
+        with self.assertRaisesMessage(CommandError, '--calibration-dir'):
+            self.convert(quantize='int8', skip_parity=True)
+
+    def test_parity_check_needs_real_images(self):
+        with self.assertRaisesMessage(CommandError, '--calibration-dir'):
+            self.convert(quantize='float16')
+        with self.assertRaisesMessage(CommandError, 'No readable images'):
+            self.convert(quantize='int8', calibration_dir=str(self.tmp))
+
+
+@unittest.skipUnless(HAS_TENSORFLOW, 'tensorflow not installed')
+class ConvertModelTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import keras
+
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.source = Path(cls.tmp.name) / 'tiny.keras'
+        model = keras.Sequential([
+            keras.Input((224, 224, 3)),
+            keras.layers.Rescaling(1 / 255.0),
+            keras.layers.Conv2D(4, 3, strides=8, activation='relu'),
+            keras.layers.GlobalAveragePooling2D(),
+            keras.layers.Dense(6, activation='softmax'),
+        ])
+        model.save(cls.source)
+
+        cls.images = Path(cls.tmp.name) / 'bins'
+        cls.images.mkdir()
+        rng = np.random.default_rng(0)
+        for i in range(8):
+            img = np.full((120, 160, 3), rng.integers(0, 255, 3), np.uint8)
+            cv2.rectangle(img, (20 + 5 * i, 30), (100, 90 + i), (255, 255, 255), -1)
+            cv2.imwrite(str(cls.images / f'{i}.jpg'), img)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def test_float16_tflite_matches_keras(self):
+        out = io.StringIO()
+        call_command(
+            'convert_model', source=str(self.source), format='tflite',
+            quantize='float16', calibration_dir=str(self.images), samples=8, min_agreement=0.9, stdout=out,
+        )
+        self.assertIn('Parity', out.getvalue())
+
+        artifact = artifact_path(self.source, 'tflite', 'float16')
+        keras_backend = create_backend('keras', self.source)
+        tflite_backend = create_backend('tflite', artifact, num_threads=1)
+
+        batch = np.random.default_rng(1).uniform(0, 255, (3, 224, 224, 3)).astype(np.float32)
+        expected = keras_backend.predict(batch)
+        actual = tflite_backend.predict(batch)
+        self.assertEqual(actual.shape, (3, 6))
+        np.testing.assert_allclose(actual, expected, atol=1e-2)
+
+    def test_int8_tflite_converts(self):
+        output = Path(self.tmp.name) / 'tiny.int8.tflite'
+        call_command(
+            'convert_model', source=str(self.source), format='tflite', quantize='int8',
+            output=str(output), calibration_dir=str(self.images), samples=8, skip_parity=True,
+            stdout=io.StringIO(),
+        )
+        probs = create_backend('tflite', output).predict(np.zeros((2, 224, 224, 3), np.float32))
+        self.assertEqual(probs.shape, (2, 6))
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import metrics
+
+
+class MetricsViewTests(TestCase):
+    def setUp(self):
+        metrics.counter('test.requests').inc()
+        self.url = reverse('metrics')
+
+    def test_anonymous_and_regular_users_are_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        get_user_model().objects.create_user(username='user', password='pass')
+        self.client.login(username='user', password='pass')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff_can_read(self):
+        get_user_model().objects.create_user(username='ops', password='pass', is_staff=True)
+        self.client.login(username='ops', password='pass')
+        response = self.client.get(self.url, {'prefix': 'test.'})
+        self.assertEqual(response.json()['metrics']['test.requests']['type'], 'counter')
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_token(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_empty_token_is_not_a_password(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import model_registry
+
+
+class FakeModel:
+    def predict(self, batch):
+        probs = np.zeros((len(batch), len(model_registry.CLASS_LABELS)), dtype=np.float32)
+        probs[:, 4] = 1.0
+        return probs
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        model_registry.reset()
+        self.addCleanup(model_registry.reset)
+
+    def test_model_is_not_loaded_until_first_use(self):
+        with mock.patch.object(model_registry, 'load_model', return_value=FakeModel()) as loader:
+            model_registry.get_engine()
+            self.assertFalse(model_registry.is_loaded())
+            loader.assert_not_called()
+
+            probs = model_registry.classify(np.zeros((1, 224, 224, 3)), timeout=5)
+            self.assertEqual(int(np.argmax(probs)), 4)
+            self.assertTrue(model_registry.is_loaded())
+            loader.assert_called_once()
+
+    def test_concurrent_first_use_loads_once(self):
+        with mock.patch.object(model_registry, 'load_model', return_value=FakeModel()) as loader:
+            threads = [threading.Thread(target=model_registry.get_model) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            loader.assert_called_once()
+
+    def test_fork_child_gets_fresh_engine(self):
+        with mock.patch.object(model_registry, 'load_model', return_value=FakeModel()):
+            model_registry.warm_up()
+            parent_engine = model_registry.get_engine()
+            model_registry._after_fork_in_child()
+            self.assertIsNot(model_registry.get_engine(), parent_engine)
+            self.assertTrue(model_registry.is_loaded())
+
+    def test_preload_reads_the_file_but_builds_nothing_before_fork(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'model.tflite'
+            path.write_bytes(b'flatbuffer')
+            with self.settings(MODEL_PATH=path, INFERENCE_BACKEND='tflite'), \
+                    mock.patch.object(model_registry, 'create_backend', return_value=FakeModel()) as create:
+                model_registry.preload()
+                create.assert_not_called()
+                self.assertFalse(model_registry.is_loaded())
+
+                path.unlink()  # the worker builds from the bytes read in the master
+                model_registry.warm_up()
+                self.assertTrue(model_registry.is_loaded())
+                self.assertEqual(create.call_args.kwargs['model_content'], b'flatbuffer')
+
+    def test_url_import_does_not_load_tensorflow(self):
+        code = (
+            "import os, sys;"
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Traffic.settings');"
+            "import django; django.setup(); import Light.urls;"
+            "print('tensorflow' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], 'False')
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import points, qr_auth_cache
+from .models import UserProfile, WasteRecord
+from .qr_disposal_api import authenticate_user_from_qr
+
+
+class AwardPointsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='ledger', password='pass')
+        UserProfile.objects.create(user=self.user, cnic='12345-1234567-1', total_points=95)
+
+    def test_single_update_recomputes_level(self):
+        with CaptureQueriesContext(connection) as ctx:
+            award = points.award_points(self.user, 'plastic', 10)
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['UPDATE', 'SELECT'])  # no read before the write
+        self.assertEqual((award.total_points, award.old_level, award.level), (105, 1, 2))
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.total_points, profile.level, profile.plastic_count, profile.total_waste_disposed),
+                         (105, 2, 1, 1))
+
+    def test_level_expression_matches_thresholds(self):
+        profile = UserProfile.objects.get(user=self.user)
+        for total in (0, 99, 100, 249, 250, 499, 500, 999, 1000, 5000):
+            UserProfile.objects.filter(pk=profile.pk).update(total_points=total - 1)
+            award = points.award_points(self.user, 'glass', 1)
+            self.assertEqual(award.level, points.level_for_points(total), total)
+
+    def test_counter_mapping(self):
+        points.award_points(self.user, 'cardboard', 5)
+        points.award_points(self.user, 'trash', 2)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.paper_count, profile.total_waste_disposed, profile.total_points), (1, 2, 102))
+
+    def test_missing_profile_is_created(self):
+        other = get_user_model().objects.create_user(username='noprofile')
+        award = points.award_points(other, 'metal', 15)
+        self.assertEqual(award.total_points, 15)
+        self.assertEqual(UserProfile.objects.get(user=other).metal_count, 1)
+
+    def test_award_invalidates_qr_cache(self):
+        qr_auth_cache.get_cache().clear()
+        authenticate_user_from_qr('12345-1234567-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            points.record_disposal(self.user, 'paper', 5)
+        self.assertEqual(authenticate_user_from_qr('12345-1234567-1')['total_points'], 100)
+        self.assertEqual(WasteRecord.objects.filter(user=self.user).count(), 1)
+
+
+class ConcurrentDisposalTests(TransactionTestCase):
+    DISPOSALS = 200
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='busy', password='pass')
+        UserProfile.objects.create(user=self.user)
+
+    def test_parallel_disposals_lose_no_points(self):
+        waste_types = ['plastic', 'paper', 'metal', 'glass']
+
+        def dispose(i):
+            try:
+                points.record_disposal(self.user, waste_types[i % 4], 10)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            list(pool.map(dispose, range(self.DISPOSALS)))
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.total_points, 10 * self.DISPOSALS)
+        self.assertEqual(profile.total_waste_disposed, self.DISPOSALS)
+        self.assertEqual(profile.plastic_count + profile.paper_count + profile.metal_count + profile.glass_count,
+                         self.DISPOSALS)
+        self.assertEqual(profile.level, 5)
+        self.assertEqual(WasteRecord.objects.filter(user=self.user).count(), self.DISPOSALS)
@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from .preprocessing import batch_buffer, decode_image, preprocess, preprocess_batch
+
+
+def encode(img, ext='.jpg'):
+    ok, buf = cv2.imencode(ext, img)
+    assert ok
+    return buf.tobytes()
+
+
+class PreprocessingTests(SimpleTestCase):
+    def setUp(self):
+        # Pure blue in BGR
+        self.blue = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.blue[..., 0] = 255
+
+    def test_output_is_rgb_float32_unscaled(self):
+        out = preprocess_batch([self.blue])
+        self.assertEqual(out.shape, (1, 224, 224, 3))
+        self.assertEqual(out.dtype, np.float32)
+        # Blue ends up in the last (RGB) channel, values stay in [0, 255]
+        self.assertAlmostEqual(float(out[0, ..., 2].mean()), 255.0)
+        self.assertAlmostEqual(float(out[0, ..., 0].mean()), 0.0)
+
+    def test_mixed_frames_and_encoded_bytes(self):
+        png = encode(self.blue, '.png')
+        out = preprocess_batch([self.blue, png, SimpleUploadedFile('x.png', png)])
+        self.assertEqual(out.shape, (3, 224, 224, 3))
+        np.testing.assert_allclose(out[0], out[1])
+        np.testing.assert_allclose(out[1], out[2])
+
+    def test_writes_into_preallocated_buffer(self):
+        buffer = np.zeros((4, 224, 224, 3), dtype=np.float32)
+        out = preprocess_batch([self.blue, self.blue], out=buffer)
+        self.assertEqual(out.shape[0], 2)
+        self.assertTrue(np.shares_memory(out, buffer))
+
+    def test_thread_buffer_is_reused(self):
+        first = preprocess(self.blue)
+        second = preprocess(self.blue)
+        self.assertTrue(np.shares_memory(first, second))
+        self.assertTrue(np.shares_memory(batch_buffer(1), second))
+
+    def test_large_jpeg_uses_reduced_decode(self):
+        big = np.zeros((1800, 2400, 3), dtype=np.uint8)
+        frame = decode_image(encode(big))
+        # 1/8 scale would be 225 px on the short side, still >= 224
+        self.assertEqual(frame.shape[:2], (225, 300))
+
+    def test_upload_stays_readable_after_decode(self):
+        upload = SimpleUploadedFile('x.jpg', encode(self.blue))
+        decode_image(upload)
+        self.assertEqual(upload.read(2), b'\xff\xd8')
+
+    def test_invalid_bytes(self):
+        with self.assertRaises(ValueError):
+            decode_image(b'not an image')
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import qr_auth_cache
+from .models import UserProfile
+from .qr_auth_cache import QRAuthCache
+from .qr_disposal_api import authenticate_user_from_qr
+
+
+class QRAuthLookupTests(TestCase):
+    def setUp(self):
+        qr_auth_cache._cache = None
+        self.addCleanup(setattr, qr_auth_cache, '_cache', None)
+        self.user = get_user_model().objects.create_user(username='kiosk', password='secret')
+        self.profile = UserProfile.objects.create(user=self.user, cnic='12345-1234567-1', total_points=40)
+
+    def test_repeated_scans_hit_no_database(self):
+        with self.assertNumQueries(1):
+            first = authenticate_user_from_qr('CNIC:12345-1234567-1')
+        with self.assertNumQueries(0):
+            second = authenticate_user_from_qr('CNIC:12345-1234567-1')
+        self.assertEqual(first, second)
+        self.assertEqual(second['total_points'], 40)
+
+    def test_profile_change_invalidates(self):
+        authenticate_user_from_qr('12345-1234567-1')
+        self.profile.total_points = 90
+        self.profile.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(authenticate_user_from_qr('12345-1234567-1')['total_points'], 90)
+
+    def test_password_change_invalidates_pass_codes(self):
+        payload = 'CNIC:12345-1234567-1|PASS:secret'
+        self.assertIsNotNone(authenticate_user_from_qr(payload))
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertIsNone(authenticate_user_from_qr(payload))
+
+    def test_unknown_cnic_not_cached(self):
+        self.assertIsNone(authenticate_user_from_qr('99999-9999999-9'))
+        UserProfile.objects.filter(pk=self.profile.pk).update(cnic='99999-9999999-9')
+        self.assertIsNotNone(authenticate_user_from_qr('99999-9999999-9'))
+
+    @override_settings(QR_AUTH_CACHE_BACKEND='default')
+    def test_shared_backend_hits_hit_no_database(self):
+        caches['default'].clear()
+        qr_auth_cache._cache = None  # built by setUp's saves without the backend
+        authenticate_user_from_qr('CNIC:12345-1234567-1')
+        qr_auth_cache._cache = None  # another worker
+        with self.assertNumQueries(0):
+            self.assertEqual(authenticate_user_from_qr('CNIC:12345-1234567-1')['total_points'], 40)
+
+
+class QRAuthCacheTests(SimpleTestCase):
+    user_data = {'user_id': 1, 'username': 'a', 'total_points': 5}
+
+    def test_lru_bound_and_ttl(self):
+        cache = QRAuthCache(max_entries=2, ttl=60)
+        for payload in ('a', 'b', 'c'):
+            cache.set(payload, dict(self.user_data))
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+        expired = QRAuthCache(ttl=-1)
+        expired.set('a', dict(self.user_data))
+        self.assertIsNone(expired.get('a'))
+
+    def test_racing_invalidation_skips_store(self):
+        cache = QRAuthCache()
+        started = cache.started()
+        cache.invalidate_user(1)  # profile saved while we were querying
+        cache.set('a', dict(self.user_data), started=started)
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_backend_invalidation_reaches_other_workers(self):
+        backend = caches['default']
+        backend.clear()
+        worker_a = QRAuthCache(backend=backend)
+        worker_b = QRAuthCache(backend=backend)
+        worker_a.set('card', dict(self.user_data))
+        self.assertIsNotNone(worker_b.get('card'))
+
+        worker_a.invalidate_user(1)
+        self.assertIsNone(worker_b.get('card'))
+
+    def test_shared_backend_race_checks_only_that_users_generation(self):
+        backend = caches['default']
+        backend.clear()
+        worker_a = QRAuthCache(backend=backend)
+        worker_b = QRAuthCache(backend=backend)
+        started = worker_b.started()
+        worker_a.invalidate_user(2)  # someone else's save doesn't spoil this lookup
+        worker_a.invalidate_user(1)  # lands while worker B is querying the database
+        worker_b.set('card', dict(self.user_data), started=started)
+        self.assertIsNone(worker_a.get('card'))
+
+        worker_b.set('other', dict(self.user_data, user_id=3), started=started)
+        self.assertIsNotNone(worker_a.get('other'))
+        # One key per invalidated user, nothing global written on every save
+        self.assertEqual(sorted(k for k in ('qrauth:gen:1', 'qrauth:gen:2', 'qrauth:epoch') if backend.has_key(k)),
+                         ['qrauth:gen:1', 'qrauth:gen:2'])
@@ -0,0 +1,58 @@
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from .qr_pipeline import QRScanner, decode_gray, scan_image
+
+
+def qr_scene(text='12345-1234567-1', size=(1200, 1600), at=(300, 500), module=6):
+    code = cv2.QRCodeEncoder.create().encode(text)
+    code = cv2.resize(code, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+    scene = np.full(size, 180, dtype=np.uint8)
+    y, x = at
+    scene[y:y + code.shape[0], x:x + code.shape[1]] = code
+    return cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+
+
+def jpeg(frame):
+    return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+class QRPipelineTests(SimpleTestCase):
+    def test_reduced_grayscale_decode(self):
+        gray, scale = decode_gray(jpeg(qr_scene()))
+        self.assertEqual(gray.ndim, 2)
+        self.assertEqual(scale, 2)
+        self.assertEqual(gray.shape, (600, 800))
+
+    def test_one_shot_scan_maps_points_to_full_frame(self):
+        codes = scan_image(jpeg(qr_scene()))
+        self.assertEqual([c['data'] for c in codes], ['12345-1234567-1'])
+        xs = [p[0] for p in codes[0]['points']]
+        self.assertTrue(480 <= min(xs) <= 560)
+
+    def test_duplicate_then_roi_then_full(self):
+        scanner = QRScanner()
+        frame = qr_scene()
+        codes, how = scanner.scan_frame(frame)
+        self.assertEqual((len(codes), how), (1, 'full'))
+
+        self.assertEqual(scanner.scan_frame(frame)[1], 'duplicate')
+
+        moved = frame.copy()
+        moved[:150] = 0  # scene changes, code stays put
+        codes, how = scanner.scan_frame(moved)
+        self.assertEqual((codes[0]['data'], how), ('12345-1234567-1', 'roi'))
+
+        elsewhere = qr_scene(at=(700, 1100))
+        codes, how = scanner.scan_frame(elsewhere)
+        self.assertEqual((len(codes), how), (1, 'full'))
+
+    def test_empty_frame(self):
+        scanner = QRScanner()
+        blank = np.full((480, 640, 3), 90, dtype=np.uint8)
+        self.assertEqual(scanner.scan_frame(blank), ([], 'none'))
+
+    def test_invalid_bytes(self):
+        with self.assertRaises(ValueError):
+            decode_gray(b'not an image')
@@ -0,0 +1,50 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+
+from . import metrics
+from .models import UserProfile
+from .tests_qr_pipeline import jpeg, qr_scene
+
+
+class QRScanEndpointTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(username='scanner', password='pass')
+        UserProfile.objects.create(user=user, cnic='12345-1234567-1')
+        self.url = reverse('scan_qr')
+        self.frame = jpeg(qr_scene())
+        metrics.reset()
+
+    def assertAuthenticated(self, resp):
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertTrue(data['qr_detected'])
+        self.assertTrue(data['user_authenticated'])
+        self.assertEqual(data['user_data']['username'], 'scanner')
+
+    def test_raw_jpeg_body(self):
+        resp = self.client.post(self.url, data=self.frame, content_type='image/jpeg')
+        self.assertAuthenticated(resp)
+        snap = metrics.snapshot('qr.')
+        self.assertEqual(snap['qr.requests.raw']['value'], 1)
+        self.assertEqual(snap['qr.request_bytes']['count'], 1)
+        self.assertEqual(snap['qr.image_decode_ms']['count'], 1)
+
+    def test_multipart_upload(self):
+        resp = self.client.post(self.url, {'image': SimpleUploadedFile('f.jpg', self.frame, 'image/jpeg')})
+        self.assertAuthenticated(resp)
+
+    def test_legacy_base64_json(self):
+        body = json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(self.frame).decode()})
+        resp = self.client.post(self.url, data=body, content_type='application/json')
+        self.assertAuthenticated(resp)
+
+    def test_empty_and_invalid_bodies(self):
+        resp = self.client.post(self.url, data=b'', content_type='image/jpeg')
+        self.assertEqual(resp.json(), {'qr_detected': False, 'message': 'No image provided'})
+        resp = self.client.post(self.url, data=b'garbage', content_type='image/jpeg')
+        self.assertEqual(resp.json(), {'qr_detected': False, 'message': 'Invalid image'})
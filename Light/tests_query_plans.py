@@ -0,0 +1,128 @@
+"""
+Query plan checks for the hot per-user queries
+
+Seeds a dataset, refreshes planner statistics and EXPLAINs each query the
+views run on every page load. A query fails if the plan reads a whole table
+(sqlite "SCAN <table>" without an index, PostgreSQL "Seq Scan") or sorts in
+a temporary structure instead of walking an index in order.
+"""
+
+import random
+import re
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from . import daily_stats
+from .models import (
+    Bin, Notification, RedemptionRequest, RewardItem, RewardRedemption, UserDailyStats, WasteRecord,
+)
+from .pagination import encode_cursor, keyset_query
+from .user_views import HISTORY_FIELDS, HISTORY_PAGE_SIZE, history_records
+
+
+def hot_queries(user):
+    """name -> queryset, built with the same helpers and filters the views use"""
+    today = timezone.localdate()
+    month_ago = today - timedelta(days=30)
+    older = encode_cursor(timezone.now() - timedelta(days=90), 10**6)
+
+    def history(cursor=None, **filters):
+        return keyset_query(history_records(user, **filters), cursor, HISTORY_PAGE_SIZE, fields=HISTORY_FIELDS)
+
+    return {
+        'dashboard recent activity': WasteRecord.objects.filter(user=user).order_by('-disposed_at')[:5],
+        'history first page': history(),
+        'history next page': history(older),
+        'history date range': history(date_from=str(month_ago), date_to=str(today)),
+        'history date range next page': history(older, date_from=str(today - timedelta(days=365)),
+                                                date_to=str(today)),
+        'history type filter': history(waste_type='plast'),
+        'history type filter stats': history_records(user, waste_type='plast'),
+        'history stats': daily_stats.totals_query(user, date_from=month_ago, date_to=today),
+        'profile monthly stats': daily_stats.totals_query(user, date_from=month_ago),
+        'notifications': Notification.objects.filter(user=user).order_by('-created_at'),
+        'unread notifications': Notification.objects.filter(user=user, is_read=False),
+        'profile redemptions': RewardRedemption.objects.filter(user=user).order_by('-requested_at')[:5],
+        'admin pending redemptions': RewardRedemption.objects.filter(status='pending').order_by('-requested_at'),
+        'redemption history': RedemptionRequest.objects.filter(user=user).order_by('-created_at'),
+        'redemptions by status': RedemptionRequest.objects.filter(user=user, status='pending'),
+        'nearby bins': Bin.objects.all().order_by('status', '-capacity_percentage'),
+        'active bins': Bin.objects.filter(status='active').order_by('-capacity_percentage'),
+    }
+
+
+def plan_problems(queryset):
+    """EXPLAIN the queryset; returns the plan lines that read a whole table or sort without an index"""
+    if connection.vendor == 'postgresql':
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Small test tables always look cheaper to scan; ask whether an index path exists
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        return [line for line in plan.splitlines() if 'Seq Scan' in line]
+
+    plan = queryset.explain()
+    problems = []
+    for line in plan.splitlines():
+        # Any temp b-tree is a sort (ORDER BY, RIGHT PART OF ORDER BY, GROUP BY, DISTINCT)
+        if re.search(r'\bSCAN \S+$', line.strip()) or 'USE TEMP B-TREE' in line:
+            problems.append(line.strip())
+    return problems
+
+
+class HotQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(0)
+        User = get_user_model()
+        users = [User.objects.create_user(username=f'user{i}') for i in range(20)]
+        cls.user = users[0]
+        now = timezone.now()
+        reward = RewardItem.objects.create(name='Voucher', description='', category='voucher', points_required=100)
+
+        WasteRecord.objects.bulk_create(
+            WasteRecord(user=rng.choice(users), waste_type=rng.choice(['plastic', 'paper', 'metal', 'glass']),
+                        points_earned=10, disposed_at=now - timedelta(hours=rng.uniform(0, 24 * 365)))
+            for _ in range(5000)
+        )
+        UserDailyStats.objects.bulk_create(
+            UserDailyStats(user=u, date=now.date() - timedelta(days=d), items=1)
+            for u in users for d in range(60)
+        )
+        Notification.objects.bulk_create(
+            Notification(user=rng.choice(users), title='Points', message='+10', is_read=rng.random() < 0.8)
+            for _ in range(1000)
+        )
+        RewardRedemption.objects.bulk_create(
+            RewardRedemption(user=rng.choice(users), reward=reward, points_spent=100,
+                             status=rng.choice(['pending', 'approved', 'completed']))
+            for _ in range(500)
+        )
+        RedemptionRequest.objects.bulk_create(
+            RedemptionRequest(user=rng.choice(users), category='charity', points_redeemed=100, pkr_value=100,
+                              status=rng.choice(['pending', 'completed']))
+            for _ in range(500)
+        )
+        Bin.objects.bulk_create(
+            Bin(bin_id=f'BIN-{i:03d}', name=f'Bin {i}', location_name='Campus', latitude=33.6, longitude=73.0,
+                status=rng.choice(['active', 'full', 'offline']), capacity_percentage=rng.randint(0, 100))
+            for i in range(300)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in hot_queries(self.user).items():
+            with self.subTest(name):
+                self.assertEqual(plan_problems(queryset), [], f"{name}:\n{queryset.explain()}")
+
+    @skipUnless(connection.vendor == 'sqlite', 'checks the sqlite plan wording')
+    def test_sort_on_index_suffix_is_flagged(self):
+        # The index covers (user, -disposed_at, -id); ordering past that sorts the right part in a temp b-tree
+        queryset = WasteRecord.objects.filter(user=self.user).order_by('-disposed_at', 'waste_type')
+        [problem] = plan_problems(queryset)
+        self.assertTrue(problem.endswith('USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'), problem)
@@ -0,0 +1,75 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import snapshot, streaming
+from .tests_streaming import PacedBroker
+
+
+class StillCamera:
+    """Serves a JPEG on /capture like the ESP32 CameraWebServer"""
+
+    def __init__(self, value=77):
+        jpeg = cv2.imencode('.jpg', np.full((48, 64, 3), value, dtype=np.uint8))[1].tobytes()
+        self.hits = 0
+        camera = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                camera.hits += 1
+                status, body = (200, jpeg) if self.path == '/capture' else (404, b'')
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotTests(SimpleTestCase):
+    def test_still_url(self):
+        self.assertEqual(snapshot.still_url('http://192.168.4.1:81/stream'), 'http://192.168.4.1/capture')
+        self.assertIsNone(snapshot.still_url('/tmp/cam.avi'))
+
+    def test_still_endpoint(self):
+        camera = StillCamera()
+        try:
+            snap = snapshot.capture_snapshot('http://127.0.0.1:1/stream', snapshot_url=camera.base + '/capture',
+                                             fallback=False)
+        finally:
+            camera.stop()
+        self.assertEqual(snap.source, 'still')
+        self.assertEqual(snap.frame.shape, (48, 64, 3))
+        self.assertIsNotNone(snap.timestamp)
+
+    def test_unreachable_still_without_fallback(self):
+        self.assertIsNone(snapshot.capture_snapshot(
+            'http://127.0.0.1:1/stream', snapshot_url='http://127.0.0.1:1/capture', timeout=0.5, fallback=False
+        ))
+
+    def test_running_broker_gives_next_frame(self):
+        broker = PacedBroker(fps=50)
+        streaming._brokers[broker.url] = broker
+        try:
+            broker.wait_for_frame(0, timeout=5)
+            before = broker.seq
+            snap = snapshot.capture_snapshot(broker.url, snapshot_url='', fallback=False)
+            self.assertEqual(snap.source, 'stream')
+            self.assertGreater(broker.seq, before)
+        finally:
+            streaming._brokers.pop(broker.url, None)
+            broker.stop()
@@ -0,0 +1,264 @@
+import asyncio
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+import cv2
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase
+
+from . import aio, camera_sessions, streaming, views
+
+
+def write_recording(path, frames=300, size=(320, 240)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 30, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), (i * 3) % 255, dtype=np.uint8))
+    writer.release()
+
+
+async def _take(frames, count):
+    async for part in frames:
+        yield part
+        count -= 1
+        if not count:
+            return
+
+
+class FrameBrokerTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.recording = str(Path(cls.tmp) / 'cam.avi')
+        write_recording(cls.recording)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_normalize_stream_url(self):
+        self.assertEqual(streaming.normalize_stream_url('192_168_4_1:81/stream'), 'http://192.168.4.1:81/stream')
+        self.assertEqual(streaming.normalize_stream_url('http://cam/stream'), 'http://cam/stream')
+        self.assertEqual(streaming.normalize_stream_url('https://cam:8443/stream'), 'https://cam:8443/stream')
+        # Bare forms always become http:// URLs, never an FFmpeg protocol
+        self.assertTrue(streaming.normalize_stream_url('concat:/a|/b').startswith('http://'))
+        for url in ('/tmp/cam.avi', 'file:///etc/passwd', 'concat:file:///a', 'rtsp://cam/live', 'http:///stream'):
+            with self.assertRaises(ValueError):
+                streaming.normalize_stream_url(url)
+
+    def test_stream_views_reject_non_http_sources(self):
+        factory = RequestFactory()
+        with mock.patch.object(streaming, 'FrameBroker') as broker:
+            for view in (views.livefe, views.qr_stream):
+                response = view(factory.get('/livefe/', {'ip': '/etc/passwd'}))
+                self.assertEqual(response.status_code, 400)
+        broker.assert_not_called()
+
+    def test_stream_view_opens_the_camera_url(self):
+        real_broker = streaming.FrameBroker
+        opened = []
+
+        def open_recording(url):
+            opened.append(url)
+            return real_broker(self.recording)
+
+        request = RequestFactory().get('/livefe/', {'ip': '192_168_4_1:81/stream', 'session': 'stream-test'})
+        request.user = User(pk=1, username='ops', is_staff=True)
+        self.addCleanup(camera_sessions.get_manager().close, 'session:stream-test')
+        with mock.patch.object(streaming, 'FrameBroker', side_effect=open_recording):
+            response = views.livefe(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(opened, ['http://192.168.4.1:81/stream'])
+        self.assertTrue(next(iter(response.streaming_content)).startswith(b'--frame'))
+        response.close()
+
+    def test_same_url_shares_one_broker(self):
+        first = streaming.acquire(self.recording)
+        second = streaming.acquire(self.recording)
+        try:
+            self.assertIs(first, second)
+            self.assertIs(streaming.get_broker(self.recording), first)
+        finally:
+            streaming.release(second)
+            self.assertFalse(first.stopped)
+            streaming.release(first)
+        self.assertTrue(first.stopped)
+        self.assertIsNone(streaming.get_broker(self.recording))
+
+    def test_unreachable_camera_does_not_block_other_feeds(self):
+        opening = threading.Event()
+        real_broker = streaming.FrameBroker
+
+        def open_broker(url):
+            if url == 'http://dead-camera/stream':
+                opening.set()
+                time.sleep(1.0)
+                raise ValueError(f"Cannot open video stream at {url}")
+            return real_broker(url)
+
+        with mock.patch.object(streaming, 'FrameBroker', side_effect=open_broker):
+            errors = []
+
+            def watch_dead_camera():
+                try:
+                    streaming.acquire('http://dead-camera/stream')
+                except ValueError as e:
+                    errors.append(e)
+
+            dead = threading.Thread(target=watch_dead_camera)
+            dead.start()
+            self.assertTrue(opening.wait(2))
+            started = time.perf_counter()
+            broker = streaming.acquire(self.recording)
+            self.assertLess(time.perf_counter() - started, 0.5)
+            streaming.release(broker)
+            dead.join()
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(streaming.get_broker('http://dead-camera/stream'))
+
+    def test_concurrent_opens_keep_one_broker(self):
+        brokers = []
+        threads = [threading.Thread(target=lambda: brokers.append(streaming.acquire(self.recording)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(b) for b in brokers}), 1)
+        self.assertEqual(brokers[0]._refs, 4)
+        for broker in brokers:
+            streaming.release(broker)
+        self.assertTrue(brokers[0].stopped)
+
+    def test_jpeg_is_encoded_once_per_frame(self):
+        broker = streaming.acquire(self.recording)
+        self.addCleanup(streaming.release, broker)
+        self.assertIsNotNone(broker.wait_for_frame(0, timeout=5))
+        broker.stopped = True  # freeze on the current frame
+        seq_a, jpeg_a = broker.jpeg()
+        seq_b, jpeg_b = broker.jpeg()
+        self.assertEqual(seq_a, seq_b)
+        self.assertIs(jpeg_a, jpeg_b)
+        self.assertTrue(jpeg_a.startswith(b'\xff\xd8'))
+
+    def test_wait_for_frame_returns_newer_sequence(self):
+        broker = streaming.acquire(self.recording)
+        self.addCleanup(streaming.release, broker)
+        first = broker.wait_for_frame(0, timeout=5)
+        self.assertIsNotNone(first)
+        seq, frame, timestamp = broker.latest()
+        self.assertGreaterEqual(seq, first)
+        self.assertEqual(frame.shape, (240, 320, 3))
+        self.assertIsNotNone(timestamp)
+
+
+class PacedBroker(streaming.FrameBroker):
+    """Broker fed by synthetic frames at a fixed rate, like a live camera"""
+
+    def __init__(self, fps=100):
+        self.url = 'paced://test'
+        self.jpeg_quality = 80
+        self.fps = fps
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = None
+        self._jpeg_cache = {}
+        self._encode_lock = threading.Lock()
+        self._waiters = aio.Waiters()
+        self._refs = 0
+        self.stopped = False
+        self._thread = threading.Thread(target=self._update, daemon=True)
+        self._thread.start()
+
+    def _update(self):
+        while not self.stopped:
+            with self._cond:
+                self._frame = np.full((240, 320, 3), self._seq % 255, dtype=np.uint8)
+                self._seq += 1
+                self._timestamp = time.time()
+                self._cond.notify_all()
+            self._waiters.notify_all()
+            time.sleep(1.0 / self.fps)
+
+    def stop(self):
+        self.stopped = True
+
+
+class MjpegGeneratorTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.recording = str(Path(cls.tmp) / 'cam.avi')
+        write_recording(cls.recording, frames=600)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_fps_cap_and_stats(self):
+        broker = PacedBroker(fps=100)
+        self.addCleanup(broker.stop)
+        frames = streaming.mjpeg_frames(broker, fps=20, quality=60)
+        started = time.perf_counter()
+        parts = list(itertools.islice(frames, 5))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(parts), 5)
+        self.assertTrue(parts[0].startswith(b'--frame\r\nContent-Type: image/jpeg'))
+        self.assertGreaterEqual(elapsed, 4 / 20 - 0.02)
+        self.assertLess(elapsed, 1.0)
+
+        [stats] = [s for s in streaming.stream_stats() if s['url'] == broker.url]
+        self.assertEqual(stats['frames_sent'], 5)
+        self.assertEqual(stats['quality'], 60)
+        # 100 fps camera, 20 fps client: intermediate frames are skipped, not queued
+        self.assertGreater(stats['frames_dropped'], 0)
+        frames.close()
+        self.assertFalse([s for s in streaming.stream_stats() if s['url'] == broker.url])
+
+    async def test_async_viewers_share_the_camera(self):
+        broker = PacedBroker(fps=100)
+        self.addCleanup(broker.stop)
+
+        async def view():
+            frames = streaming.amjpeg_frames(broker, fps=20, quality=60)
+            parts = [part async for part in _take(frames, 3)]
+            await frames.aclose()
+            return parts
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(view() for _ in range(50)))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual([len(parts) for parts in results], [3] * 50)
+        self.assertTrue(results[0][0].startswith(b'--frame\r\nContent-Type: image/jpeg'))
+        self.assertGreaterEqual(elapsed, 2 / 20 - 0.02)
+        self.assertLess(elapsed, 2.0)
+        self.assertFalse([s for s in streaming.stream_stats() if s['url'] == broker.url])
+
+    def test_does_not_resend_the_same_frame(self):
+        broker = streaming.acquire(self.recording)
+        self.addCleanup(streaming.release, broker)
+        # Let the recording play out so no new frames will ever arrive
+        deadline = time.time() + 10
+        while not broker.stopped and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(broker.stopped)
+        self.assertEqual(len(list(streaming.mjpeg_frames(broker))), 1)
+
+    def test_render_hook_replaces_shared_jpeg(self):
+        broker = streaming.acquire(self.recording)
+        self.addCleanup(streaming.release, broker)
+        frames = streaming.mjpeg_frames(broker, render=lambda frame, quality: b'custom')
+        self.assertIn(b'custom', next(frames))
+        frames.close()
@@ -1,3 +1,5 @@
+import json
+
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -69,3 +71,66 @@ class WasteHistoryViewTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         data = resp.json()
         self.assertEqual(len(data['records']), 1)
+
+
+class WasteHistoryPaginationTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='longtime', password='pass')
+        UserProfile.objects.create(user=self.user)
+        now = timezone.now()
+        WasteRecord.objects.bulk_create([
+            WasteRecord(user=self.user, waste_type='plastic', points_earned=10,
+                        # pairs share a timestamp so the id tie-breaker matters
+                        disposed_at=now - timedelta(hours=i // 2))
+            for i in range(120)
+        ])
+        self.client.login(username='longtime', password='pass')
+        self.url = reverse('waste_history')
+
+    def get_json(self, **params):
+        return self.client.get(self.url, params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_cursor_walks_every_record_once(self):
+        seen, cursor = [], None
+        while True:
+            data = self.get_json(**({'cursor': cursor} if cursor else {})).json()
+            seen += [r['id'] for r in data['records']]
+            if seen and len(seen) == 50:
+                # a disposal arriving mid-walk must not shift later pages
+                WasteRecord.objects.create(user=self.user, waste_type='glass', points_earned=12)
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 120)
+        self.assertEqual(len(set(seen)), 120)
+        self.assertEqual(data['has_more'], False)
+
+    def test_limit_and_bad_cursor(self):
+        self.assertEqual(len(self.get_json(limit=10).json()['records']), 10)
+        self.assertEqual(self.get_json(cursor='garbage').status_code, 400)
+
+    def test_html_page_links_older_records(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(len(resp.context['records']), 50)
+        self.assertContains(resp, f"cursor={resp.context['next_cursor']}")
+
+    def test_streaming_exports(self):
+        resp = self.client.get(self.url, {'format': 'csv'})
+        self.assertTrue(resp.streaming)
+        lines = b''.join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,disposed_at,waste_type,weight_kg,points_earned,bin_bin_id,bin_name')
+        self.assertEqual(len(lines), 121)
+
+        resp = self.client.get(self.url, {'format': 'ndjson', 'type': 'plastic'})
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(resp.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 120)
+        self.assertEqual(rows[0]['waste_type'], 'plastic')
+
+    async def test_streaming_export_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        resp = await self.async_client.get(self.url, {'format': 'csv'})
+        self.assertTrue(resp.is_async)
+        lines = b''.join([chunk async for chunk in resp.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 121)
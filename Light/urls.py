@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views, user_views, mobile_api, qr_disposal_api, chatbot
+from . import views, user_views, mobile_api, qr_disposal_api, chatbot, metrics
 
 urlpatterns = [
     # ========================================
@@ -15,6 +15,8 @@ urlpatterns = [
     path('capture_frame/', views.capture_frame, name='capture_frame'),
     path('get_captured_frame/', views.get_captured_frame, name='get_captured_frame'),
     path('is_streaming/', views.is_streaming, name='is_streaming'),
+    path('stream_stats/', views.stream_stats, name='stream_stats'),
+    path('api/events/', views.event_stream, name='event_stream'),
     path('has_captured_frame/', views.has_captured_frame, name='has_captured_frame'),
     path('clear_capture_state/', views.clear_capture_state, name='clear_capture_state'),
     path('stop_stream/', views.stop_stream, name='stop_stream'),
@@ -27,6 +29,8 @@ urlpatterns = [
     path('scan_qr_from_image/', views.scan_qr_from_image, name='scan_qr_from_image'),
     # Hardware API
     path('api/hardware/dispose/', views.hardware_dispose, name='hardware_dispose'),
+    path('api/hardware/dispose/batch/', views.hardware_dispose_batch, name='hardware_dispose_batch'),
+    path('api/hardware/telemetry/', views.hardware_telemetry, name='hardware_telemetry'),
     
     # ========================================
     # Mobile API Endpoints
@@ -60,6 +64,7 @@ urlpatterns = [
     # ========================================
     path('user/waste-history/', user_views.waste_history, name='waste_history'),
     path('user/nearby-bins/', user_views.nearby_bins, name='nearby_bins'),
+    path('api/bins/nearby/', user_views.nearby_bins_api, name='nearby_bins_api'),
     
     # Testing
     path('user/polling-test/', user_views.polling_test, name='polling_test'),
@@ -102,8 +107,14 @@ urlpatterns = [
     # Chatbot API
     # ========================================
     path('api/chatbot/message/', chatbot.chatbot_message, name='chatbot_message'),
+    path('api/chatbot/stream/', chatbot.chatbot_stream, name='chatbot_stream'),
     path('api/chatbot/health/', chatbot.chatbot_health, name='chatbot_health'),
     
+    # ========================================
+    # Metrics (inference batching, latency, etc.)
+    # ========================================
+    path('api/metrics/', metrics.metrics_view, name='metrics'),
+    
     # Admin interfaces are handled by Django's built-in admin at /admin/
     # Removed custom admin UI and routes to avoid duplication with Django admin.
 ]
\ No newline at end of file
@@ -3,16 +3,22 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from datetime import timedelta
 from datetime import datetime, time
+from urllib.parse import urlencode
+import csv
+import json
 from .models import (
     UserProfile, Bin, DetectedIssues, WasteRecord,
     RewardItem, RewardRedemption, IssueReport, Notification, RedemptionRequest
 )
+from . import aio, bin_index, daily_stats
+from .pagination import keyset_page
 from .forms import (
     UserRegisterForm, UserLoginForm, UserProfileForm,
     IssueReportForm, UserSettingsForm
@@ -139,14 +145,6 @@ def user_dashboard(request):
     # Get recent activity
     recent_activity = WasteRecord.objects.filter(user=request.user).order_by('-disposed_at')[:5]
 
-    # Get weekly waste data for chart
-    today = timezone.now()
-    week_ago = today - timedelta(days=7)
-    weekly_data = WasteRecord.objects.filter(
-        user=request.user,
-        disposed_at__gte=week_ago
-    ).values('disposed_at__date').annotate(count=Count('id')).order_by('disposed_at__date')
-
     # Get waste type breakdown
     waste_breakdown = {
         'plastic': profile.plastic_count,
@@ -200,13 +198,8 @@ def user_profile(request):
     # Get monthly stats
     today = timezone.now()
     month_ago = today - timedelta(days=30)
-    monthly_stats = WasteRecord.objects.filter(
-        user=request.user,
-        disposed_at__gte=month_ago
-    ).aggregate(
-        total_items=Count('id'),
-        total_points=Sum('points_earned')
-    )
+    monthly = daily_stats.totals(request.user, date_from=timezone.localdate(month_ago))
+    monthly_stats = {'total_items': monthly['total_items'], 'total_points': monthly['total_points']}
 
     context = {
         'profile': profile,
@@ -244,15 +237,9 @@ def edit_profile(request):
     return render(request, 'edit_profile.html', context)
 
 
-@login_required
-def waste_history(request):
-    """User's complete waste disposal history"""
-    # Filters
-    waste_type = request.GET.get('type', '')
-    date_from = request.GET.get('from', '')
-    date_to = request.GET.get('to', '')
-
-    records = WasteRecord.objects.filter(user=request.user)
+def history_records(user, waste_type='', date_from='', date_to=''):
+    """The user's WasteRecords filtered like waste_history's ?type=, ?from= and ?to= parameters"""
+    records = WasteRecord.objects.filter(user=user)
 
     if waste_type:
         records = records.filter(waste_type__icontains=waste_type)
@@ -277,74 +264,222 @@ def waste_history(request):
             except Exception:
                 pass
             records = records.filter(disposed_at__lte=end_dt)
-    records = records.order_by('-disposed_at')
-
-    # Statistics
-    stats = records.aggregate(
-        total_items=Count('id'),
-        total_points=Sum('points_earned'),
-        plastic=Count('id', filter=Q(waste_type='plastic')),
-        paper=Count('id', filter=Q(waste_type='paper')),
-        metal=Count('id', filter=Q(waste_type='metal')),
-        glass=Count('id', filter=Q(waste_type='glass'))
-    )
 
-    context = {
-        'records': records,
-        'stats': stats,
-        'filters': {
-            'type': waste_type,
-            'from': date_from,
-            'to': date_to
-        }
-    }
+    return records
+
+
+@login_required
+def waste_history(request):
+    """User's complete waste disposal history"""
+    # Filters
+    waste_type = request.GET.get('type', '')
+    date_from = request.GET.get('from', '')
+    date_to = request.GET.get('to', '')
+
+    records = history_records(request.user, waste_type, date_from, date_to)
+
+    export = request.GET.get('format', '')
+    if export in ('csv', 'ndjson'):
+        return stream_history_export(records, export, asgi=aio.is_asgi(request))
+
+    # Statistics: from the daily rollup unless filtering by type, which it can't answer
+    if not waste_type:
+        stats = daily_stats.totals(
+            request.user,
+            date_from=parse_date(date_from) if date_from else None,
+            date_to=parse_date(date_to) if date_to else None,
+        )
+    else:
+        stats = records.aggregate(
+            total_items=Count('id'),
+            total_points=Sum('points_earned'),
+            plastic=Count('id', filter=Q(waste_type='plastic')),
+            paper=Count('id', filter=Q(waste_type='paper')),
+            metal=Count('id', filter=Q(waste_type='metal')),
+            glass=Count('id', filter=Q(waste_type='glass'))
+        )
+
+    # One keyset page of projected rows instead of every model instance
+    try:
+        limit = min(max(int(request.GET.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        rows, next_cursor = keyset_page(records, request.GET.get('cursor'), limit, fields=HISTORY_FIELDS)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    page = [history_row(row) for row in rows]
 
     # If requested via AJAX, return JSON to avoid rendering templates that may
     # reference URL names not available in test contexts.
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
         records_list = [
             {
-                'id': r.id,
-                'waste_type': r.waste_type,
-                'disposed_at': r.disposed_at.isoformat() if r.disposed_at else None,
-                'points_earned': getattr(r, 'points_earned', None)
+                'id': r['id'],
+                'waste_type': r['waste_type'],
+                'disposed_at': r['disposed_at'].isoformat() if r['disposed_at'] else None,
+                'points_earned': r['points_earned'],
+                'weight_kg': r['weight_kg'],
+                'bin': r['bin'],
             }
-            for r in records
+            for r in page
         ]
-        return JsonResponse({'records': records_list, 'stats': stats})
+        return JsonResponse({
+            'records': records_list,
+            'stats': stats,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+        })
+
+    filters = {'type': waste_type, 'from': date_from, 'to': date_to}
+    context = {
+        'records': page,
+        'stats': stats,
+        'filters': filters,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'filter_query': urlencode({k: v for k, v in filters.items() if v}),
+    }
 
     return render(request, 'waste_history.html', context)
 
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+HISTORY_FIELDS = ('waste_type', 'points_earned', 'weight_kg', 'bin__name', 'bin__location_name')
+EXPORT_COLUMNS = ('id', 'disposed_at', 'waste_type', 'weight_kg', 'points_earned', 'bin__bin_id', 'bin__name')
+
+
+def history_row(row):
+    """Flat .values() row -> the shape the template and JSON expect (record.bin.name)"""
+    name = row.pop('bin__name')
+    location = row.pop('bin__location_name')
+    row['bin'] = {'name': name, 'location_name': location} if name is not None else None
+    return row
+
+
+class _Echo:
+    """csv.writer target that hands each line back instead of buffering it"""
+    def write(self, value):
+        return value
+
+
+def stream_history_export(records, export, asgi=False):
+    """Stream the filtered history as CSV or NDJSON, reading rows in chunks so memory stays flat"""
+    rows = records.order_by('-disposed_at', '-id').values_list(*EXPORT_COLUMNS).iterator(chunk_size=2000)
+    header = [c.replace('bin__', 'bin_') for c in EXPORT_COLUMNS]
+    # ASGI reads a sync iterator to the end before sending; hand it an async one
+    body = aio.aiterate if asgi else iter
+
+    if export == 'csv':
+        writer = csv.writer(_Echo())
+
+        def lines():
+            yield writer.writerow(header)
+            for row in rows:
+                yield writer.writerow([v.isoformat() if hasattr(v, 'isoformat') else v for v in row])
+
+        response = StreamingHttpResponse(body(lines()), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="waste_history.csv"'
+        return response
+
+    def ndjson():
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + '\n'
+
+    return StreamingHttpResponse(body(ndjson()), content_type='application/x-ndjson')
+
+
 @login_required
 def nearby_bins(request):
     """
     📚 LEARNING POINT: Nearby Bins View with Leaflet Map
     ==================================================
-    This view fetches all active bins from the database and displays them on:
+    This view fetches the bins nearest the user and displays them on:
     1. An interactive Leaflet.js map (FREE - no API key!)
     2. Bin cards with details below the map
     
     How it works:
-    - Query all bins from database (ordered by status)
+    - Browser geolocation reloads the page with ?lat=&lng=
+    - bin_index finds the nearest bins (first page by status without a location)
     - Pass bins to template
     - Template renders Leaflet map with markers
     - Each bin shows: location, capacity, status, compartments
     - "Get Directions" button uses FREE Google Maps directions (no API key!)
     """
-    # Get all bins, prioritizing active ones
-    bins = Bin.objects.all().order_by('status', '-capacity_percentage')
-    
+    # With the user's location (?lat=&lng=, added by the page's geolocation script)
+    # show the nearest bins; otherwise the first page, prioritizing active ones
+    try:
+        lat, lng = float(request.GET['lat']), float(request.GET['lng'])
+    except (KeyError, ValueError):
+        lat = lng = None
+
+    if lat is not None:
+        nearest = bin_index.nearest_bins(lat, lng, k=NEARBY_BINS_PAGE, status=None)
+        bins = [b for _, b in nearest]
+    else:
+        bins = Bin.objects.all().order_by('status', '-capacity_percentage')[:NEARBY_BINS_PAGE]
+
+    counts = Bin.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        full=Count('id', filter=Q(status='full')),
+    )
     context = {
         'bins': bins,
-        'total_bins': bins.count(),
-        'active_bins': bins.filter(status='active').count(),
-        'full_bins': bins.filter(status='full').count(),
+        'located': lat is not None,
+        'total_bins': counts['total'],
+        'active_bins': counts['active'],
+        'full_bins': counts['full'],
     }
     
     return render(request, 'nearby_bins.html', context)
 
 
+NEARBY_BINS_PAGE = 50
+NEARBY_BINS_MAX_K = 100
+
+
+def nearby_bins_api(request):
+    """
+    GET /api/bins/nearby/?lat=31.52&lng=74.35&k=10&radius=5&compartment=plastic&status=active
+
+    The k nearest bins (default 10, max 100) within radius km (optional),
+    nearest first with haversine distances. status defaults to 'active'
+    ('any' for all); compartment keeps only bins whose compartment isn't full.
+    """
+    try:
+        lat, lng = float(request.GET['lat']), float(request.GET['lng'])
+        k = min(max(int(request.GET.get('k', 10)), 1), NEARBY_BINS_MAX_K)
+        radius = float(request.GET['radius']) if request.GET.get('radius') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'lat and lng are required; k and radius must be numbers'}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return JsonResponse({'error': 'lat/lng out of range'}, status=400)
+
+    compartment = request.GET.get('compartment') or None
+    if compartment and compartment not in bin_index.COMPARTMENTS:
+        return JsonResponse({'error': f'compartment must be one of {", ".join(bin_index.COMPARTMENTS)}'}, status=400)
+    status = request.GET.get('status', 'active')
+
+    nearest = bin_index.nearest_bins(lat, lng, k=k, radius_km=radius,
+                                     status=None if status == 'any' else status, compartment=compartment)
+    return JsonResponse({
+        'count': len(nearest),
+        'bins': [
+            {
+                'bin_id': b.bin_id,
+                'name': b.name,
+                'location_name': b.location_name,
+                'latitude': float(b.latitude),
+                'longitude': float(b.longitude),
+                'status': b.status,
+                'capacity_percentage': b.capacity_percentage,
+                'compartments_full': {c: getattr(b, f'{c}_full') for c in bin_index.COMPARTMENTS},
+                'distance_km': distance,
+            }
+            for distance, b in nearest
+        ],
+    })
+
+
 @login_required
 def polling_test(request):
     """Test page for live polling functionality"""
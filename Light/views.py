@@ -1,37 +1,40 @@
+import asyncio
 import threading
 import cv2
 import numpy as np
 import time
 import os
 import traceback
-import pyzbar.pyzbar as pyzbar
 from PIL import Image
 import json
-from tensorflow.keras.applications.mobilenet_v3 import preprocess_input
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import load_model
+from datetime import datetime, timezone as dt_timezone
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, StreamingHttpResponse, HttpResponseServerError, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseServerError, HttpResponse, HttpResponseBadRequest
 from django.contrib.auth.decorators import login_required
 from django.core.files.base import ContentFile
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
-from .models import DetectedIssues, WasteRecord, Bin, UserProfile
-
-# ---------------------------- MODEL LOAD ---------------------------- #
-print("🧠 Loading model...")
-model = load_model("waste_classifier_final.keras", compile=False)
-model.predict(np.zeros((1, 224, 224, 3)))  # Warm-up
-class_labels = {
-    0: "cardboard",
-    1: "glass",
-    2: "metal",
-    3: "paper",
-    4: "plastic",
-    5: "trash"
-}
-print("✅ Model loaded successfully.")
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import DetectedIssues, Bin, WasteRecord
+from . import aio
+from . import model_registry
+from .preprocessing import preprocess
+from . import streaming
+from . import camera_sessions
+from . import qr_pipeline
+from . import points as points_ledger
+from . import metrics
+from . import telemetry
+from . import events
+from .idempotency import idempotent
+
+# ---------------------------- MODEL ---------------------------- #
+# The classifier is loaded lazily by model_registry on the first prediction,
+# so importing this module (urls, manage.py commands, tests) never pulls in TensorFlow.
+class_labels = model_registry.CLASS_LABELS
 
 # ---------------------------- POINTS CONFIGURATION ---------------------------- #
 # Points awarded based on waste type
@@ -65,66 +68,19 @@ def calculate_points(waste_type, weight_kg=None):
     total_points = base_points + weight_bonus
     return total_points
 
-# ---------------------------- GLOBAL STATE ---------------------------- #
-current_camera = None
-latest_captured_frame = None
-frame_captured = False
-
-# QR Code Scanning State
-qr_camera = None
-qr_detected_codes = []
-qr_last_results = []
-
-# ---------------------------- IMAGE PREPROCESSING ---------------------------- #
-def preprocess_image(img_path):
-    img = image.load_img(img_path, target_size=(224, 224))
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    img_array = preprocess_input(img_array)
-    return img_array
-
-def preprocess_array(img_bgr):
-    frame_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    img = cv2.resize(frame_rgb, (224, 224))
-    img_array = np.expand_dims(img, axis=0)
-    img_array = preprocess_input(img_array.astype(np.float32))
-    return img_array
+# ---------------------------- CAMERA SESSIONS ---------------------------- #
+# Live-feed camera, captured frame and QR results live in a per bin / operator
+# CameraSession (see camera_sessions.py) so concurrent users don't clobber each other.
 
 # ---------------------------- QR CODE DETECTION ---------------------------- #
-def detect_qr_codes(frame):
-    """Detect and decode QR codes from frame"""
+def detect_qr_codes(frame, scanner=None):
+    """Detect and decode QR codes from frame, drawing their outlines on it"""
     try:
-        # Convert frame to grayscale for QR detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect and decode QR codes
-        decoded_objects = pyzbar.decode(gray)
-        
-        qr_codes = []
-        for obj in decoded_objects:
-            try:
-                qr_data = obj.data.decode('utf-8')
-                qr_info = {
-                    'data': qr_data,
-                    'type': obj.type,
-                    'points': [(point.x, point.y) for point in obj.polygon]
-                }
-                qr_codes.append(qr_info)
-                
-                # Draw bounding box around detected QR code
-                if len(obj.polygon) == 4:
-                    points = obj.polygon
-                    for i in range(4):
-                        cv2.line(frame, points[i], points[(i+1) % 4], (0, 255, 0), 3)
-                
-                # Put text label
-                cv2.putText(frame, f"QR: {qr_data}", 
-                           (obj.rect.left, obj.rect.top - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            except Exception as e:
-                print(f"❌ Error decoding QR: {e}")
-                continue
-        
+        if scanner is not None:
+            qr_codes, _ = scanner.scan_frame(frame)
+        else:
+            qr_codes = qr_pipeline.scan_image(frame)
+        qr_pipeline.draw_codes(frame, qr_codes)
         return qr_codes, frame
     except Exception as e:
         print(f"❌ QR detection error: {e}")
@@ -132,130 +88,111 @@ def detect_qr_codes(frame):
 
 # ---------------------------- VIDEO CAMERA ---------------------------- #
 class VideoCamera:
-    """Handles video stream input and frame capture (thread-safe)"""
+    """
+    One client's handle on a shared camera stream.
+
+    All handles for the same stream URL share one FrameBroker (one capture
+    thread, one JPEG encode per frame); stopping a handle only closes the
+    stream once the last handle is gone.
+    """
     def __init__(self, ip, ai_enabled=False, qr_enabled=False):
         self.ip = ip
         self.ai_enabled = ai_enabled
         self.qr_enabled = qr_enabled
-        print(f"📹 Connecting to camera stream: {ip}")
-        
-        # Handle different IP formats
-        if ip.startswith('http://'):
-            stream_url = ip
-        else:
-            stream_url = "http://" + ip.replace('_', '.')
-            
-        self.video = cv2.VideoCapture(stream_url)
-        if not self.video.isOpened():
-            raise ValueError(f"Cannot open video stream at {stream_url}")
-
-        self.video.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        self.lock = threading.Lock()
-        self.frame = None
-        self.latest_frame = None
-        self.stopped = False
-
-        self.update_thread = threading.Thread(target=self.update, daemon=False)
-        self.update_thread.start()
-
-    def update(self):
-        """Background frame grab loop"""
-        retry_count = 0
-        max_retries = 3
-        while not self.stopped:
-            grabbed, frame = self.video.read()
-            if not grabbed:
-                retry_count += 1
-                if retry_count >= max_retries:
-                    print("⚠️ Frame grab failed after retries — possible stream drop.")
-                    break
-                time.sleep(0.1)
-                continue
-            retry_count = 0
-            with self.lock:
-                self.frame = frame
-                self.latest_frame = frame.copy()
-        print("🛑 Camera thread stopped.")
+        self.broker = streaming.acquire(ip)
+        self._released = False
+        self._lock = threading.Lock()
+
+    @property
+    def stopped(self):
+        return self._released or self.broker.stopped
 
     def get_frame(self, with_qr_detection=False):
-        with self.lock:
-            if self.frame is None:
-                return None, []
-            
-            frame = self.frame.copy()
-            qr_codes = []
-            
-            if with_qr_detection:
-                qr_codes, frame = detect_qr_codes(frame)
-            
-            _, jpeg = cv2.imencode('.jpg', frame)
-            return jpeg.tobytes(), qr_codes
+        if not with_qr_detection:
+            _, jpeg = self.broker.jpeg()
+            return jpeg, []
+
+        _, frame, _ = self.broker.latest()
+        if frame is None:
+            return None, []
+        # QR overlay draws on the frame, so work on a private copy
+        qr_codes, frame = detect_qr_codes(frame.copy())
+        _, jpeg = cv2.imencode('.jpg', frame)
+        return jpeg.tobytes(), qr_codes
 
     def capture_frame(self):
-        global latest_captured_frame, frame_captured
-        with self.lock:
-            if self.latest_frame is not None:
-                latest_captured_frame = self.latest_frame.copy()
-                frame_captured = True
-                print("✅ Frame captured for AI processing")
-                return True
-        return False
+        """Return a private copy of the latest frame (or None)"""
+        _, frame, _ = self.broker.latest()
+        if frame is not None:
+            print("✅ Frame captured for AI processing")
+            return frame.copy()
+        return None
 
     def stop(self):
-        """Safely stop and release camera"""
-        if not self.stopped:
-            print("🛑 Stopping camera...")
-            self.stopped = True
-            if hasattr(self, 'update_thread'):
-                self.update_thread.join(timeout=2.0)
-            if self.video.isOpened():
-                try:
-                    self.video.release()
-                except Exception as e:
-                    if "libavformat" in str(e) or "stream_index" in str(e):
-                        print(f"⚠️ Suppressed FFmpeg assertion on release: {e}")
-                    else:
-                        traceback.print_exc()
-            print("📷 Camera stopped and released.")
+        """Release this handle (the stream closes when no handles remain)"""
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        streaming.release(self.broker)
 
 # ---------------------------- QR STREAMING ---------------------------- #
-def qr_gen(camera):
-    """Generate MJPEG stream with QR code detection"""
-    global qr_detected_codes, qr_last_results
-    
-    while True:
-        try:
-            frame_bytes, qr_codes = camera.get_frame(with_qr_detection=True)
-            if frame_bytes is None:
-                print("⚠️ No frame available in QR stream.")
-                break
-            
-            # Update QR codes if new ones detected
-            if qr_codes:
-                new_codes = []
-                for qr in qr_codes:
-                    # Avoid duplicates by checking data
-                    is_duplicate = False
-                    for existing_qr in qr_last_results:
-                        if existing_qr['data'] == qr['data']:
-                            is_duplicate = True
-                            break
-                    
-                    if not is_duplicate:
-                        new_codes.append(qr)
-                
-                if new_codes:
-                    qr_last_results.extend(new_codes)
-                    qr_detected_codes.extend(new_codes)
-                    print(f"📱 Detected {len(new_codes)} new QR code(s): {[qr['data'] for qr in new_codes]}")
-            
-            yield (
-                b'--frame\r\n'
-                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n\r\n'
-            )
-        except Exception as e:
-            print(f"⚠️ Error in QR stream: {e}")
-            break
+def qr_render(camera, session):
+    """render hook for the QR stream: detect, record new codes, return the annotated JPEG"""
+
+    def render(frame, quality):
+        qr_codes, annotated = detect_qr_codes(frame.copy(), scanner=session.qr_scanner)
+
+        # Record QR codes in this camera session if new ones detected
+        if qr_codes:
+            new_codes = session.add_qr_codes(qr_codes)
+            if new_codes:
+                print(f"📱 Detected {len(new_codes)} new QR code(s): {[qr['data'] for qr in new_codes]}")
+
+        _, jpeg = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, quality or camera.broker.jpeg_quality])
+        return jpeg.tobytes()
+
+    return render
+
+
+def qr_gen(camera, session, fps=None, quality=None):
+    """Generate MJPEG stream with QR code detection (runs once per new camera frame)"""
+    try:
+        yield from streaming.mjpeg_frames(
+            camera.broker, fps=fps, quality=quality, render=qr_render(camera, session),
+            stop=lambda: camera.stopped, kind='qr'
+        )
+    except Exception as e:
+        print(f"⚠️ Error in QR stream: {e}")
+    finally:
+        camera.stop()
+
+
+async def aqr_gen(camera, session, fps=None, quality=None):
+    """qr_gen() for ASGI workers: waits on the event loop, detects QR codes on a thread"""
+    try:
+        async for part in streaming.amjpeg_frames(
+            camera.broker, fps=fps, quality=quality, render=qr_render(camera, session),
+            stop=lambda: camera.stopped, kind='qr'
+        ):
+            yield part
+    except Exception as e:
+        print(f"⚠️ Error in QR stream: {e}")
+    finally:
+        await asyncio.to_thread(camera.stop)
+
+
+def stream_options(request):
+    """Per-client MJPEG options from ?fps= and ?quality= (clamped to sane ranges)"""
+    try:
+        fps = float(request.GET.get('fps') or settings.STREAM_MAX_FPS)
+    except ValueError:
+        fps = settings.STREAM_MAX_FPS
+    try:
+        quality = int(request.GET.get('quality') or settings.STREAM_JPEG_QUALITY)
+    except ValueError:
+        quality = settings.STREAM_JPEG_QUALITY
+    return min(max(fps, 0.5), 60.0), min(max(quality, 10), 95)
 
 # ---------------------------- VIEWS ---------------------------- #
 def landing(request):
@@ -265,6 +202,7 @@ def landing(request):
         return redirect('user_dashboard')
     return render(request, 'landing.html')
 
+@camera_sessions.refuse_when_full
 def dashboard(request):
     """Dashboard view for image classification"""
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -277,17 +215,19 @@ def dashboard(request):
 
         if from_stream:
             print("🧩 Source: Captured frame from live stream")
-            global latest_captured_frame, frame_captured
+            manager = camera_sessions.get_manager()
+            session = camera_sessions.get_session(request)
+            captured = manager.load_capture(session)
 
-            if not frame_captured or latest_captured_frame is None:
+            if captured is None:
                 response_data["error"] = "No captured frame available. Please start live feed and capture frame first."
                 return JsonResponse(response_data)
 
             try:
-                frame_bgr = latest_captured_frame.copy()
+                frame_bgr = captured.copy()
                 print("🚀 Running model on captured frame...")
-                img_array = preprocess_array(frame_bgr)
-                predictions = model.predict(img_array)
+                img_array = preprocess(frame_bgr)
+                predictions = model_registry.classify(img_array)
 
                 predicted_index = int(np.argmax(predictions))
                 predicted_label = class_labels.get(predicted_index, f"Unknown({predicted_index})")
@@ -304,27 +244,12 @@ def dashboard(request):
                 # Auto-create WasteRecord for authenticated users
                 if request.user.is_authenticated:
                     points = calculate_points(predicted_label)  # Dynamic points based on waste type
-                    record = WasteRecord.objects.create(
-                        user=request.user,
+                    # WasteRecord + atomic profile update
+                    record, _ = points_ledger.record_disposal(
+                        request.user, predicted_label, points,
                         bin=None,  # or link a default bin if available
                         detected_issue=db,
-                        waste_type=predicted_label,
-                        points_earned=points
                     )
-                    # Update user profile
-                    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-                    profile.total_points += points
-                    profile.total_waste_disposed += 1
-                    if predicted_label == 'plastic':
-                        profile.plastic_count += 1
-                    elif predicted_label == 'paper':
-                        profile.paper_count += 1
-                    elif predicted_label == 'metal':
-                        profile.metal_count += 1
-                    elif predicted_label == 'glass':
-                        profile.glass_count += 1
-                    profile.save()
-                    profile.update_level()
                     db.is_processed = True
                     db.points_awarded = points
                     db.user = request.user
@@ -350,9 +275,9 @@ def dashboard(request):
             db.save()
             try:
                 print("🚀 Running model on uploaded image...")
-                img_path = db.img.path
-                img_array = preprocess_image(img_path)
-                predictions = model.predict(img_array)
+                # Decode from the in-memory upload rather than re-reading the saved file
+                img_array = preprocess(image_file)
+                predictions = model_registry.classify(img_array)
 
                 predicted_index = int(np.argmax(predictions))
                 predicted_label = class_labels.get(predicted_index, f"Unknown({predicted_index})")
@@ -366,27 +291,12 @@ def dashboard(request):
                 # Auto-create WasteRecord for authenticated users
                 if request.user.is_authenticated:
                     points = calculate_points(predicted_label)  # Dynamic points based on waste type
-                    record = WasteRecord.objects.create(
-                        user=request.user,
+                    # WasteRecord + atomic profile update
+                    record, _ = points_ledger.record_disposal(
+                        request.user, predicted_label, points,
                         bin=None,  # or link a default bin if available
                         detected_issue=db,
-                        waste_type=predicted_label,
-                        points_earned=points
                     )
-                    # Update user profile
-                    profile, _ = UserProfile.objects.get_or_create(user=request.user)
-                    profile.total_points += points
-                    profile.total_waste_disposed += 1
-                    if predicted_label == 'plastic':
-                        profile.plastic_count += 1
-                    elif predicted_label == 'paper':
-                        profile.paper_count += 1
-                    elif predicted_label == 'metal':
-                        profile.metal_count += 1
-                    elif predicted_label == 'glass':
-                        profile.glass_count += 1
-                    profile.save()
-                    profile.update_level()
                     db.is_processed = True
                     db.points_awarded = points
                     db.user = request.user
@@ -405,115 +315,128 @@ def dashboard(request):
 
     return render(request, "Dashboard.html", {"prediction": None, "error": None})
 
+@camera_sessions.refuse_when_full
 def livefe(request):
     """Start live video feed (ESP32-CAM)"""
     try:
         _ip = request.GET.get('ip')
         if not _ip:
             return HttpResponseServerError("Missing 'ip' parameter")
+        try:
+            ip = streaming.normalize_stream_url(_ip)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
 
-        global current_camera, latest_captured_frame, frame_captured
-
-        if current_camera:
-            current_camera.stop()
-        current_camera = None
-        latest_captured_frame = None
-        frame_captured = False
+        manager = camera_sessions.get_manager()
+        session = camera_sessions.get_session(request)
 
-        time.sleep(0.3)
+        if session.camera:
+            session.stop_camera()
+            time.sleep(0.3)
+        manager.clear_capture(session)
 
-        # Handle IP formatting
-        if not _ip.startswith('http://'):
-            ip = "http://" + _ip.replace('_', '.')
-        else:
-            ip = _ip
-            
         print(f"📡 Starting new stream from: {ip}")
 
-        current_camera = VideoCamera(ip)
+        fps, quality = stream_options(request)
+        camera = VideoCamera(ip)
+        session.set_camera(camera)
+        frames = agen if aio.is_asgi(request) else gen
         return StreamingHttpResponse(
-            gen(current_camera),
+            frames(camera, fps=fps, quality=quality),
             content_type="multipart/x-mixed-replace;boundary=frame"
         )
 
+    except camera_sessions.SessionLimitReached:
+        raise
     except Exception as e:
         print(f"❌ Error starting stream: {e}")
         return HttpResponseServerError(f"Failed to start streaming: {e}")
 
-def gen(camera):
-    """Generate MJPEG stream"""
-    while True:
-        frame_bytes, _ = camera.get_frame()
-        if frame_bytes is None:
-            print("⚠️ No frame available in stream.")
-            break
-        try:
-            yield (
-                b'--frame\r\n'
-                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n\r\n'
-            )
-        except Exception as e:
-            print(f"⚠️ Error sending frame: {e}")
-            break
+def gen(camera, fps=None, quality=None):
+    """Generate MJPEG stream: one part per new frame, capped at `fps`, JPEG shared between viewers"""
+    try:
+        yield from streaming.mjpeg_frames(
+            camera.broker, fps=fps, quality=quality, stop=lambda: camera.stopped
+        )
+    except Exception as e:
+        print(f"⚠️ Error sending frame: {e}")
+    finally:
+        # Client went away: drop our reference so an unwatched camera is closed
+        camera.stop()
+
+async def agen(camera, fps=None, quality=None):
+    """gen() for ASGI workers: a viewer waiting for the next frame holds no thread"""
+    try:
+        async for part in streaming.amjpeg_frames(
+            camera.broker, fps=fps, quality=quality, stop=lambda: camera.stopped
+        ):
+            yield part
+    except Exception as e:
+        print(f"⚠️ Error sending frame: {e}")
+    finally:
+        # stop() may join the capture thread; keep that off the event loop
+        await asyncio.to_thread(camera.stop)
 
+@camera_sessions.refuse_when_full
 def qr_stream(request):
     """Start QR code scanning stream"""
     try:
         _ip = request.GET.get('ip')
         if not _ip:
             return HttpResponseServerError("Missing 'ip' parameter")
+        try:
+            ip = streaming.normalize_stream_url(_ip)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
 
-        global qr_camera, qr_detected_codes, qr_last_results
+        session = camera_sessions.get_session(request)
 
         # Clear previous QR camera and results
-        if qr_camera:
-            qr_camera.stop()
-        qr_camera = None
-        qr_detected_codes = []
-        qr_last_results = []
-
-        time.sleep(0.3)
+        if session.qr_camera:
+            session.stop_qr_camera()
+            time.sleep(0.3)
+        session.clear_qr()
 
-        # Handle IP formatting
-        if not _ip.startswith('http://'):
-            ip = "http://" + _ip.replace('_', '.')
-        else:
-            ip = _ip
-            
         print(f"📱 Starting QR scanner stream from: {ip}")
 
-        qr_camera = VideoCamera(ip, qr_enabled=True)
+        fps, quality = stream_options(request)
+        camera = VideoCamera(ip, qr_enabled=True)
+        session.set_qr_camera(camera)
+        frames = aqr_gen if aio.is_asgi(request) else qr_gen
         return StreamingHttpResponse(
-            qr_gen(qr_camera),
+            frames(camera, session, fps=fps, quality=quality),
             content_type="multipart/x-mixed-replace;boundary=frame"
         )
 
+    except camera_sessions.SessionLimitReached:
+        raise
     except Exception as e:
         print(f"❌ Error starting QR stream: {e}")
         return HttpResponseServerError(f"Failed to start QR streaming: {e}")
 
 def get_qr_results(request):
     """Get detected QR codes"""
-    global qr_detected_codes
+    session = camera_sessions.peek_session(request)
+    if session is None:
+        return JsonResponse({'qr_codes': []})
     # Return a copy to avoid modification during iteration
-    return JsonResponse({'qr_codes': qr_detected_codes.copy()})
+    with session.lock:
+        return JsonResponse({'qr_codes': list(session.qr_detected_codes)})
 
 def clear_qr_results(request):
     """Clear QR code results"""
-    global qr_detected_codes, qr_last_results
-    qr_detected_codes = []
-    qr_last_results = []
+    session = camera_sessions.peek_session(request)
+    if session is not None:
+        session.clear_qr()
     print("🧹 QR results cleared")
     return JsonResponse({'cleared': True})
 
 def stop_qr_stream(request):
     """Stop QR scanning stream"""
-    global qr_camera, qr_detected_codes, qr_last_results
-    if qr_camera:
-        qr_camera.stop()
-        qr_camera = None
-    qr_detected_codes = []
-    qr_last_results = []
+    session = camera_sessions.peek_session(request)
+    if session is not None:
+        session.stop_qr_camera()
+        session.clear_qr()
     print("🛑 QR stream stopped")
     return JsonResponse({'stopped': True})
 
@@ -524,20 +447,16 @@ def scan_qr_from_image(request):
         image_file = request.FILES['image']
         
         try:
-            # Read image
-            image_data = image_file.read()
-            nparr = np.frombuffer(image_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if frame is None:
+            # Decode straight to (reduced) grayscale and detect QR codes
+            try:
+                qr_codes = qr_pipeline.scan_image(image_file.read())
+            except ValueError:
                 return JsonResponse({'error': 'Invalid image file'})
             
-            # Detect QR codes
-            qr_codes, _ = detect_qr_codes(frame)
-            
-            # Update global QR codes
-            global qr_detected_codes
-            qr_detected_codes.extend(qr_codes)
+            # Add to this session's QR results (cookie-less scripts have none)
+            session = camera_sessions.peek_session(request)
+            if session is not None:
+                session.add_qr_codes(qr_codes, dedupe=False)
             
             return JsonResponse({'qr_codes': qr_codes})
             
@@ -550,76 +469,141 @@ def scan_qr_from_image(request):
 # ---------------------------- EXISTING FUNCTIONS ---------------------------- #
 def capture_frame(request):
     """Capture current frame and stop stream"""
-    global current_camera
-    if current_camera and current_camera.capture_frame():
-        current_camera.stop()
+    manager = camera_sessions.get_manager()
+    session = camera_sessions.peek_session(request)
+    if session is None:
+        return JsonResponse({'status': 'error', 'message': 'No active stream or frame not available'})
+    frame = session.camera.capture_frame() if session.camera else None
+    session.stop_camera()
+    if frame is not None:
+        manager.save_capture(session, frame)
         print("✅ Stream stopped after capture")
         return JsonResponse({'status': 'success', 'message': 'Frame captured and stream stopped'})
     else:
-        if current_camera:
-            current_camera.stop()
         return JsonResponse({'status': 'error', 'message': 'No active stream or frame not available'})
 
 def get_captured_frame(request):
     """Return captured frame as image"""
-    global latest_captured_frame, frame_captured
-    if frame_captured and latest_captured_frame is not None:
-        _, jpeg = cv2.imencode('.jpg', latest_captured_frame)
+    key = camera_sessions.session_key(request, create=False)
+    if key is None:
+        return HttpResponse(status=404)
+    manager = camera_sessions.get_manager()
+    session = manager.peek(key)
+    meta = manager.peek_capture(key)
+    if meta and meta.get('jpeg'):
+        return HttpResponse(meta['jpeg'], content_type='image/jpeg')
+    if session is not None and session.captured_frame is not None:
+        _, jpeg = cv2.imencode('.jpg', session.captured_frame)
         return HttpResponse(jpeg.tobytes(), content_type='image/jpeg')
     return HttpResponse(status=404)
 
 def is_streaming(request):
     """Check if camera stream is active"""
-    global current_camera
-    return JsonResponse({'active': current_camera is not None and not current_camera.stopped})
+    session = camera_sessions.peek_session(request)
+    camera = session.camera if session is not None else None
+    return JsonResponse({'active': camera is not None and not camera.stopped})
+
+def stream_stats(request):
+    """Per-stream fps, encode time and dropped-frame counters for this worker"""
+    return JsonResponse({
+        'streams': streaming.stream_stats(),
+        'cameras': streaming.active_brokers(),
+        'sessions': camera_sessions.get_manager().stats(),
+    })
+
+def event_stream(request):
+    """Server-sent events for live pages (replaces polling the QR, capture and job endpoints)
+
+    GET /api/events/?channels=camera,user,job:<id>
+      camera      QR detections and captures of this client's camera session
+      user        points updates and disposal jobs of the logged-in user
+      job:<id>    progress of one disposal job
+      user:<pk>, bin:<bin>   any user / bin (staff only)
+    Reconnects resume after the Last-Event-ID header (or ?last_event_id=).
+    503 when settings.EVENTS_SSE is off: pages poll the JSON endpoints instead.
+    """
+    if not settings.EVENTS_SSE:
+        return JsonResponse({'error': 'live events are disabled on this deployment, poll instead'}, status=503)
+    channels = []
+    for name in (request.GET.get('channels') or 'camera').split(','):
+        name = name.strip()
+        if name == 'camera':
+            key = camera_sessions.session_key(request, create=False)
+            if key is not None:  # no session yet, so nothing to hear about
+                channels.append(events.camera_channel(key))
+        elif name == 'user':
+            if not request.user.is_authenticated:
+                return JsonResponse({'error': 'login required for the user channel'}, status=403)
+            channels.append(events.user_channel(request.user.pk))
+        elif name.startswith('job:') and len(name) > 4:
+            channels.append(name)  # job ids are random uuids
+        elif name.startswith(('user:', 'bin:')) and request.user.is_staff:
+            channels.append(name)
+        elif name:
+            return JsonResponse({'error': f'unknown or forbidden channel {name!r}'}, status=403)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    subscription = events.get_broker().subscribe(channels, last_event_id=last_event_id)
+    stream = events.asse_stream if aio.is_asgi(request) else events.sse_stream
+    response = StreamingHttpResponse(
+        stream(subscription, heartbeat=settings.EVENTS_HEARTBEAT_SECONDS,
+               max_seconds=settings.EVENTS_MAX_STREAM_SECONDS),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
 
 def has_captured_frame(request):
     """Check if a frame is available"""
-    global frame_captured
-    return JsonResponse({'has_frame': frame_captured})
+    key = camera_sessions.session_key(request, create=False)
+    has_frame = key is not None and camera_sessions.get_manager().peek_capture(key) is not None
+    return JsonResponse({'has_frame': has_frame})
 
 def stop_stream(request):
     """Stop and clear everything"""
-    global current_camera, latest_captured_frame, frame_captured
-    if current_camera:
-        current_camera.stop()
-        current_camera = None
-    latest_captured_frame = None
-    frame_captured = False
+    session = camera_sessions.peek_session(request)
+    if session is not None:
+        session.stop_camera()
+        camera_sessions.get_manager().clear_capture(session)
     print("🛑 Stream and captured frame cleared.")
     return JsonResponse({'stopped': True})
 
 def clear_capture_state(request):
     """Force clear any captured frame state and ensure fresh start"""
-    global current_camera, latest_captured_frame, frame_captured
-    
-    print("🧹 Clearing capture state...")
+    manager = camera_sessions.get_manager()
+    session = camera_sessions.peek_session(request)
     
-    if current_camera:
-        try:
-            current_camera.stop()
-            current_camera = None
-            print("✅ Stopped existing camera")
-        except Exception as e:
-            print(f"⚠️ Error stopping camera: {e}")
-    
-    latest_captured_frame = None
-    frame_captured = False
-    
-    import gc
-    gc.collect()
+    if session is not None:
+        print(f"🧹 Clearing capture state for {session.key}...")
+        
+        if session.camera:
+            try:
+                session.stop_camera()
+                print("✅ Stopped existing camera")
+            except Exception as e:
+                print(f"⚠️ Error stopping camera: {e}")
+        
+        manager.clear_capture(session)
+    manager.evict_idle()
     
-    print("✅ Capture state cleared - latest_captured_frame:", latest_captured_frame, "frame_captured:", frame_captured)
+    print("✅ Capture state cleared")
     
     return JsonResponse({
         'cleared': True, 
         'message': 'Capture state reset successfully',
-        'frame_captured': frame_captured,
-        'has_camera': current_camera is not None
+        'frame_captured': False,
+        'has_camera': session is not None and session.camera is not None
     })
 
 
 @csrf_exempt
+@idempotent('hardware_dispose')
 def hardware_dispose(request):
     """Endpoint for hardware (or frontend) to report a disposal event.
 
@@ -693,35 +677,14 @@ def hardware_dispose(request):
             except Exception:
                 detected_issue = None
 
-        # Create WasteRecord
-        record = WasteRecord.objects.create(
-            user=user,
+        # Create WasteRecord and update profile stats in one transaction
+        record, _ = points_ledger.record_disposal(
+            user, waste_type, points,
             bin=bin_obj,
             detected_issue=detected_issue,
-            waste_type=waste_type,
             weight_kg=weight,
-            points_earned=points
         )
 
-        # Update user profile stats
-        profile, _ = UserProfile.objects.get_or_create(user=user)
-        profile.total_points = profile.total_points + points
-        profile.total_waste_disposed = profile.total_waste_disposed + 1
-        if waste_type == 'plastic':
-            profile.plastic_count += 1
-        elif waste_type == 'paper':
-            profile.paper_count += 1
-        elif waste_type == 'metal':
-            profile.metal_count += 1
-        elif waste_type == 'glass':
-            profile.glass_count += 1
-        profile.save()
-        try:
-            profile.update_level()
-        except Exception:
-            # Non-fatal if update_level fails
-            pass
-
         # Mark detected issue as processed & award points on it
         if detected_issue:
             if not detected_issue.is_processed:
@@ -735,4 +698,209 @@ def hardware_dispose(request):
 
     except Exception as e:
         traceback.print_exc()
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+def _parse_batch(request):
+    """JSON array, {"bin_id": ..., "events": [...]} or NDJSON (one event per line)"""
+    body = request.body.decode('utf-8')
+    content_type = request.content_type or ''
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return {}, [json.loads(line) for line in body.splitlines() if line.strip()]
+    data = json.loads(body)
+    if isinstance(data, list):
+        return {}, data
+    return data, data.get('events') or []
+
+
+def _event_time(event):
+    value = event.get('disposed_at') or event.get('timestamp')
+    if value in (None, ''):
+        return timezone.now()
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f"bad disposed_at {value!r}")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _record_disposals_each(pending):
+    """
+    record_disposals() per event. Returns (records, awards, errors): records
+    holds None for duplicates, errors maps event positions to messages.
+    """
+    records, awards, errors = [], {}, {}
+    for n, event in enumerate(pending):
+        try:
+            [record], award = points_ledger.record_disposals([event])
+        except IntegrityError as e:
+            record, award = None, {}
+            if not (event['event_id'] and WasteRecord.objects.filter(event_id=event['event_id']).exists()):
+                errors[n] = f'could not record event: {e}'
+        records.append(record)
+        awards.update(award)
+    return records, awards, errors
+
+
+@csrf_exempt
+def hardware_dispose_batch(request):
+    """Batch version of hardware_dispose for bins that buffer events while offline.
+
+    POST a JSON array of events, {"bin_id": "BIN-001", "events": [...]} or
+    NDJSON (Content-Type: application/x-ndjson). Each event takes the
+    hardware_dispose fields plus:
+      - event_id (client idempotency key, unique per event; repeats are skipped)
+      - disposed_at (ISO-8601 or unix timestamp; defaults to now)
+
+    Users and bins are resolved with one query each, records are inserted
+    with bulk_create and each user's profile is updated once. Returns a
+    result per event, in order.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=400)
+
+    try:
+        defaults, events = _parse_batch(request)
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'error': f'invalid batch: {e}'}, status=400)
+    if not isinstance(events, list):
+        return JsonResponse({'error': 'events must be a list of objects'}, status=400)
+    if len(events) > settings.HARDWARE_BATCH_MAX_EVENTS:
+        return JsonResponse({'error': f'at most {settings.HARDWARE_BATCH_MAX_EVENTS} events per batch'}, status=413)
+
+    started = time.perf_counter()
+    default_bin = defaults.get('bin_id') or defaults.get('bin')
+
+    # Malformed events are rejected one by one below; the lookups just skip them
+    def user_pk(event):
+        try:
+            return int(event.get('user_id') or event.get('user'))
+        except (AttributeError, TypeError, ValueError, OverflowError):
+            return None
+
+    def bin_code(event):
+        code = ((event.get('bin_id') or event.get('bin')) if isinstance(event, dict) else None) or default_bin
+        return code if isinstance(code, str) else None
+
+    users = User.objects.in_bulk({pk for pk in map(user_pk, events) if pk is not None})
+    bin_codes = set(map(bin_code, events)) - {None, ''}
+    bins = Bin.objects.in_bulk(bin_codes, field_name='bin_id') if bin_codes else {}
+
+    results = [None] * len(events)
+    pending, positions = [], []
+    for i, event in enumerate(events):
+        event_id = (event.get('event_id') or event.get('idempotency_key')) if isinstance(event, dict) else None
+        result = {'index': i, 'event_id': event_id}
+        results[i] = result
+        try:
+            if not isinstance(event, dict):
+                raise ValueError('event must be an object')
+            user = users.get(user_pk(event))
+            if user is None:
+                raise ValueError('user not found')
+            code = event.get('bin_id') or event.get('bin') or default_bin
+            if code and code != bin_code(event):
+                raise ValueError('bin_id must be a string')
+            if code and code not in bins:
+                raise ValueError('bin not found')
+            if event_id is not None and (not isinstance(event_id, str) or len(event_id) > 64):
+                raise ValueError('event_id must be a string of at most 64 characters')
+
+            waste_type = event.get('waste_type') or event.get('type') or 'other'
+            if not isinstance(waste_type, str):
+                raise ValueError('waste_type must be a string')
+            waste_type = waste_type.lower()
+            weight = event.get('weight_kg') or event.get('weight')
+            weight = float(weight) if weight not in (None, '') else None
+            if event.get('points_earned') or event.get('points'):
+                points = int(event.get('points_earned') or event.get('points'))
+            else:
+                points = calculate_points(waste_type, weight)
+
+            pending.append({
+                'user_id': user.pk,
+                'bin': bins.get(code),
+                'waste_type': waste_type,
+                'weight_kg': weight,
+                'points_earned': points,
+                'disposed_at': _event_time(event),
+                'event_id': event_id or None,
+            })
+            positions.append(i)
+        except (TypeError, ValueError, OverflowError, OSError) as e:
+            # OverflowError / OSError: numbers (timestamps, points) out of range
+            result.update(status='error', error=str(e))
+
+    failed = {}
+    try:
+        try:
+            records, awards = points_ledger.record_disposals(pending)
+        except IntegrityError:
+            # A concurrent upload committed one of our event_ids first; the retry sees it as a duplicate
+            records, awards = points_ledger.record_disposals(pending)
+    except IntegrityError:
+        # Still conflicting (several uploads racing): one event at a time, so only the conflicts fail
+        records, awards, failed = _record_disposals_each(pending)
+
+    for n, (i, record) in enumerate(zip(positions, records)):
+        if n in failed:
+            results[i].update(status='error', error=failed[n])
+        elif record is None:
+            results[i]['status'] = 'duplicate'
+        else:
+            results[i].update(status='created', record_id=record.pk, points_earned=record.points_earned)
+
+    counts = {status: sum(r['status'] == status for r in results) for status in ('created', 'duplicate', 'error')}
+    metrics.counter('hardware.batch.events').inc(len(events))
+    metrics.counter('hardware.batch.duplicates').inc(counts['duplicate'])
+    metrics.histogram('hardware.batch.ms').observe((time.perf_counter() - started) * 1000)
+    print(f"📦 Hardware batch: {len(events)} events, {counts['created']} created, "
+          f"{counts['duplicate']} duplicates, {counts['error']} errors")
+
+    return JsonResponse({
+        'success': True,
+        'created': counts['created'],
+        'duplicates': counts['duplicate'],
+        'errors': counts['error'],
+        'results': results,
+        'profiles': {
+            str(user_id): {'total_points': a.total_points, 'level': a.level}
+            for user_id, a in awards.items()
+        },
+    })
+
+
+@csrf_exempt
+def hardware_telemetry(request):
+    """Sensor samples from ESP32 bins (fill levels, battery, RSSI, lid cycles).
+
+    Compact form, one message per bin with many samples:
+      {"b": "BIN-001", "s": [[unix_ts, plastic, paper, metal, glass, battery, rssi, lid_cycles], ...]}
+    A verbose single sample ({"bin_id": ..., "plastic_level": ...}), a JSON
+    array of messages and NDJSON are accepted too. Trailing compact values and
+    null entries may be omitted. Samples are appended to BinTelemetry and each
+    bin's capacity / *_full / status / last_online follow its newest sample.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=400)
+
+    try:
+        body = request.body.decode('utf-8')
+        if 'ndjson' in (request.content_type or '') or 'jsonl' in (request.content_type or ''):
+            payload = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = json.loads(body)
+        samples = telemetry.parse_payload(payload)
+    except (ValueError, UnicodeDecodeError) as e:
+        return JsonResponse({'error': f'invalid telemetry: {e}'}, status=400)
+    if len(samples) > settings.TELEMETRY_MAX_SAMPLES:
+        return JsonResponse({'error': f'at most {settings.TELEMETRY_MAX_SAMPLES} samples per request'}, status=413)
+
+    bin_pks = telemetry.resolve_bins({code for code, _ in samples})
+    unknown = sorted({code for code, _ in samples} - bin_pks.keys())
+    if unknown:
+        metrics.counter('telemetry.unknown_bin').inc(len(unknown))
+        return JsonResponse({'error': 'bin not found', 'bins': unknown}, status=404)
+
+    accepted = telemetry.ingest([(bin_pks[code], sample) for code, sample in samples])
+    return JsonResponse({'success': True, 'accepted': accepted}, status=202)
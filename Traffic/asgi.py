@@ -3,6 +3,10 @@ ASGI config for Traffic project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with `SERVER_MODE=asgi gunicorn Traffic.asgi` (see gunicorn.conf.py)
+or `uvicorn Traffic.asgi:application`. Streaming views switch to async
+generators when served through this entry point.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -14,3 +18,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Traffic.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.MODEL_PRELOAD:
+    # As in wsgi.py: read the model file before gunicorn forks the uvicorn workers, which
+    # build and warm the model in post_fork. Plain uvicorn (no fork) builds it on first use.
+    from Light import model_registry  # noqa: E402
+
+    model_registry.preload()
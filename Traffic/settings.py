@@ -33,9 +33,119 @@ CORS_ALLOW_ALL_ORIGINS = True
 ESP32_CAM_IP = config('ESP32_CAM_IP', default='192.168.4.1')
 ESP32_WROOM_IP = config('ESP32_WROOM_IP', default='192.168.4.81')
 
+# Single-frame captures use the camera's still endpoint (default http://<ESP32_CAM_IP>/capture,
+# derived from the stream URL). CAMERA_KEEP_WARM keeps the MJPEG stream open between
+# disposals so captures just wait for the next decoded frame.
+ESP32_CAM_SNAPSHOT_URL = config('ESP32_CAM_SNAPSHOT_URL', default=None)
+CAMERA_KEEP_WARM = config('CAMERA_KEEP_WARM', default=False, cast=bool)
+
+# Bin control client: retries with exponential backoff, then a circuit breaker marks the
+# bin offline for BIN_OFFLINE_RETRY_SECONDS after BIN_FAILURE_THRESHOLD failed commands
+BIN_COMMAND_RETRIES = config('BIN_COMMAND_RETRIES', default=2, cast=int)
+BIN_COMMAND_BACKOFF = config('BIN_COMMAND_BACKOFF', default=0.2, cast=float)
+BIN_FAILURE_THRESHOLD = config('BIN_FAILURE_THRESHOLD', default=3, cast=int)
+BIN_OFFLINE_RETRY_SECONDS = config('BIN_OFFLINE_RETRY_SECONDS', default=30, cast=float)
+# Disposal jobs send lid / compartment commands as coroutines on a background event loop,
+# so a slow or offline bin does not hold a DISPOSAL_WORKERS thread while it retries
+BIN_ASYNC_COMMANDS = config('BIN_ASYNC_COMMANDS', default=True, cast=bool)
+
+# Largest batch a bin may upload to /api/hardware/dispose/batch/ in one request
+HARDWARE_BATCH_MAX_EVENTS = config('HARDWARE_BATCH_MAX_EVENTS', default=500, cast=int)
+
+# Nearest-bin search keeps bin positions in an in-memory grid per worker; it is rebuilt
+# when a bin is saved in that worker and at least every BIN_INDEX_TTL seconds
+BIN_INDEX_TTL = config('BIN_INDEX_TTL', default=60, cast=int)
+
+# Bin telemetry (/api/hardware/telemetry/). With TELEMETRY_BUFFERED samples are acknowledged
+# once queued and written by a background thread every TELEMETRY_FLUSH_SECONDS or
+# TELEMETRY_BATCH_SIZE samples (a crashed worker loses what it had queued). A compartment at
+# BIN_FULL_PERCENT or more is marked full. rollup_bin_telemetry folds raw samples older than
+# TELEMETRY_RAW_RETENTION_HOURS into hourly rows.
+TELEMETRY_BUFFERED = config('TELEMETRY_BUFFERED', default=False, cast=bool)
+TELEMETRY_BATCH_SIZE = config('TELEMETRY_BATCH_SIZE', default=500, cast=int)
+TELEMETRY_FLUSH_SECONDS = config('TELEMETRY_FLUSH_SECONDS', default=1.0, cast=float)
+TELEMETRY_MAX_SAMPLES = config('TELEMETRY_MAX_SAMPLES', default=2000, cast=int)
+TELEMETRY_RAW_RETENTION_HOURS = config('TELEMETRY_RAW_RETENTION_HOURS', default=48, cast=int)
+BIN_FULL_PERCENT = config('BIN_FULL_PERCENT', default=90, cast=int)
+
+# Disposal endpoints replay the stored response for a repeated Idempotency-Key for
+# IDEMPOTENCY_TTL seconds; an unfinished claim is released after IDEMPOTENCY_LOCK_SECONDS
+IDEMPOTENCY_TTL = config('IDEMPOTENCY_TTL', default=86400, cast=int)
+IDEMPOTENCY_LOCK_SECONDS = config('IDEMPOTENCY_LOCK_SECONDS', default=60, cast=int)
+
+# /api/metrics/ is for staff, or scrapers sending "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# MJPEG streaming defaults (clients can lower them with ?fps= and ?quality=)
+STREAM_MAX_FPS = config('STREAM_MAX_FPS', default=15, cast=float)
+STREAM_JPEG_QUALITY = config('STREAM_JPEG_QUALITY', default=80, cast=int)
+
+# Camera sessions (one per bin / operator): live feed, captured frame and QR results.
+# CAMERA_SESSION_STORE='cache' keeps captured frames in CACHES[CAMERA_SESSION_CACHE]
+# so every gunicorn worker sees them (needs a shared cache such as Redis/Memcached).
+CAMERA_SESSION_STORE = config('CAMERA_SESSION_STORE', default='memory')
+CAMERA_SESSION_CACHE = config('CAMERA_SESSION_CACHE', default='default')
+CAMERA_SESSION_MAX = config('CAMERA_SESSION_MAX', default=32, cast=int)
+CAMERA_SESSION_IDLE_TIMEOUT = config('CAMERA_SESSION_IDLE_TIMEOUT', default=600, cast=int)
+# Named sessions (?session=BIN-001) are for staff, or devices sending this in X-Camera-Token
+CAMERA_SESSION_TOKEN = config('CAMERA_SESSION_TOKEN', default='')
+
+# QR payload -> user lookup cache for the LED disposal screen. Without QR_AUTH_CACHE_BACKEND each
+# worker invalidates only its own entries (others catch up within QR_AUTH_CACHE_TTL); set it to a
+# shared CACHES alias (e.g. 'default' on Redis) so profile/password changes reach every worker at once.
+QR_AUTH_CACHE_SIZE = config('QR_AUTH_CACHE_SIZE', default=1024, cast=int)
+QR_AUTH_CACHE_TTL = config('QR_AUTH_CACHE_TTL', default=300, cast=int)
+QR_AUTH_CACHE_BACKEND = config('QR_AUTH_CACHE_BACKEND', default='')
+
+# QR screen auto-disposal jobs (open lid -> capture -> classify -> sort -> record) run on a
+# small worker pool; progress is served by /api/qr/status/?job=<id>. Use
+# DISPOSAL_JOB_STORE='cache' with a shared cache when running several gunicorn workers.
+DISPOSAL_WORKERS = config('DISPOSAL_WORKERS', default=4, cast=int)
+DISPOSAL_PLACE_SECONDS = config('DISPOSAL_PLACE_SECONDS', default=5, cast=float)
+DISPOSAL_DROP_SECONDS = config('DISPOSAL_DROP_SECONDS', default=2, cast=float)
+DISPOSAL_JOB_STORE = config('DISPOSAL_JOB_STORE', default='memory')
+DISPOSAL_JOB_CACHE = config('DISPOSAL_JOB_CACHE', default='default')
+DISPOSAL_JOB_TTL = config('DISPOSAL_JOB_TTL', default=600, cast=int)
+
+# Live events (/api/events/, server-sent events) for QR detections, captures, disposal job
+# progress and points. EVENTS_BACKEND='redis' (needs the redis package and EVENTS_REDIS_URL)
+# shares events between gunicorn workers; 'memory' only reaches clients of the same process.
+# Each open stream holds a worker thread, so streams end after EVENTS_MAX_STREAM_SECONDS and
+# the browser reconnects, resuming from the last of EVENTS_HISTORY events kept per channel.
+EVENTS_BACKEND = config('EVENTS_BACKEND', default='memory')
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default='redis://localhost:6379/0')
+EVENTS_HISTORY = config('EVENTS_HISTORY', default=100, cast=int)
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=256, cast=int)
+EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15, cast=float)
+EVENTS_MAX_STREAM_SECONDS = config('EVENTS_MAX_STREAM_SECONDS', default=300, cast=float)
+# Pages only open /api/events/ where it works at scale: streams reach every worker (redis), or
+# one ASGI worker holds them on its event loop. Otherwise /api/events/ answers 503, the kiosk pages
+# poll as they always did and the user dashboard keeps its rendered totals.
+# SERVER_MODE and WEB_CONCURRENCY are the same variables gunicorn.conf.py reads.
+EVENTS_SSE = config(
+    'EVENTS_SSE',
+    default=EVENTS_BACKEND == 'redis' or (
+        config('SERVER_MODE', default='wsgi') == 'asgi' and config('WEB_CONCURRENCY', default=2, cast=int) == 1
+    ),
+    cast=bool,
+)
+
 # Model Configuration
 MODEL_PATH = config('MODEL_PATH', default='waste_classifier_final.keras')
 
+# Inference backend: 'keras' (default), 'tflite' or 'onnx'. For tflite/onnx point MODEL_PATH
+# at the artifact produced by `python manage.py convert_model`.
+INFERENCE_BACKEND = config('INFERENCE_BACKEND', default='keras')
+INFERENCE_THREADS = config('INFERENCE_THREADS', default=0, cast=int)  # 0 = runtime default
+
+# Batched inference: concurrent classifications are coalesced into one predict call
+INFERENCE_MAX_BATCH_SIZE = config('INFERENCE_MAX_BATCH_SIZE', default=8, cast=int)
+INFERENCE_MAX_WAIT_MS = config('INFERENCE_MAX_WAIT_MS', default=5, cast=float)
+
+# The model loads lazily on first prediction. Set MODEL_PRELOAD=True to read the model file
+# once in the gunicorn master (preload_app, WSGI or ASGI) and build it in each worker at boot.
+MODEL_PRELOAD = config('MODEL_PRELOAD', default=False, cast=bool)
+
 
 # Application definition
 
@@ -78,6 +188,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'Light.context_processors.live_events',
             ],
         },
     },
@@ -106,6 +217,17 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Concurrent disposals write from several threads: take the write
+            # lock at BEGIN and wait for it instead of failing with "database is locked"
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # File-backed test database so threaded tests get real locking
+            # (the shared in-memory database raises "table is locked" instead of waiting)
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Traffic.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.MODEL_PRELOAD:
+    # With gunicorn --preload this runs once in the master, before workers fork. It only
+    # reads the model file; each worker builds and warms the model in post_fork.
+    from Light import model_registry  # noqa: E402
+
+    model_registry.preload()
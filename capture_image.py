@@ -1,30 +1,25 @@
 import cv2
 
-def capture_image_from_stream(stream_url, output_file="captured_image.jpg"):
-    """
-    Opens the camera stream, captures one frame, saves it, and closes the stream.
+from Light.snapshot import capture_snapshot
+
+
+def capture_image_from_stream(stream_url, output_file="captured_image.jpg", snapshot_url=None):
     """
-    print(f"📡 Connecting to stream: {stream_url}")
-    cap = cv2.VideoCapture(stream_url)
+    Captures one fresh frame and saves it.
 
-    if not cap.isOpened():
-        print("❌ Error: Unable to open stream.")
-        return False
+    Uses the camera's still endpoint (http://<cam>/capture) and only opens
+    the MJPEG stream as a fallback, see Light/snapshot.py.
+    """
+    print(f"📡 Capturing snapshot for: {stream_url}")
+    snap = capture_snapshot(stream_url, snapshot_url=snapshot_url)
 
-    # Try to read a frame
-    ret, frame = cap.read()
-    if not ret:
+    if snap is None:
         print("❌ Error: Failed to capture frame.")
-        cap.release()
         return False
 
     # Save the frame as an image
-    cv2.imwrite(output_file, frame)
-    print(f"✅ Image captured and saved as '{output_file}'")
-
-    # Release the stream
-    cap.release()
-    cv2.destroyAllWindows()
+    cv2.imwrite(output_file, snap.frame)
+    print(f"✅ Image captured via {snap.source} and saved as '{output_file}'")
     return True
 
 
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for TRASH2CASH
+
+Usage: gunicorn Traffic.wsgi  (this file is picked up automatically)
+
+SERVER_MODE=asgi serves Traffic.asgi on uvicorn workers (uvicorn-worker
+package) instead: MJPEG feeds, /api/events/ streams and chatbot calls then
+wait on the event loop rather than each holding one of the GUNICORN_THREADS
+threads.
+
+Set MODEL_PRELOAD=True to read the waste classifier once in the master
+process (WSGI and ASGI); each worker then builds and warms the model in
+post_fork, before it takes requests. The master never starts TensorFlow /
+ONNX Runtime: their thread pools don't survive fork(). Leave it off for
+admin-only or mobile-API workers, which never need the model.
+"""
+
+# Not imported as `config`: gunicorn reads every module-level name here as a setting
+import decouple
+
+bind = f"0.0.0.0:{decouple.config('PORT', default='8000')}"
+workers = decouple.config('WEB_CONCURRENCY', default=2, cast=int)
+timeout = decouple.config('GUNICORN_TIMEOUT', default=120, cast=int)
+
+# Long-lived responses (MJPEG feeds, /api/events/ streams) each hold a thread;
+# with threads > 1 gunicorn uses the gthread worker so they don't block a whole worker
+threads = decouple.config('GUNICORN_THREADS', default=8, cast=int)
+
+preload_app = decouple.config('MODEL_PRELOAD', default=False, cast=bool)
+
+if decouple.config('SERVER_MODE', default='wsgi') == 'asgi':
+    wsgi_app = 'Traffic.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+
+
+def post_fork(server, worker):
+    # MODEL_PRELOAD: the master only read the model file; build and warm it in the worker
+    if preload_app:
+        from Light import model_registry
+
+        model_registry.warm_up()
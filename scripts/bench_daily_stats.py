@@ -0,0 +1,130 @@
+"""
+Daily rollup vs raw WasteRecord aggregation benchmark
+
+Seeds a throwaway test database with one heavy recycler owning --records
+disposals spread over --days days (plus background users), builds the
+UserDailyStats rollup, then times the dashboard/profile/history stat queries
+both ways:
+
+  weekly    per-day counts for the last 7 days (user_dashboard)
+  monthly   items + points for the last 30 days (user_profile)
+  history   totals + 4 per-type counts over all time (waste_history)
+
+Usage: python scripts/bench_daily_stats.py [--records 10000 1000000] [--days 730] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Traffic.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Q, Sum  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from Light import daily_stats  # noqa: E402
+from Light.models import UserDailyStats, WasteRecord  # noqa: E402
+
+WASTE_TYPES = ['plastic', 'paper', 'metal', 'glass', 'cardboard', 'trash']
+
+
+def seed(count, days, background_users=20):
+    User = get_user_model()
+    WasteRecord.objects.all().delete()
+    UserDailyStats.objects.all().delete()
+    User.objects.all().delete()
+    heavy = User.objects.create(username='heavy')
+    others = [User.objects.create(username=f'user{i}') for i in range(background_users)]
+
+    rng = random.Random(0)
+    now = timezone.now()
+    batch = []
+    for i in range(count + count // 4):
+        user = heavy if i < count else rng.choice(others)
+        batch.append(WasteRecord(
+            user=user, waste_type=rng.choice(WASTE_TYPES), points_earned=rng.choice([5, 8, 10, 12, 15]),
+            weight_kg=round(rng.uniform(0.01, 0.5), 3), disposed_at=now - timedelta(seconds=rng.uniform(0, days * 86400)),
+        ))
+        if len(batch) == 10000:
+            WasteRecord.objects.bulk_create(batch)
+            batch = []
+    WasteRecord.objects.bulk_create(batch)
+    return heavy
+
+
+def raw_queries(user):
+    now = timezone.now()
+    records = WasteRecord.objects.filter(user=user)
+    return {
+        'weekly': lambda: list(records.filter(disposed_at__gte=now - timedelta(days=7))
+                               .values('disposed_at__date').annotate(count=Count('id')).order_by('disposed_at__date')),
+        'monthly': lambda: records.filter(disposed_at__gte=now - timedelta(days=30))
+                                  .aggregate(total_items=Count('id'), total_points=Sum('points_earned')),
+        'history': lambda: records.aggregate(
+            total_items=Count('id'), total_points=Sum('points_earned'),
+            **{t: Count('id', filter=Q(waste_type=t)) for t in daily_stats.TYPE_FIELDS}),
+    }
+
+
+def rollup_queries(user):
+    today = timezone.localdate()
+    return {
+        'weekly': lambda: list(UserDailyStats.objects.filter(user=user, date__gte=today - timedelta(days=7))
+                               .values('date', 'items').order_by('date')),
+        'monthly': lambda: daily_stats.totals(user, date_from=today - timedelta(days=30)),
+        'history': lambda: daily_stats.totals(user),
+    }
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return np.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    test_db = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    print(f"Using throwaway database {test_db}\n")
+    try:
+        for count in args.records:
+            started = time.perf_counter()
+            user = seed(count, args.days)
+            seeded = time.perf_counter() - started
+            started = time.perf_counter()
+            rows = daily_stats.rebuild()
+            rebuilt = time.perf_counter() - started
+            print(f"== {count:,} records for one user (seed {seeded:.1f}s, rebuild {rows:,} rollup rows in {rebuilt:.1f}s)")
+
+            raw, rolled = raw_queries(user), rollup_queries(user)
+            for name in raw:
+                before, after = timed(raw[name], args.repeat), timed(rolled[name], args.repeat)
+                print(f"   {name:<8} raw {before:8.2f} ms   rollup {after:6.2f} ms   {before / after:6.1f}x")
+            print()
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Latency / throughput benchmark: Keras vs converted TFLite / ONNX artifacts
+
+Usage:
+    python manage.py convert_model --format tflite --quantize float16
+    python scripts/bench_inference_backends.py \
+        --keras waste_classifier_final.keras \
+        --tflite waste_classifier_final.float16.tflite --threads 4
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Light.inference_backends import create_backend  # noqa: E402
+
+
+def bench(backend, batch_size, iterations):
+    batch = np.random.default_rng(0).uniform(0, 255, (batch_size, 224, 224, 3)).astype(np.float32)
+    for _ in range(3):
+        backend.predict(batch)  # warm-up
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        backend.predict(batch)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'p50': statistics.median(timings),
+        'p95': timings[int(0.95 * (len(timings) - 1))],
+        'img_per_s': batch_size * 1000 / statistics.mean(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inference backends')
+    parser.add_argument('--keras', default='waste_classifier_final.keras')
+    parser.add_argument('--tflite', default=None)
+    parser.add_argument('--onnx', default=None)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--batch-sizes', default='1,8')
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    targets = [('keras', args.keras), ('tflite', args.tflite), ('onnx', args.onnx)]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+
+    print(f"{'backend':<8} {'batch':>5} {'p50 ms':>9} {'p95 ms':>9} {'img/s':>9}")
+    print("-" * 44)
+    for name, path in targets:
+        if not path:
+            continue
+        backend = create_backend(name, path, num_threads=args.threads)
+        for batch_size in batch_sizes:
+            r = bench(backend, batch_size, args.iterations)
+            print(f"{name:<8} {batch_size:>5} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['img_per_s']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Nearest-bin search benchmark
+
+Generates --bins synthetic bins around Lahore (clustered like a city
+rollout) and times k-nearest queries from random user positions:
+
+  brute_python  haversine to every bin + sort (what shipping all bins implies)
+  brute_numpy   vectorised haversine + argpartition
+  grid          Light.bin_index.BinGridIndex ring search
+
+Usage: python scripts/bench_nearby_bins.py [--bins 100000] [--queries 200] [--k 10]
+"""
+
+import argparse
+import itertools
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Light.bin_index import EARTH_RADIUS_KM, BinGridIndex, haversine_km  # noqa: E402
+
+CENTRE = (31.5204, 74.3587)
+
+
+def synthetic_bins(count, seed=0):
+    rng = random.Random(seed)
+    hubs = [(CENTRE[0] + rng.gauss(0, 0.12), CENTRE[1] + rng.gauss(0, 0.12)) for _ in range(40)]
+    points = []
+    for pk in range(count):
+        if rng.random() < 0.8:
+            lat, lng = rng.choice(hubs)
+            points.append((pk, lat + rng.gauss(0, 0.02), lng + rng.gauss(0, 0.02)))
+        else:
+            points.append((pk, CENTRE[0] + rng.uniform(-0.4, 0.4), CENTRE[1] + rng.uniform(-0.4, 0.4)))
+    return points
+
+
+def timed(name, fn, queries):
+    times = []
+    results = []
+    for lat, lng in queries:
+        started = time.perf_counter()
+        results.append(fn(lat, lng))
+        times.append((time.perf_counter() - started) * 1000)
+    times = np.array(times)
+    print(f"{name:<13} mean {times.mean():8.3f} ms   p95 {np.percentile(times, 95):8.3f} ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bins', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    points = synthetic_bins(args.bins)
+    started = time.perf_counter()
+    index = BinGridIndex(points)
+    print(f"{args.bins:,} bins, {len(index.cells):,} occupied cells, index built in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms\n")
+
+    rng = random.Random(1)
+    queries = [(CENTRE[0] + rng.uniform(-0.3, 0.3), CENTRE[1] + rng.uniform(-0.3, 0.3)) for _ in range(args.queries)]
+    k = args.k
+
+    lats = np.radians([p[1] for p in points])
+    lngs = np.radians([p[2] for p in points])
+    pks = np.array([p[0] for p in points])
+
+    def brute_python(lat, lng):
+        return [pk for _, pk in sorted((haversine_km(lat, lng, plat, plng), pk) for pk, plat, plng in points)[:k]]
+
+    def brute_numpy(lat, lng):
+        phi, lmb = np.radians(lat), np.radians(lng)
+        a = np.sin((lats - phi) / 2) ** 2 + np.cos(phi) * np.cos(lats) * np.sin((lngs - lmb) / 2) ** 2
+        d = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+        nearest = np.argpartition(d, k)[:k]
+        return list(pks[nearest[np.argsort(d[nearest])]])
+
+    def grid(lat, lng):
+        return [pk for _, pk in itertools.islice(index.nearest(lat, lng), k)]
+
+    expected = timed('brute_python', brute_python, queries[:20])
+    timed('brute_numpy', brute_numpy, queries)
+    got = timed('grid', grid, queries)
+    mismatches = sum(e != g for e, g in zip(expected, got))
+    print(f"\ngrid vs brute force: {mismatches} mismatching result lists out of {len(expected)}")
+
+
+if __name__ == '__main__':
+    main()
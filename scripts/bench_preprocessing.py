@@ -0,0 +1,84 @@
+"""
+Per-image preprocessing micro-benchmark
+
+Compares the old upload path (save to disk, Keras load_img from disk) with
+the shared in-memory pipeline in Light/preprocessing.py, for a few typical
+frame sizes and batch sizes.
+
+Usage: python scripts/bench_preprocessing.py [--iterations 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Light.preprocessing import batch_buffer, preprocess_batch  # noqa: E402
+
+SIZES = [(640, 480), (1280, 720), (1600, 1200)]
+
+
+def synthetic_jpeg(width, height):
+    rng = np.random.default_rng(width)
+    img = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+
+
+def per_image_ms(fn, iterations, images_per_call=1):
+    fn()  # warm-up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) * 1000 / (iterations * images_per_call)
+
+
+def legacy_disk_path(jpeg, tmpdir):
+    from tensorflow.keras.preprocessing import image
+
+    def run():
+        path = os.path.join(tmpdir, 'upload.jpg')
+        with open(path, 'wb') as f:
+            f.write(jpeg)
+        arr = image.img_to_array(image.load_img(path, target_size=(224, 224)))
+        return np.expand_dims(arr, axis=0)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Preprocessing micro-benchmark')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--skip-legacy', action='store_true', help='Skip the TensorFlow load_img baseline')
+    args = parser.parse_args()
+
+    print(f"{'input':<12} {'path':<28} {'ms/image':>9}")
+    print("-" * 52)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for width, height in SIZES:
+            jpeg = synthetic_jpeg(width, height)
+            frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            label = f"{width}x{height}"
+
+            if not args.skip_legacy:
+                ms = per_image_ms(legacy_disk_path(jpeg, tmpdir), args.iterations)
+                print(f"{label:<12} {'disk + keras load_img':<28} {ms:>9.3f}")
+
+            ms = per_image_ms(lambda: preprocess_batch([jpeg], out=batch_buffer(1)), args.iterations)
+            print(f"{label:<12} {'bytes -> buffer':<28} {ms:>9.3f}")
+
+            ms = per_image_ms(lambda: preprocess_batch([frame], out=batch_buffer(1)), args.iterations)
+            print(f"{label:<12} {'BGR frame -> buffer':<28} {ms:>9.3f}")
+
+            frames = [frame] * 8
+            ms = per_image_ms(lambda: preprocess_batch(frames, out=batch_buffer(8)), args.iterations, 8)
+            print(f"{label:<12} {'8 frames -> buffer':<28} {ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
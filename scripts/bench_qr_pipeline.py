@@ -0,0 +1,95 @@
+"""
+QR scan benchmark for /api/qr/scan/
+
+Replays a corpus of captured frames (a directory of JPEGs, in file-name
+order, e.g. saved from qr_disposal_screen.html) through the old scan path
+(full colour decode, cvtColor, full-frame decode) and the QRScanner pipeline
+in Light/qr_pipeline.py (reduced grayscale decode, adaptive downscale, ROI,
+duplicate-frame skip). Without --corpus a synthetic session is generated:
+idle frames, then a phone held in front of the camera with slight jitter.
+
+Usage: python scripts/bench_qr_pipeline.py [--corpus frames/] [--frames 120] [--size 1280x720]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Light import qr_pipeline  # noqa: E402
+
+
+def synthetic_corpus(frames, width, height):
+    rng = np.random.default_rng(0)
+    code = cv2.QRCodeEncoder.create().encode('12345-1234567-1')
+    code = cv2.resize(code, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    background = cv2.GaussianBlur(rng.integers(60, 200, (height, width), dtype=np.uint8), (31, 31), 0)
+    corpus = []
+    for i in range(frames):
+        scene = background.copy()
+        if i >= frames // 3:
+            # Phone in view, jittering a few pixels between polls
+            y = height // 3 + int(rng.integers(-4, 5))
+            x = width // 3 + int(rng.integers(-4, 5))
+            scene[y:y + code.shape[0], x:x + code.shape[1]] = code
+        noise = rng.normal(0, 1.5, scene.shape)
+        frame = np.clip(scene + noise, 0, 255).astype(np.uint8)
+        corpus.append(cv2.imencode('.jpg', cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))[1].tobytes())
+        if i % 4 == 0:
+            corpus.append(corpus[-1])  # client polled faster than the scene changed
+    return corpus
+
+
+def load_corpus(directory):
+    files = sorted(f for f in os.listdir(directory) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    return [Path(directory, f).read_bytes() for f in files]
+
+
+def baseline(data):
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return qr_pipeline.decode(gray)
+
+
+def run(name, corpus, scan):
+    found = 0
+    timings = []
+    for data in corpus:
+        started = time.perf_counter()
+        codes = scan(data)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += bool(codes)
+    timings = np.array(timings)
+    print(f"{name:<10} mean {timings.mean():7.2f} ms   p50 {np.percentile(timings, 50):7.2f} ms   "
+          f"p95 {np.percentile(timings, 95):7.2f} ms   frames with QR {found}/{len(corpus)}")
+    return timings.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='directory of captured frames')
+    parser.add_argument('--frames', type=int, default=120)
+    parser.add_argument('--size', default='1280x720')
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        width, height = (int(v) for v in args.size.split('x'))
+        corpus = synthetic_corpus(args.frames, width, height)
+    print(f"Decoder: {'pyzbar' if qr_pipeline._zbar() else 'OpenCV QRCodeDetector'}, {len(corpus)} frames\n")
+
+    old = run('baseline', corpus, baseline)
+    scanner = qr_pipeline.QRScanner()
+    new = run('pipeline', corpus, lambda data: scanner.scan_bytes(data)[0])
+    print(f"\nSpeed-up: {old / new:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Snapshot time-to-frame benchmark
+
+Serves a recorded video (or synthetic frames) locally as an ESP32-CAM would:
+an MJPEG stream on /stream and single JPEGs on /capture. Then it compares
+time-to-frame and frame age for:
+
+  stream_open  cv2.VideoCapture(stream) + read + release per capture (old path)
+  still        GET /capture over a keep-alive session (Light/snapshot.py)
+  warm         wait for the next frame of an already-open FrameBroker
+
+Frame age is measured by stamping the server's frame counter into each image.
+--connect-ms adds a delay to every new TCP connection to mimic Wi-Fi setup
+to the ESP32 (loopback connections are otherwise free).
+
+Usage: python scripts/bench_snapshot.py [--video recording.avi] [--fps 20] [--captures 20] [--connect-ms 40]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from Light import snapshot, streaming  # noqa: E402
+
+BLOCK = 32  # counter stamp: 4 gray blocks in the top-left corner, base-16 digits
+
+
+def stamp(frame, counter):
+    for i in range(4):
+        digit = (counter >> (4 * i)) & 0xF
+        frame[:BLOCK, i * BLOCK:(i + 1) * BLOCK] = digit * 16 + 8
+    return frame
+
+
+def read_stamp(frame):
+    counter = 0
+    for i in range(4):
+        value = float(frame[4:BLOCK - 4, i * BLOCK + 4:(i + 1) * BLOCK - 4].mean())
+        counter |= min(int(value // 16), 15) << (4 * i)
+    return counter
+
+
+class FakeCamera:
+    """Publishes frames at `fps` and serves them like the ESP32 CameraWebServer"""
+
+    def __init__(self, frames, fps, connect_ms=0.0):
+        self.frames = frames
+        self.fps = fps
+        self.counter = 0
+        self.jpeg = None
+        self.cond = threading.Condition()
+        threading.Thread(target=self._tick, daemon=True).start()
+        camera = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                time.sleep(connect_ms / 1000)
+                super().setup()
+
+            def do_GET(self):
+                if self.path == '/capture':
+                    with camera.cond:
+                        body = camera.jpeg
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace;boundary=frame')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                seen = -1
+                try:
+                    while True:
+                        with camera.cond:
+                            camera.cond.wait_for(lambda: camera.counter != seen)
+                            seen, body = camera.counter, camera.jpeg
+                        self.wfile.write(
+                            b'--frame\r\nContent-Type: image/jpeg\r\n'
+                            + f'Content-Length: {len(body)}\r\n\r\n'.encode() + body + b'\r\n'
+                        )
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _tick(self):
+        i = 0
+        while True:
+            frame = stamp(self.frames[i % len(self.frames)].copy(), (i + 1) & 0xFFFF)
+            jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+            with self.cond:
+                self.counter, self.jpeg = (i + 1) & 0xFFFF, jpeg
+                self.cond.notify_all()
+            i += 1
+            time.sleep(1.0 / self.fps)
+
+
+def load_frames(video, count=60):
+    if video:
+        cap = cv2.VideoCapture(video)
+        frames = []
+        while len(frames) < count:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+        if frames:
+            return frames
+    rng = np.random.default_rng(0)
+    return [cv2.GaussianBlur(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8), (15, 15), 0) for _ in range(count)]
+
+
+def measure(name, camera, capture, captures):
+    times, ages = [], []
+    for _ in range(captures):
+        started = time.perf_counter()
+        frame = capture()
+        times.append((time.perf_counter() - started) * 1000)
+        if frame is not None:
+            # How many frames the camera had published past the one we got
+            ages.append(((camera.counter - read_stamp(frame)) & 0xFFFF) * 1000 / camera.fps)
+        time.sleep(0.05)
+    times = np.array(times)
+    age = f"{np.mean(ages):6.1f} ms" if ages else "   n/a"
+    print(f"{name:<12} time-to-frame mean {times.mean():7.1f} ms  p95 {np.percentile(times, 95):7.1f} ms"
+          f"   frame age {age}   ({len(ages)}/{captures} ok)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--video', help='recorded stream to replay (defaults to synthetic frames)')
+    parser.add_argument('--fps', type=float, default=20)
+    parser.add_argument('--captures', type=int, default=20)
+    parser.add_argument('--connect-ms', type=float, default=40)
+    args = parser.parse_args()
+
+    camera = FakeCamera(load_frames(args.video), args.fps, args.connect_ms)
+    stream_url = camera.base + '/stream'
+    time.sleep(0.2)
+    print(f"Serving {stream_url} and {camera.base}/capture at {args.fps} fps\n")
+
+    def stream_open():
+        return snapshot._from_stream_open(stream_url).frame
+
+    def still():
+        return snapshot.capture_snapshot(stream_url, snapshot_url=camera.base + '/capture', fallback=False).frame
+
+    measure('stream_open', camera, stream_open, args.captures)
+    measure('still', camera, still, args.captures)
+
+    broker = streaming.acquire(stream_url)
+    broker.wait_for_frame(0, timeout=5)
+    measure('warm', camera, lambda: snapshot.capture_snapshot(stream_url).frame, args.captures)
+    streaming.release(broker)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Startup-time benchmark
+
+Measures how long a fresh interpreter takes to run `manage.py check` and to
+import the URLconf (what every gunicorn worker does on boot), and confirms
+TensorFlow is not imported along the way.
+
+Usage: python scripts/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_URLS = (
+    "import os, sys, time; t = time.perf_counter();"
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Traffic.settings');"
+    "import django; django.setup(); import Light.urls;"
+    "print(time.perf_counter() - t, 'tensorflow' in sys.modules)"
+)
+
+
+def time_command(cmd, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, cwd=BASE_DIR, check=True, capture_output=True)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("⏱️  STARTUP BENCHMARK")
+    print("=" * 60)
+
+    check = time_command([sys.executable, 'manage.py', 'check'], args.runs)
+    print(f"manage.py check      median {statistics.median(check):.3f}s  "
+          f"min {min(check):.3f}s  max {max(check):.3f}s")
+
+    import_times = []
+    tf_loaded = False
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, '-c', IMPORT_URLS],
+            cwd=BASE_DIR, check=True, capture_output=True, text=True
+        ).stdout.split()
+        import_times.append(float(out[-2]))
+        tf_loaded = tf_loaded or out[-1] == 'True'
+    print(f"import Light.urls    median {statistics.median(import_times):.3f}s  "
+          f"min {min(import_times):.3f}s  max {max(import_times):.3f}s")
+    print(f"TensorFlow imported at startup: {'❌ yes' if tf_loaded else '✅ no'}")
+
+
+if __name__ == "__main__":
+    main()
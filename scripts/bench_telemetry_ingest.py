@@ -0,0 +1,131 @@
+"""
+Bin telemetry ingest throughput benchmark
+
+Creates --bins bins in a throwaway test database and ingests --samples
+synthetic sensor samples three ways, reporting samples/s:
+
+  naive     per sample: look up the Bin, INSERT the sample, Bin.save() the
+            latest state (one transaction each)
+  endpoint  POST /api/hardware/telemetry/ with compact payloads of
+            --per-request samples (synchronous writer)
+  writer    TelemetryWriter.write() in TELEMETRY_BATCH_SIZE batches, i.e. what
+            the background flush does with TELEMETRY_BUFFERED
+
+then times the hourly rollup of everything ingested.
+
+Usage: python scripts/bench_telemetry_ingest.py [--bins 200] [--samples 20000] [--per-request 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Traffic.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from Light import telemetry  # noqa: E402
+from Light.models import Bin, BinTelemetry  # noqa: E402
+
+
+def synthetic_samples(codes, count, seed=0):
+    """[(bin code, compact row)] spread over the last 3 days, in arrival order"""
+    rng = random.Random(seed)
+    start = time.time() - 3 * 86400
+    step = 3 * 86400 / count
+    rows = []
+    for i in range(count):
+        levels = [rng.randint(0, 100) for _ in range(4)]
+        rows.append((rng.choice(codes), [start + i * step, *levels, rng.randint(20, 100), rng.randint(-90, -40), i]))
+    return rows
+
+
+def naive(rows):
+    for code, row in rows:
+        sample = dict(zip(telemetry.COMPACT_FIELDS, row))
+        recorded_at = telemetry._timestamp(sample.pop('t'))
+        bin_obj = Bin.objects.get(bin_id=code)
+        BinTelemetry.objects.create(bin=bin_obj, recorded_at=recorded_at, **sample)
+        levels = [sample[f] for f in telemetry.LEVEL_FIELDS]
+        bin_obj.capacity_percentage = max(levels)
+        for field, level in zip(telemetry.LEVEL_FIELDS, levels):
+            setattr(bin_obj, field.replace('_level', '_full'), level >= settings.BIN_FULL_PERCENT)
+        bin_obj.status = 'full' if max(levels) >= settings.BIN_FULL_PERCENT else 'active'
+        bin_obj.last_online = recorded_at
+        bin_obj.save()
+
+
+def endpoint(rows, per_request):
+    client = Client()
+    by_bin = {}
+    for code, row in rows:
+        by_bin.setdefault(code, []).append(row)
+        if len(by_bin[code]) == per_request:
+            client.post('/api/hardware/telemetry/', json.dumps({'b': code, 's': by_bin.pop(code)}),
+                        content_type='application/json')
+    for code, samples in by_bin.items():
+        client.post('/api/hardware/telemetry/', json.dumps({'b': code, 's': samples}), content_type='application/json')
+
+
+def batched(rows):
+    writer = telemetry.TelemetryWriter(settings.TELEMETRY_BATCH_SIZE, full_percent=settings.BIN_FULL_PERCENT)
+    pks = telemetry.resolve_bins({code for code, _ in rows})
+    samples = telemetry.parse_payload([{'b': code, 's': [row]} for code, row in rows])
+    for i in range(0, len(samples), writer.batch_size):
+        writer.write([(pks[code], sample) for code, sample in samples[i:i + writer.batch_size]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bins', type=int, default=200)
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--per-request', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    test_db = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    print(f"Using throwaway database {test_db}\n")
+    try:
+        codes = [f'BIN-{i:05d}' for i in range(args.bins)]
+        Bin.objects.bulk_create([
+            Bin(bin_id=code, name=code, location_name='Lahore', latitude=31.5, longitude=74.35) for code in codes
+        ])
+        rows = synthetic_samples(codes, args.samples)
+
+        runs = [
+            ('naive', lambda: naive(rows[:max(1, len(rows) // 10)]), max(1, len(rows) // 10)),
+            ('endpoint', lambda: endpoint(rows, args.per_request), len(rows)),
+            ('writer', lambda: batched(rows), len(rows)),
+        ]
+        for name, run, count in runs:
+            BinTelemetry.objects.all().delete()
+            Bin.objects.update(last_online=None)
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            assert BinTelemetry.objects.count() == count
+            print(f"{name:<9} {count:>8,} samples in {elapsed:6.2f}s   {count / elapsed:>10,.0f} samples/s")
+
+        started = time.perf_counter()
+        hours, deleted = telemetry.rollup(retention_hours=0)
+        elapsed = time.perf_counter() - started
+        print(f"\nrollup    {deleted:,} raw samples -> {hours:,} hourly rows in {elapsed:.2f}s "
+              f"({BinTelemetry.objects.count():,} from the current hour kept raw)")
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+WSGI vs ASGI concurrency load test
+
+Starts the app under gunicorn with one worker and opens --streams long-lived
+/api/events/ connections. They have the shape of MJPEG viewers and in-flight
+bin / chatbot calls: a request that mostly waits. Then, with all of them
+held open, it times a quick probe request (/api/chatbot/health/).
+
+  wsgi  gthread worker with --threads threads: each open stream holds a thread
+  asgi  uvicorn worker (SERVER_MODE=asgi): streams wait on the event loop
+
+Reports how many streams got their first byte within --accept-timeout and
+the probe latency while they were open.
+
+Usage: python scripts/load_test_concurrency.py [--mode wsgi|asgi|both] [--streams 300] [--threads 8]
+       python scripts/load_test_concurrency.py --url http://127.0.0.1:8000   (test a running server)
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+PROBE_PATH = '/api/chatbot/health/'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, threads, hold_seconds):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY='1',
+        GUNICORN_THREADS=str(threads),
+        SERVER_MODE=mode,
+        DEBUG='False',
+        EVENTS_SSE='True',  # held open in both modes, whatever the default for that mode
+        EVENTS_HEARTBEAT_SECONDS='1',
+        EVENTS_MAX_STREAM_SECONDS=str(hold_seconds + 30),
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'Traffic.wsgi:application'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url + PROBE_PATH, timeout=1.0)
+            return server, url
+        except httpx.HTTPError:
+            if server.poll() is not None:
+                break
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"{mode} server did not start")
+
+
+async def hold_stream(client, url, i, accept_timeout, release, first_bytes):
+    request = client.build_request('GET', f'{url}/api/events/', params={'channels': f'job:loadtest-{i}'})
+
+    async def open_stream():
+        response = await client.send(request, stream=True)
+        try:
+            await response.aiter_raw().__anext__()
+        except BaseException:
+            await response.aclose()
+            raise
+        return response
+
+    started = time.perf_counter()
+    try:
+        # Queued behind busy threads counts as not accepted, whenever it would have been served
+        response = await asyncio.wait_for(open_stream(), accept_timeout)
+    except (asyncio.TimeoutError, httpx.HTTPError):
+        return
+    first_bytes.append((time.perf_counter() - started) * 1000)
+    try:
+        await release.wait()
+    finally:
+        await response.aclose()
+
+
+async def run(url, streams, accept_timeout, hold_seconds, probes):
+    limits = httpx.Limits(max_connections=streams + 10, max_keepalive_connections=0)
+    timeout = httpx.Timeout(hold_seconds + accept_timeout + 30, connect=10)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client, \
+            httpx.AsyncClient(timeout=accept_timeout) as prober:
+        release = asyncio.Event()
+        first_bytes = []
+        tasks = [asyncio.create_task(hold_stream(client, url, i, accept_timeout, release, first_bytes))
+                 for i in range(streams)]
+        await asyncio.sleep(accept_timeout)
+
+        latencies, failed = [], 0
+        for _ in range(probes):
+            started = time.perf_counter()
+            try:
+                (await prober.get(url + PROBE_PATH)).raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+            except httpx.HTTPError:
+                failed += 1
+
+        await asyncio.sleep(max(0.0, hold_seconds - accept_timeout))
+        release.set()
+        await asyncio.gather(*tasks)
+    return first_bytes, latencies, failed
+
+
+def report(label, streams, first_bytes, latencies, failed):
+    print(f"\n{label}")
+    print(f"  streams accepted   {len(first_bytes):5d} / {streams}")
+    if first_bytes:
+        print(f"  first byte         p50 {np.percentile(first_bytes, 50):8.1f} ms   "
+              f"p95 {np.percentile(first_bytes, 95):8.1f} ms")
+    if latencies:
+        print(f"  probe while held   p50 {np.percentile(latencies, 50):8.1f} ms   "
+              f"p95 {np.percentile(latencies, 95):8.1f} ms   timeouts {failed}")
+    else:
+        print(f"  probe while held   all {failed} probes timed out")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['wsgi', 'asgi', 'both'], default='both')
+    parser.add_argument('--url', help='test an already running server instead of starting gunicorn')
+    parser.add_argument('--streams', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=8, help='GUNICORN_THREADS for the wsgi run')
+    parser.add_argument('--accept-timeout', type=float, default=3.0)
+    parser.add_argument('--hold', type=float, default=5.0, help='seconds to keep the streams open')
+    parser.add_argument('--probes', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.url:
+        results = asyncio.run(run(args.url.rstrip('/'), args.streams, args.accept_timeout, args.hold, args.probes))
+        report(args.url, args.streams, *results)
+        return
+
+    modes = ['wsgi', 'asgi'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        if mode == 'asgi' and importlib.util.find_spec('uvicorn_worker') is None:
+            print("\nasgi: skipped, uvicorn-worker is not installed (pip install uvicorn uvicorn-worker)")
+            continue
+        server, url = start_server(mode, args.threads, args.hold)
+        try:
+            results = asyncio.run(run(url, args.streams, args.accept_timeout, args.hold, args.probes))
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        label = f"wsgi (gthread, 1 worker x {args.threads} threads)" if mode == 'wsgi' else "asgi (uvicorn, 1 worker)"
+        report(label, args.streams, *results)
+
+
+if __name__ == '__main__':
+    main()